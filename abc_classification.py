@@ -0,0 +1,194 @@
+# abc_classification.py - Pareto/ABC classes per SKU, period and scope, stored in Neon
+import io
+import os
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from sqlalchemy import text
+from dotenv import load_dotenv
+from forecasting import get_engine
+
+# Load environment variables
+load_dotenv()
+
+# Cumulative sales share covered by class A items, and by A and B together
+ABC_A_SHARE = float(os.getenv("ABC_A_SHARE", "0.8"))
+ABC_B_SHARE = float(os.getenv("ABC_B_SHARE", "0.95"))
+
+SKU_KEYS = ["brand", "category", "size", "color"]
+# scope name -> column whose values partition the ranking ("overall" ranks everything together)
+SCOPES = {"overall": None, "category": "category", "brand": "brand"}
+ALL_PERIODS = "all"
+ABC_COLUMNS = ["period", "scope", "scope_value"] + SKU_KEYS + ["sales_qty", "cumulative_share", "abc_class", "computed_at"]
+
+SALES_BY_MONTH_QUERY = """
+    SELECT brand, category, size, color, month, SUM(sales_qty) AS sales_qty
+    FROM sales_data
+    WHERE lower(brand) != 'grand total'
+    GROUP BY brand, category, size, color, month
+"""
+
+
+def classify_groups(group_codes, sales, a_share=ABC_A_SHARE, b_share=ABC_B_SHARE):
+    """ABC class and cumulative share for every row, ranking rows within their group.
+
+    One lexsort orders all groups at once by descending sales; a single cumsum minus each
+    group's starting offset gives the running share. An item is in A while the share of
+    the items ranked above it is below a_share, so the item that crosses 80% is still A.
+    """
+    sales = np.asarray(sales, dtype=np.float64)
+    group_codes = np.asarray(group_codes)
+    order = np.lexsort((-sales, group_codes))
+    groups = group_codes[order]
+    ranked = sales[order]
+
+    totals = np.bincount(groups, weights=ranked)[groups]
+    running = np.cumsum(ranked)
+    starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+    offsets = np.repeat(running[starts] - ranked[starts], np.diff(np.r_[starts, len(groups)]))
+    running -= offsets
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cumulative_share = np.where(totals > 0, running / totals, 1.0)
+        share_before = np.where(totals > 0, (running - ranked) / totals, 1.0)
+    classes = np.select(
+        [(ranked > 0) & (share_before < a_share), (ranked > 0) & (share_before < b_share)],
+        ["A", "B"],
+        default="C",
+    )
+
+    # Back to the caller's row order
+    unsorted_share = np.empty_like(cumulative_share)
+    unsorted_classes = np.empty_like(classes)
+    unsorted_share[order] = cumulative_share
+    unsorted_classes[order] = classes
+    return unsorted_classes, unsorted_share
+
+
+def compute_abc_classes(history, periods=None):
+    """Classes for every (period, scope, scope value) in one pass over the monthly sales rows.
+
+    periods limits the result to those months (and/or "all", the whole history).
+    """
+    history = history.copy()
+    for key in SKU_KEYS:
+        history[key] = history[key].fillna("").astype(str)
+    history["period"] = history["month"].astype(str)
+    history["sales_qty"] = pd.to_numeric(history["sales_qty"], errors="coerce").fillna(0).round().astype("int64")
+
+    frames = [history[["period"] + SKU_KEYS + ["sales_qty"]]]
+    if periods is None or ALL_PERIODS in periods:
+        whole = history.groupby(SKU_KEYS, as_index=False, sort=False)["sales_qty"].sum()
+        whole["period"] = ALL_PERIODS
+        frames.append(whole)
+    rows = pd.concat(frames, ignore_index=True)
+    if periods is not None:
+        rows = rows[rows["period"].isin(periods)]
+
+    stacked = []
+    for scope, column in SCOPES.items():
+        scoped = rows.copy()
+        scoped["scope"] = scope
+        scoped["scope_value"] = scoped[column] if column else ""
+        stacked.append(scoped)
+    stacked = pd.concat(stacked, ignore_index=True)
+    if stacked.empty:
+        return pd.DataFrame(columns=ABC_COLUMNS)
+
+    group_codes = stacked.groupby(["period", "scope", "scope_value"], sort=False).ngroup().to_numpy()
+    classes, shares = classify_groups(group_codes, stacked["sales_qty"].to_numpy())
+    stacked["abc_class"] = classes
+    stacked["cumulative_share"] = np.round(shares, 4)
+    stacked["computed_at"] = datetime.now()
+    return stacked[ABC_COLUMNS]
+
+
+def _ensure_table(conn):
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS abc_classes (
+            period VARCHAR(10),
+            scope VARCHAR(20),
+            scope_value VARCHAR(100),
+            brand VARCHAR(100),
+            category VARCHAR(100),
+            size VARCHAR(50),
+            color VARCHAR(50),
+            sales_qty INTEGER,
+            cumulative_share FLOAT,
+            abc_class CHAR(1),
+            computed_at TIMESTAMP
+        )
+    """))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS idx_abc_scope_period ON abc_classes (scope, period, abc_class)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS idx_abc_sku ON abc_classes (brand, category, size, color, period)"))
+
+
+def run_abc_classification(log_output, selected_date=None):
+    """Recompute the classes an upload can change and store them in the abc_classes table.
+
+    That is the upload's month, the whole-history period and any month not classified yet,
+    so the first run backfills everything and later runs stay small.
+    """
+    try:
+        engine = get_engine()
+        with engine.begin() as conn:
+            _ensure_table(conn)
+            stored = {row[0] for row in conn.execute(text("SELECT DISTINCT period FROM abc_classes"))}
+
+        history = pd.read_sql_query(SALES_BY_MONTH_QUERY, engine)
+        months = set(history["month"].astype(str))
+        upload_month = pd.to_datetime(selected_date or datetime.now()).strftime('%Y-%m')
+        periods = ({upload_month} & months) | (months - stored) | {ALL_PERIODS}
+
+        classes = compute_abc_classes(history, periods)
+        buffer = io.StringIO()
+        classes.to_csv(buffer, index=False, header=False)
+        buffer.seek(0)
+
+        # Swap the recomputed periods in one transaction so readers never see a partial set
+        raw_conn = engine.raw_connection()
+        try:
+            cursor = raw_conn.cursor()
+            cursor.execute("CREATE TEMP TABLE abc_classes_staging (LIKE abc_classes) ON COMMIT DROP")
+            cursor.copy_expert(
+                "COPY abc_classes_staging FROM STDIN WITH (FORMAT csv, "
+                "FORCE_NOT_NULL (scope_value, brand, category, size, color))",
+                buffer
+            )
+            cursor.execute("DELETE FROM abc_classes WHERE period = ANY(%s)", (sorted(periods),))
+            # Months purged from sales_data by the retention policy
+            cursor.execute("DELETE FROM abc_classes WHERE period <> %s AND NOT (period = ANY(%s))",
+                           (ALL_PERIODS, sorted(months)))
+            cursor.execute("INSERT INTO abc_classes SELECT * FROM abc_classes_staging")
+            raw_conn.commit()
+        except Exception:
+            raw_conn.rollback()
+            raise
+        finally:
+            raw_conn.close()
+
+        log_output.info(f"ABC classification updated for {len(periods)} period(s): {len(classes)} rows")
+        return {"periods": sorted(periods), "rows": len(classes)}
+    except Exception as e:
+        log_output.error(f"Error computing ABC classification: {str(e)}")
+        return None
+
+
+def get_abc_summary(period=ALL_PERIODS, scope="overall"):
+    """Class counts and sales shares plus the top class A SKUs for one period and scope"""
+    engine = get_engine()
+    params = {"period": period, "scope": scope}
+    summary = pd.read_sql_query(text("""
+        SELECT abc_class, COUNT(*) AS skus, SUM(sales_qty) AS sales_qty
+        FROM abc_classes
+        WHERE period = :period AND scope = :scope
+        GROUP BY abc_class ORDER BY abc_class
+    """), engine, params=params)
+    top = pd.read_sql_query(text("""
+        SELECT brand, category, size, color, sales_qty, cumulative_share
+        FROM abc_classes
+        WHERE period = :period AND scope = :scope AND abc_class = 'A'
+        ORDER BY cumulative_share
+        LIMIT 15
+    """), engine, params=params)
+    return summary, top
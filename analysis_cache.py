@@ -0,0 +1,104 @@
+# analysis_cache.py - Persistent cache for Gemini report analyses
+import os
+import time
+import hashlib
+import sqlite3
+import threading
+from contextlib import contextmanager
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+CACHE_DIR = os.getenv("INVENTORYSYNC_CACHE_DIR", "cache")
+ANALYSIS_CACHE_PATH = os.path.join(CACHE_DIR, "analysis_cache.db")
+ANALYSIS_CACHE_TTL_SECONDS = int(float(os.getenv("ANALYSIS_CACHE_TTL_HOURS", "168")) * 3600)
+ANALYSIS_CACHE_MAX_ENTRIES = int(os.getenv("ANALYSIS_CACHE_MAX_ENTRIES", "2000"))
+
+# Bump whenever the analysis or executive summary prompts change so old answers are not reused
+PROMPT_VERSION = "1"
+
+
+def fingerprint(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class AnalysisCache:
+    """SQLite-backed store of Gemini responses with a TTL and a bound on the number of entries.
+
+    Only successful responses are stored, so a failed Gemini call is retried on the next report.
+    """
+
+    def __init__(self, path=ANALYSIS_CACHE_PATH, ttl_seconds=ANALYSIS_CACHE_TTL_SECONDS,
+                 max_entries=ANALYSIS_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS analyses (
+                    cache_key TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_analyses_last_used ON analyses(last_used)")
+
+    @contextmanager
+    def _connect(self):
+        """Short-lived connection that commits on success and is always closed"""
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def question_key(question_id, data_json: str) -> str:
+        return fingerprint(f"question:{question_id}:{PROMPT_VERSION}:{fingerprint(data_json)}")
+
+    @staticmethod
+    def summary_key(analyses) -> str:
+        combined = fingerprint("\n\n---\n\n".join(analyses))
+        return fingerprint(f"summary:{PROMPT_VERSION}:{combined}")
+
+    def get(self, key):
+        """Return the cached response, or None when missing or expired"""
+        now = time.time()
+        try:
+            with self._lock, self._connect() as conn:
+                row = conn.execute(
+                    "SELECT response FROM analyses WHERE cache_key = ? AND created_at >= ?",
+                    (key, now - self.ttl_seconds)
+                ).fetchone()
+                if row is None:
+                    return None
+                conn.execute("UPDATE analyses SET last_used = ? WHERE cache_key = ?", (now, key))
+                return row[0]
+        except sqlite3.Error as e:
+            print(f"Analysis cache read error: {e}")
+            return None
+
+    def put(self, key, kind, response):
+        now = time.time()
+        try:
+            with self._lock, self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO analyses (cache_key, kind, response, created_at, last_used) VALUES (?, ?, ?, ?, ?)",
+                    (key, kind, response, now, now)
+                )
+                conn.execute("DELETE FROM analyses WHERE created_at < ?", (now - self.ttl_seconds,))
+                # Keep only the most recently used entries
+                conn.execute("""
+                    DELETE FROM analyses WHERE cache_key IN (
+                        SELECT cache_key FROM analyses ORDER BY last_used DESC LIMIT -1 OFFSET ?
+                    )
+                """, (self.max_entries,))
+        except sqlite3.Error as e:
+            print(f"Analysis cache write error: {e}")
@@ -0,0 +1,217 @@
+# anomaly_detection.py - Flags uploads whose brand/category totals break from their history
+import os
+import math
+import sqlite3
+from datetime import datetime
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+PROCESSED_DIR = "processed_data"
+LOCAL_DB_PATH = os.path.join(PROCESSED_DIR, "local_sales_data.db")
+# Uploads a key needs to have been seen in before it can be flagged
+ANOMALY_MIN_HISTORY = int(os.getenv("ANOMALY_MIN_HISTORY", "5"))
+# Standard deviations from the running mean that count as an outlier
+ANOMALY_Z_THRESHOLD = float(os.getenv("ANOMALY_Z_THRESHOLD", "3"))
+# Relative distance from the EWMA also required, so near-constant series do not flag tiny changes
+ANOMALY_MIN_RELATIVE_CHANGE = float(os.getenv("ANOMALY_MIN_RELATIVE_CHANGE", "0.5"))
+# Absolute change below which small brands/categories are never flagged (e.g. 1 -> 2 units)
+ANOMALY_MIN_ABS_CHANGE = float(os.getenv("ANOMALY_MIN_ABS_CHANGE", "10"))
+ANOMALY_EWMA_ALPHA = float(os.getenv("ANOMALY_EWMA_ALPHA", "0.3"))
+# Typical quantity below which a brand/category missing from an upload is not reported
+ANOMALY_MISSING_MIN_QTY = float(os.getenv("ANOMALY_MISSING_MIN_QTY", "5"))
+
+METRICS = {"SalesQty": "sales_qty", "PurchaseQty": "purchase_qty"}
+DIMENSIONS = {"Brand": "brand", "Category": "category"}
+
+
+def _ensure_state_table(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS anomaly_stats (
+            dimension TEXT NOT NULL,
+            key TEXT NOT NULL,
+            metric TEXT NOT NULL,
+            n INTEGER NOT NULL,
+            mean REAL NOT NULL,
+            m2 REAL NOT NULL,
+            ewma REAL NOT NULL,
+            last_value REAL NOT NULL,
+            updated_at TEXT NOT NULL,
+            PRIMARY KEY (dimension, key, metric)
+        )
+    """)
+
+
+def upload_totals(df):
+    """Per-brand, per-category and overall totals of a preprocessed upload"""
+    rows = df[df['Brand'] != 'grand total']
+    totals = {
+        ("total", "all", metric): float(rows[column].sum()) for column, metric in METRICS.items()
+    }
+    totals[("total", "all", "rows")] = float(len(rows))
+    for column, dimension in DIMENSIONS.items():
+        grouped = rows.groupby(column)[list(METRICS)].sum()
+        for key, values in grouped.iterrows():
+            for source, metric in METRICS.items():
+                totals[(dimension, str(key), metric)] = float(values[source])
+    return totals
+
+
+def check_value(value, state):
+    """Return an anomaly description for value given a key's running statistics, or None"""
+    n, mean, m2, ewma = state
+    if n < ANOMALY_MIN_HISTORY:
+        return None
+    std = math.sqrt(m2 / (n - 1)) if n > 1 else 0.0
+    deviation = value - ewma
+    relative = abs(deviation) / ewma if ewma > 0 else math.inf
+    if abs(deviation) < ANOMALY_MIN_ABS_CHANGE or relative < ANOMALY_MIN_RELATIVE_CHANGE:
+        return None
+    if std > 0:
+        z_score = (value - mean) / std
+        if abs(z_score) < ANOMALY_Z_THRESHOLD:
+            return None
+    else:
+        z_score = math.inf if value != mean else 0.0
+        if z_score == 0.0:
+            return None
+    return {
+        "expected": round(ewma, 2),
+        "mean": round(mean, 2),
+        "std": round(std, 2),
+        "z_score": round(z_score, 2) if math.isfinite(z_score) else None,
+        "ratio": round(value / ewma, 2) if ewma > 0 else None,
+    }
+
+
+def dampen_value(value, state):
+    """Clip an outlier to the nearest value check_value would not have flagged.
+
+    Folding the raw outlier would shift the baseline it was flagged against; the clipped
+    value still lets a genuine level shift move the statistics over a few uploads.
+    """
+    n, mean, m2, ewma = state
+    std = math.sqrt(m2 / (n - 1)) if n > 1 else 0.0
+    upper = max(ewma + ANOMALY_MIN_ABS_CHANGE, ewma * (1 + ANOMALY_MIN_RELATIVE_CHANGE), mean + ANOMALY_Z_THRESHOLD * std)
+    lower = min(ewma - ANOMALY_MIN_ABS_CHANGE, ewma * (1 - ANOMALY_MIN_RELATIVE_CHANGE), mean - ANOMALY_Z_THRESHOLD * std)
+    return min(max(value, lower), upper)
+
+
+def update_state(value, state):
+    """Welford mean/variance and EWMA after one more observation; O(1) per key"""
+    if state is None:
+        return 1, value, 0.0, value
+    n, mean, m2, ewma = state
+    n += 1
+    delta = value - mean
+    mean += delta / n
+    m2 += delta * (value - mean)
+    ewma = ANOMALY_EWMA_ALPHA * value + (1 - ANOMALY_EWMA_ALPHA) * ewma
+    return n, mean, m2, ewma
+
+
+def _load_upload_state(conn, totals):
+    """Statistics of the keys in this upload only, via an indexed join on the primary key"""
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS upload_totals (dimension TEXT, key TEXT, metric TEXT)")
+    conn.execute("DELETE FROM temp.upload_totals")
+    conn.executemany("INSERT INTO temp.upload_totals VALUES (?, ?, ?)", list(totals))
+    return {
+        (dimension, key, metric): (n, mean, m2, ewma)
+        for dimension, key, metric, n, mean, m2, ewma in conn.execute("""
+            SELECT s.dimension, s.key, s.metric, s.n, s.mean, s.m2, s.ewma
+            FROM temp.upload_totals u
+            JOIN anomaly_stats s ON s.dimension = u.dimension AND s.key = u.key AND s.metric = u.metric
+        """)
+    }
+
+
+def detect_upload_anomalies(df, log_output, db_path=LOCAL_DB_PATH):
+    """Compare an upload's totals with the running statistics without changing them.
+
+    Returns a list of anomaly dicts; each one is also logged as a warning. Detection is
+    advisory and never blocks ingestion. record_upload_totals folds the upload in once it
+    is committed.
+    """
+    try:
+        totals = upload_totals(df)
+        conn = sqlite3.connect(db_path, timeout=30)
+        try:
+            _ensure_state_table(conn)
+            state = _load_upload_state(conn, totals)
+
+            anomalies = []
+            for stat_key, value in totals.items():
+                if stat_key in state:
+                    details = check_value(value, state[stat_key])
+                    if details:
+                        dimension, key, metric = stat_key
+                        anomalies.append({"type": "outlier", "dimension": dimension, "key": key,
+                                          "metric": metric, "value": value, **details})
+
+            # Established brands/categories that are absent from this upload
+            missing = {}
+            for dimension, key, metric, ewma in conn.execute("""
+                SELECT s.dimension, s.key, s.metric, s.ewma FROM anomaly_stats s
+                WHERE s.dimension != 'total' AND s.n >= ? AND s.ewma >= ?
+                  AND NOT EXISTS (SELECT 1 FROM temp.upload_totals u
+                                  WHERE u.dimension = s.dimension AND u.key = s.key)
+            """, (ANOMALY_MIN_HISTORY, ANOMALY_MISSING_MIN_QTY)):
+                missing.setdefault((dimension, key), {})[metric] = round(ewma, 2)
+            for (dimension, key), expected in sorted(missing.items()):
+                anomalies.append({"type": "missing", "dimension": dimension, "key": key, "expected": expected})
+        finally:
+            conn.close()
+    except Exception as e:
+        log_output.error(f"Anomaly detection failed: {str(e)}")
+        return []
+
+    for anomaly in anomalies:
+        log_output.warning(f"Upload anomaly: {describe_anomaly(anomaly)}")
+    if not anomalies:
+        log_output.info("No anomalies detected in upload totals")
+    return anomalies
+
+
+def record_upload_totals(df, log_output, db_path=LOCAL_DB_PATH):
+    """Fold a committed upload into the running statistics; outliers are dampened first.
+
+    Call only after the upload reached the database, so failed or retried uploads are not
+    counted.
+    """
+    try:
+        totals = upload_totals(df)
+        conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+        try:
+            _ensure_state_table(conn)
+            conn.execute("BEGIN IMMEDIATE")  # Concurrent uploads must not lose each other's update
+            state = _load_upload_state(conn, totals)
+            now = datetime.now().isoformat()
+            rows = []
+            for stat_key, value in totals.items():
+                previous = state.get(stat_key)
+                folded = value
+                if previous is not None and check_value(value, previous):
+                    folded = dampen_value(value, previous)
+                rows.append((*stat_key, *update_state(folded, previous), value, now))
+            conn.executemany(
+                "INSERT OR REPLACE INTO anomaly_stats (dimension, key, metric, n, mean, m2, ewma, last_value, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            conn.execute("COMMIT")
+        finally:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            conn.close()
+    except Exception as e:
+        log_output.error(f"Updating anomaly statistics failed: {str(e)}")
+
+
+def describe_anomaly(anomaly):
+    label = "overall" if anomaly["dimension"] == "total" else f"{anomaly['dimension']} '{anomaly['key']}'"
+    if anomaly["type"] == "missing":
+        usual = ", ".join(f"{metric} ~{value:g}" for metric, value in anomaly["expected"].items())
+        return f"{label} is missing from this upload (usually {usual})"
+    ratio = f", {anomaly['ratio']}x usual" if anomaly["ratio"] is not None else ""
+    return f"{label} {anomaly['metric']} = {anomaly['value']:g} (expected ~{anomaly['expected']:g}{ratio})"
@@ -199,9 +199,16 @@
 #             }
 
 import os
+import io
+import base64
 import logging
+import sqlite3
+import tempfile
 import time
+from contextlib import contextmanager
 from datetime import datetime
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceModifiedError, ResourceNotFoundError
 from azure.storage.blob import BlobServiceClient, BlobClient, ContainerClient
 from dotenv import load_dotenv
 
@@ -209,6 +216,158 @@ load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+# Local record of processed blobs, so polls never have to list the processed container
+AZURE_MANIFEST_DB = os.getenv("AZURE_MANIFEST_DB", os.path.join("processed_data", "azure_manifest.db"))
+# Source listing page size, and pages read per poll before the next poll resumes from the marker
+AZURE_LIST_PAGE_SIZE = int(os.getenv("AZURE_LIST_PAGE_SIZE", "500"))
+AZURE_LIST_MAX_PAGES = int(os.getenv("AZURE_LIST_MAX_PAGES", "20"))
+EXCEL_EXTENSIONS = ('.xlsx', '.xls')
+# Blobs up to this size are downloaded into memory; larger ones go to a temporary file
+AZURE_DOWNLOAD_MEMORY_LIMIT_MB = float(os.getenv("AZURE_DOWNLOAD_MEMORY_LIMIT_MB", "64"))
+# Range size and parallel range reads per download; blobs above one range are fetched in parallel
+AZURE_DOWNLOAD_CHUNK_MB = float(os.getenv("AZURE_DOWNLOAD_CHUNK_MB", "4"))
+AZURE_DOWNLOAD_CONCURRENCY = int(os.getenv("AZURE_DOWNLOAD_CONCURRENCY", "4"))
+# How ingested blobs are marked: "move" copies each one to the processed container and deletes it
+# before the batch finishes; "tag" sets blob index tags in one request and archives in the background
+AZURE_MARK_STRATEGY = os.getenv("AZURE_MARK_STRATEGY", "move").lower()
+# Tagged blobs copied to the processed container per background archive batch
+AZURE_ARCHIVE_BATCH_SIZE = int(os.getenv("AZURE_ARCHIVE_BATCH_SIZE", "100"))
+PROCESSED_TAG_FILTER = "\"processed\"='true'"
+# SQLite limits the number of bound parameters per statement
+MANIFEST_LOOKUP_CHUNK = 500
+
+
+def _content_md5(blob):
+    md5 = blob.content_settings.content_md5 if blob.content_settings else None
+    return base64.b64encode(bytes(md5)).decode("ascii") if md5 else None
+
+
+def _etag_tag(etag):
+    """Etag as a blob index tag value (tags do not allow quotes)"""
+    return (etag or "").strip('"')
+
+
+def _processed_name(blob_name, timestamp):
+    """Name of a blob in the processed container: <name>_<YYYYmmddHHMMSS><ext>"""
+    file_name, file_extension = os.path.splitext(blob_name)
+    return f"{file_name}_{timestamp}{file_extension}"
+
+
+def _original_name(processed_blob_name):
+    """Source name of a blob in the processed container (mark_as_processed adds _<timestamp>)"""
+    file_name, extension = os.path.splitext(processed_blob_name)
+    return file_name.rsplit('_', 1)[0] + extension if '_' in file_name else processed_blob_name
+
+
+class BlobManifest:
+    """Processed source blobs (name, etag, content-MD5, processed_at, result) in local SQLite.
+
+    A blob counts as processed when the row says so and the listed blob still has the same
+    etag or content-MD5, so a file re-uploaded under an old name with new content is picked up.
+    """
+
+    def __init__(self, db_path=AZURE_MANIFEST_DB):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript('''
+                CREATE TABLE IF NOT EXISTS azure_blob_manifest (
+                    name TEXT PRIMARY KEY,
+                    etag TEXT,
+                    content_md5 TEXT,
+                    processed_at TEXT NOT NULL,
+                    result TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_azure_blob_manifest_processed
+                ON azure_blob_manifest(result, processed_at);
+                CREATE TABLE IF NOT EXISTS azure_manifest_state (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                );
+            ''')
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:  # Commits, or rolls back on error
+                yield conn
+        finally:
+            conn.close()
+
+    def get_state(self, key):
+        with self._connect() as conn:
+            row = conn.execute("SELECT value FROM azure_manifest_state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_state(self, key, value):
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO azure_manifest_state (key, value) VALUES (?, ?)", (key, value))
+
+    def record(self, name, result, etag=None, content_md5=None):
+        """Store the outcome for a blob; a failure never overwrites a success for the same content"""
+        with self._connect() as conn:
+            conn.execute('''
+                INSERT INTO azure_blob_manifest (name, etag, content_md5, processed_at, result)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(name) DO UPDATE SET
+                    etag = excluded.etag, content_md5 = excluded.content_md5,
+                    processed_at = excluded.processed_at, result = excluded.result
+                WHERE excluded.result = 'processed'
+                   OR azure_blob_manifest.result != 'processed'
+                   OR azure_blob_manifest.etag IS NOT excluded.etag
+            ''', (name, etag, content_md5, datetime.now().isoformat(timespec="seconds"), result))
+
+    def seed(self, rows):
+        """Add (name, content_md5) of already processed blobs that have no row yet"""
+        processed_at = datetime.now().isoformat(timespec="seconds")
+        with self._connect() as conn:
+            conn.executemany('''
+                INSERT OR IGNORE INTO azure_blob_manifest (name, etag, content_md5, processed_at, result)
+                VALUES (?, NULL, ?, ?, 'processed')
+            ''', [(name, content_md5, processed_at) for name, content_md5 in rows])
+
+    def processed_among(self, blobs):
+        """Names from {name: (etag, content_md5)} that were already processed with that content.
+
+        A matching etag decides, then the MD5 when both sides have one; rows without an
+        etag and without a comparable MD5 fall back to the name.
+        """
+        names = list(blobs)
+        processed = set()
+        with self._connect() as conn:
+            for i in range(0, len(names), MANIFEST_LOOKUP_CHUNK):
+                chunk = names[i:i + MANIFEST_LOOKUP_CHUNK]
+                rows = conn.execute(
+                    f"SELECT name, etag, content_md5 FROM azure_blob_manifest "
+                    f"WHERE result = 'processed' AND name IN ({','.join('?' * len(chunk))})",
+                    chunk
+                ).fetchall()
+                for name, etag, content_md5 in rows:
+                    listed_etag, listed_md5 = blobs[name]
+                    if etag is not None and etag == listed_etag:
+                        processed.add(name)
+                    elif content_md5 and listed_md5:
+                        if content_md5 == listed_md5:
+                            processed.add(name)
+                    elif etag is None:
+                        # Seeded from the processed container without a hash to compare; the name decides
+                        processed.add(name)
+        return processed
+
+    def processed_count(self):
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM azure_blob_manifest WHERE result = 'processed'").fetchone()[0]
+
+    def recent_processed(self, limit=5):
+        with self._connect() as conn:
+            rows = conn.execute('''
+                SELECT name, processed_at FROM azure_blob_manifest
+                WHERE result = 'processed' ORDER BY processed_at DESC LIMIT ?
+            ''', (limit,)).fetchall()
+        return [{"name": name, "date": processed_at.replace("T", " ")} for name, processed_at in rows]
+
+
 class AzureBlobStorage:
     def __init__(self):
         self.connection_string = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
@@ -220,7 +379,10 @@ class AzureBlobStorage:
             raise ValueError("Azure Storage configuration missing")
             
         try:
-            self.blob_service_client = BlobServiceClient.from_connection_string(self.connection_string)
+            chunk_size = int(AZURE_DOWNLOAD_CHUNK_MB * 1024 * 1024)
+            self.blob_service_client = BlobServiceClient.from_connection_string(
+                self.connection_string, max_single_get_size=chunk_size, max_chunk_get_size=chunk_size
+            )
             self.container_client = self.blob_service_client.get_container_client(self.container_name)
             
             # Ensure processed container exists
@@ -232,42 +394,101 @@ class AzureBlobStorage:
         except Exception as e:
             logger.error(f"Error connecting to Azure Blob Storage: {str(e)}")
             raise
+
+        self.mark_strategy = AZURE_MARK_STRATEGY
+        self.manifest = BlobManifest()
+        self.listed_blobs = {}  # name -> (etag, content_md5) from the latest source listing
+        self.seed_manifest()
+
+    def seed_manifest(self):
+        """One-time import of blobs processed before the manifest existed; the only full
+        listing of the processed container"""
+        if self.manifest.get_state("seeded_from") == self.processed_container_name:
+            return
+        try:
+            processed_container_client = self.blob_service_client.get_container_client(self.processed_container_name)
+            rows = [
+                (_original_name(blob.name), _content_md5(blob))
+                for blob in processed_container_client.list_blobs()
+                if blob.name.lower().endswith(EXCEL_EXTENSIONS)
+            ]
+            self.manifest.seed(rows)
+            self.manifest.set_state("seeded_from", self.processed_container_name)
+            logger.info(f"Seeded Azure blob manifest with {len(rows)} previously processed files")
+        except Exception as e:
+            logger.warning(f"Could not seed Azure blob manifest from processed container: {str(e)}")
+
+    def list_source_blobs(self, advance=True):
+        """Excel blobs in the source container as {name: (etag, content_md5)}.
+
+        A poll (advance=True) reads at most AZURE_LIST_MAX_PAGES pages starting at the stored
+        continuation marker and saves the marker, so the next poll resumes where this one
+        stopped; the marker is cleared once the end of the container is reached. advance=False
+        (the status page) lists the whole container and leaves the marker alone. With the "tag"
+        strategy the listing includes index tags, and blobs tagged as processed (awaiting
+        archival) are left out.
+        """
+        tagged = self.mark_strategy == "tag"
+        marker = self.manifest.get_state("source_marker") if advance else None
+        pages = self.container_client.list_blobs(
+            results_per_page=AZURE_LIST_PAGE_SIZE, include=["tags"] if tagged else None
+        ).by_page(continuation_token=marker)
+        blobs = {}
+        next_marker = None
+        for page_number, page in enumerate(pages, 1):
+            for blob in page:
+                if not blob.name.lower().endswith(EXCEL_EXTENSIONS):
+                    continue
+                # Overwriting a blob clears its tags; the etag check covers a stale index
+                tags = blob.tags or {}
+                if tags.get("processed") == "true" and tags.get("source_etag") == _etag_tag(blob.etag):
+                    continue
+                blobs[blob.name] = (blob.etag, _content_md5(blob))
+            if advance and page_number >= AZURE_LIST_MAX_PAGES:
+                next_marker = pages.continuation_token
+                break
+        if advance:
+            self.manifest.set_state("source_marker", next_marker)
+        return blobs
     
-    def list_unprocessed_files(self):
-        """List all Excel files in the container that haven't been processed"""
+    def list_unprocessed_files(self, advance=True):
+        """List Excel files in the source container that the manifest has not seen processed"""
         try:
-            blobs = self.container_client.list_blobs()
-            excel_files = [blob.name for blob in blobs if blob.name.lower().endswith(('.xlsx', '.xls'))]
-            
-            # Get list of processed files to exclude
-            try:
-                processed_container_client = self.blob_service_client.get_container_client(self.processed_container_name)
-                processed_blobs = processed_container_client.list_blobs()
-                processed_files = set()
-                
-                for blob in processed_blobs:
-                    # Extract original filename from timestamped processed filename
-                    blob_name = blob.name
-                    if '_' in blob_name:
-                        # Remove timestamp suffix to get original name
-                        parts = blob_name.split('_')
-                        if len(parts) >= 2:
-                            original_name = '_'.join(parts[:-1]) + os.path.splitext(blob_name)[1]
-                            processed_files.add(original_name)
-                    processed_files.add(blob_name)
-                
-                # Filter out already processed files
-                unprocessed_files = [f for f in excel_files if f not in processed_files]
-                logger.info(f"Found {len(excel_files)} total Excel files, {len(unprocessed_files)} unprocessed")
-                return unprocessed_files
-                
-            except Exception as e:
-                logger.warning(f"Error checking processed container: {str(e)}")
-                return excel_files
-                
+            blobs = self.list_source_blobs(advance)
+            self.listed_blobs.update(blobs)
+            processed = self.manifest.processed_among(blobs)
+            unprocessed_files = [name for name in blobs if name not in processed]
+            logger.info(f"Found {len(blobs)} total Excel files, {len(unprocessed_files)} unprocessed")
+            return unprocessed_files
         except Exception as e:
             logger.error(f"Error listing blobs: {str(e)}")
             return []
+
+    def unprocessed_among(self, blob_names):
+        """Blobs from blob_names (e.g. announced by events) that exist and are not processed
+        with their current content"""
+        blobs = {}
+        for name in blob_names:
+            try:
+                properties = self.container_client.get_blob_client(name).get_blob_properties()
+            except ResourceNotFoundError:
+                continue  # Already moved to the processed container, or deleted again
+            blobs[name] = (properties.etag, _content_md5(properties))
+        self.listed_blobs.update(blobs)
+        processed = self.manifest.processed_among(blobs)
+        return [name for name in blobs if name not in processed]
+
+    def record_result(self, blob_name, result):
+        """Record a processing outcome ('processed' or 'failed') in the manifest"""
+        etag, content_md5 = self.listed_blobs.get(blob_name, (None, None))
+        if etag is None:
+            try:
+                properties = self.container_client.get_blob_client(blob_name).get_blob_properties()
+                etag, content_md5 = properties.etag, _content_md5(properties)
+                self.listed_blobs[blob_name] = (etag, content_md5)
+            except Exception as e:
+                logger.warning(f"Could not read properties of {blob_name}: {str(e)}")
+        self.manifest.record(blob_name, result, etag, content_md5)
     
     def get_files_to_process(self):
         """Get list of files that need to be processed"""
@@ -292,6 +513,32 @@ class AzureBlobStorage:
             logger.error(f"Error downloading {blob_name}: {str(e)}")
             return None
     
+    def download_to_buffer(self, blob_name, spill_dir=None):
+        """Download a blob for pd.read_excel without a round trip through the disk.
+
+        Returns a BytesIO, or the path of a temporary file in spill_dir when the blob is larger
+        than AZURE_DOWNLOAD_MEMORY_LIMIT_MB (the caller removes it). Returns None on error.
+        """
+        try:
+            downloader = self.container_client.get_blob_client(blob_name).download_blob(
+                max_concurrency=AZURE_DOWNLOAD_CONCURRENCY
+            )
+            if downloader.size <= AZURE_DOWNLOAD_MEMORY_LIMIT_MB * 1024 * 1024:
+                buffer = io.BytesIO()
+                downloader.readinto(buffer)
+                buffer.seek(0)
+                logger.info(f"Downloaded {blob_name} into memory ({downloader.size} bytes)")
+                return buffer
+
+            fd, local_file_path = tempfile.mkstemp(suffix=os.path.splitext(blob_name)[1], dir=spill_dir)
+            with os.fdopen(fd, "wb") as download_file:
+                downloader.readinto(download_file)
+            logger.info(f"Downloaded {blob_name} to {local_file_path} ({downloader.size} bytes)")
+            return local_file_path
+        except Exception as e:
+            logger.error(f"Error downloading {blob_name}: {str(e)}")
+            return None
+
     def mark_as_processed(self, blob_name):
         """Move blob to processed container with timestamp"""
         try:
@@ -310,8 +557,7 @@ class AzureBlobStorage:
             
             # Create a timestamp to make filenames unique
             timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-            file_name, file_extension = os.path.splitext(blob_name)
-            processed_blob_name = f"{file_name}_{timestamp}{file_extension}"
+            processed_blob_name = _processed_name(blob_name, timestamp)
             
             # Get destination blob client
             dest_container = self.blob_service_client.get_container_client(self.processed_container_name)
@@ -363,30 +609,103 @@ class AzureBlobStorage:
     def move_to_processed(self, blob_name):
         """Move a processed file to the processed container - alias for mark_as_processed"""
         return self.mark_as_processed(blob_name)
+
+    def tag_as_processed(self, blob_name, checksum=None):
+        """Mark a blob processed with index tags in a single request; archive_processed moves it later.
+
+        Setting tags leaves the etag unchanged, so the tagged etag identifies the ingested content.
+        """
+        etag, _ = self.listed_blobs.get(blob_name, (None, None))
+        tags = {
+            "processed": "true",
+            "processed_at": datetime.now().strftime("%Y%m%d%H%M%S"),
+            "source_etag": _etag_tag(etag),
+        }
+        if checksum:
+            tags["result_checksum"] = checksum
+        try:
+            self.container_client.get_blob_client(blob_name).set_blob_tags(tags)
+            logger.info(f"Tagged {blob_name} as processed")
+            return True
+        except ResourceNotFoundError:
+            logger.warning(f"Blob {blob_name} not found - may have already been processed")
+            return True
+        except Exception as e:
+            logger.error(f"Error tagging {blob_name} as processed: {str(e)}")
+            return False
+
+    def archive_processed(self, limit=AZURE_ARCHIVE_BATCH_SIZE):
+        """Copy blobs tagged as processed to the processed container and delete the source.
+
+        Runs as a background batch for the "tag" strategy. Copies are not waited on: a copy
+        still pending is checked again by the next batch. Only a blob whose etag still matches
+        its source_etag tag is copied and deleted; a changed blob is left for the listing to
+        ingest again. Returns the number of blobs archived.
+        """
+        dest_container = self.blob_service_client.get_container_client(self.processed_container_name)
+        archived = 0
+        for index, found in enumerate(self.container_client.find_blobs_by_tags(PROCESSED_TAG_FILTER)):
+            if index >= limit:
+                break
+            try:
+                source_blob = self.container_client.get_blob_client(found.name)
+                tags = source_blob.get_blob_tags()
+                if tags.get("processed") != "true":
+                    continue  # Re-uploaded since the tag index was read
+                etag = source_blob.get_blob_properties().etag
+                if tags.get("source_etag") != _etag_tag(etag):
+                    logger.info(f"Blob {found.name} changed since it was tagged; leaving it to be ingested again")
+                    continue
+                # The archive name comes from the tag, so every batch targets the same copy
+                dest_blob = dest_container.get_blob_client(_processed_name(found.name, tags.get("processed_at")))
+                try:
+                    status = dest_blob.get_blob_properties().copy.status
+                except ResourceNotFoundError:
+                    status = None
+                if status in (None, "failed", "aborted"):
+                    status = dest_blob.start_copy_from_url(
+                        source_blob.url, source_etag=etag, source_match_condition=MatchConditions.IfNotModified
+                    )["copy_status"]
+                if status != "success":
+                    logger.info(f"Archive copy of {found.name} is {status}; checking again next batch")
+                    continue
+                # Only delete the content that was tagged and copied, never a newer upload under the same name
+                source_blob.delete_blob(
+                    etag=etag, match_condition=MatchConditions.IfNotModified, if_tags_match_condition=PROCESSED_TAG_FILTER
+                )
+                archived += 1
+            except ResourceNotFoundError:
+                logger.info(f"Blob {found.name} already archived")
+            except ResourceModifiedError:
+                logger.info(f"Blob {found.name} changed while archiving; leaving it to be ingested again")
+            except Exception as e:
+                logger.error(f"Error archiving {found.name}: {str(e)}")
+        if archived:
+            logger.info(f"Archived {archived} processed blobs to {self.processed_container_name}")
+        return archived
     
     def get_azure_status(self, log_list=None):
         """Get status of Azure containers and optionally append logs to a provided list"""
         try:
-            # Count files in source container
-            source_blobs = list(self.container_client.list_blobs())
-            source_count = len([blob for blob in source_blobs if blob.name.lower().endswith(('.xlsx', '.xls'))])
+            # One source listing serves both the count and the unprocessed files; the status
+            # page does not move the scheduler's continuation marker
+            blobs = self.list_source_blobs(advance=False)
+            source_count = len(blobs)
             if log_list is not None:
                 log_list.append(f"[INFO] Counted {source_count} Excel files in source container.")
 
-            # Count files in processed container
+            # Processed files come from the manifest instead of listing the processed container
             try:
-                processed_container_client = self.blob_service_client.get_container_client(self.processed_container_name)
-                processed_blobs = list(processed_container_client.list_blobs())
-                processed_count = len([blob for blob in processed_blobs if blob.name.lower().endswith(('.xlsx', '.xls'))])
+                processed_count = self.manifest.processed_count()
                 if log_list is not None:
-                    log_list.append(f"[INFO] Counted {processed_count} Excel files in processed container.")
+                    log_list.append(f"[INFO] Counted {processed_count} processed Excel files.")
             except Exception as e:
                 processed_count = 0
                 if log_list is not None:
                     log_list.append(f"[ERROR] Error counting processed files: {str(e)}")
 
-            # Get unprocessed files
-            unprocessed_files = self.list_unprocessed_files()
+            processed = self.manifest.processed_among(blobs)
+            unprocessed_files = [name for name in blobs if name not in processed]
             if log_list is not None:
                 log_list.append(f"[INFO] Found {len(unprocessed_files)} unprocessed Excel files.")
 
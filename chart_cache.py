@@ -0,0 +1,115 @@
+# chart_cache.py - Content-addressed on-disk cache for rendered report charts
+import os
+import hashlib
+import threading
+import pandas as pd
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+CACHE_DIR = os.getenv("INVENTORYSYNC_CACHE_DIR", "cache")
+CHART_CACHE_DIR = os.path.join(CACHE_DIR, "charts")
+CHART_CACHE_MAX_BYTES = int(float(os.getenv("CHART_CACHE_MAX_MB", "64")) * 1024 * 1024)
+
+# Bump whenever render_chart output changes (colors, sizes, dpi, labels) so stale images are not reused
+CHART_STYLE_VERSION = "1"
+
+
+def normalize_day_columns(data: pd.DataFrame) -> pd.DataFrame:
+    """Copy of data with float day-count columns rounded to whole days.
+
+    Day counts derived from julianday('now') drift every second; whole days keep cache keys
+    stable for unchanged data.
+    """
+    data = data.copy()
+    day_columns = [col for col in data.columns
+                   if 'days' in str(col).lower() and pd.api.types.is_float_dtype(data[col])]
+    data[day_columns] = data[day_columns].round(0)
+    return data
+
+
+def dataframe_fingerprint(data: pd.DataFrame) -> str:
+    """Stable hash of a DataFrame's values (day counts in whole days), column names and dtypes"""
+    data = normalize_day_columns(data)
+    digest = hashlib.sha256()
+    digest.update(repr([(str(col), str(dtype)) for col, dtype in data.dtypes.items()]).encode("utf-8"))
+    try:
+        digest.update(pd.util.hash_pandas_object(data, index=True).values.tobytes())
+    except TypeError:
+        # Unhashable cell values (lists, dicts) fall back to the JSON representation
+        digest.update(data.to_json(orient="split", date_format="iso").encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ChartCache:
+    """PNG bytes keyed by (question_id, data fingerprint, style version) with size-bounded LRU eviction.
+
+    Recency is tracked through file modification times so the cache survives restarts
+    and can be shared by every process serving reports.
+    """
+
+    def __init__(self, cache_dir=CHART_CACHE_DIR, max_bytes=CHART_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def make_key(self, question_id, data: pd.DataFrame) -> str:
+        raw = f"{question_id}:{dataframe_fingerprint(data)}:{CHART_STYLE_VERSION}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.png")
+
+    def get(self, key):
+        """Return cached PNG bytes, or None on a miss"""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                content = f.read()
+            os.utime(path, None)  # Mark as recently used
+            return content
+        except OSError:
+            return None
+
+    def put(self, key, content: bytes):
+        """Store PNG bytes atomically, then evict least recently used charts over the size bound"""
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Could not write chart cache entry {key}: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+        self.evict()
+
+    def evict(self):
+        with self._lock:
+            entries = []
+            total = 0
+            for name in os.listdir(self.cache_dir):
+                if not name.endswith(".png"):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(self.cache_dir, name))
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name))
+                total += stat.st_size
+            if total <= self.max_bytes:
+                return
+            for _, size, name in sorted(entries):
+                try:
+                    os.remove(os.path.join(self.cache_dir, name))
+                    total -= size
+                except OSError:
+                    pass
+                if total <= self.max_bytes:
+                    break
@@ -9,24 +9,17 @@ import re
 import json
 import sys
 import time
+import threading
 from typing import Dict, List, Any, Optional, Union
-import google.generativeai as genai
 from dotenv import load_dotenv
+from llm_client import generate_text
+from report_queries import REPORT_QUERIES
+from insights import get_current_insight_tables
+from daily_diff import get_latest_diff_run
 
 # Load environment variables
 load_dotenv()
 
-# Configure Gemini API
-API_KEY = os.getenv("GEMINI_API_KEY")
-if not API_KEY:
-    print("Warning: GEMINI_API_KEY not found in environment variables. Please set it.")
-    API_KEY = ""  # Placeholder, will fail if not replaced
-
-genai.configure(api_key=API_KEY)
-
-# Initialize Gemini model
-model = genai.GenerativeModel('gemini-2.0-flash')
-
 class SalesDataChatbot:
     def __init__(self):
         self.temp_db_path = None
@@ -37,6 +30,7 @@ class SalesDataChatbot:
         self.data_sources = {}
         self.available_tables = []
         self.grand_total_dates = {}  # Store grand total dates for each data source
+        self.insight_tables = {}  # Precomputed report answers: table name -> question
         
     def __enter__(self):
         return self
@@ -318,6 +312,30 @@ class SalesDataChatbot:
                     print(f"Created view '{view_name}' excluding grand total rows")
                 except Exception as e:
                     print(f"Error copying table {table}: {e}")
+            # Day-over-day SKU changes stored at ingest, while they cover the two newest daily files
+            if get_latest_diff_run(local_db_path) is not None:
+                try:
+                    df = pd.read_sql("SELECT * FROM daily_diff", local_conn)
+                    df.to_sql("daily_diff", self.conn, if_exists='replace', index=False)
+                    self.available_tables.append("daily_diff")
+                    print("Copied table 'daily_diff' from local_sales_data.db")
+                except Exception as e:
+                    print(f"Error copying table daily_diff: {e}")
+            # Report insights materialized at ingest time, exposed as insight_<name>
+            self.insight_tables = {}
+            questions = {query["id"]: query["question"] for query in REPORT_QUERIES}
+            for question_id, info in get_current_insight_tables().items():
+                if not info["table_name"]:
+                    continue  # The question had no result for this data
+                table = f"insight_{info['name']}"
+                try:
+                    df = pd.read_sql(f'SELECT * FROM "{info["table_name"]}"', local_conn)
+                    df.to_sql(table, self.conn, if_exists='replace', index=False)
+                    self.available_tables.append(table)
+                    self.insight_tables[table] = questions.get(question_id, "")
+                    print(f"Copied insight table '{table}' from local_sales_data.db")
+                except Exception as e:
+                    print(f"Error copying insight table {table}: {e}")
             local_conn.close()
         # Create a special table to store grand total dates
         try:
@@ -461,6 +479,9 @@ class SalesDataChatbot:
                - Key fields: brand, category, color, size, mrp, month, week, purchase_qty, sales_qty, created_at
                - Notes: Use month/week for time analysis, not created_at
                - IMPORTANT: Records older than 3 years are purged
+               - Table: abc_classes (Pareto/ABC class per SKU)
+               - Key fields: period ('YYYY-MM' or 'all' for the whole history), scope ('overall', 'category' or 'brand'),
+                 scope_value, brand, category, size, color, sales_qty, cumulative_share, abc_class ('A', 'B' or 'C')
 
             2. MASTER SUMMARY FILE (Current Month Data)
                - Table: master_summary
@@ -491,6 +512,16 @@ class SalesDataChatbot:
                 SELECT sales_qty FROM latest_week WHERE lower(brand) = 'grand total'
             - Ignore column names from daily_files or master_summary (e.g., SalesQty) when querying these tables
 
+            5. DAILY DIFF (Changes Since The Previous Daily File)
+            - Table: daily_diff, only SKUs that changed between the two most recent daily files
+            - Columns: brand, category, size, color, change_type ('changed', 'added', 'removed'), previous_sales, current_sales,
+              sales_change, previous_purchase, current_purchase, purchase_change
+            - Negative sales_change suggests returns, negative purchase_change rejected goods; SKUs not listed did not change
+
+            6. PRECOMPUTED INSIGHTS (Report Answers)
+            - Tables: insight_<name>, one per report question, refreshed after every upload
+            - Already exclude grand total rows; use them directly when a question matches the report question they answer
+
             SPECIAL CONSIDERATIONS:
             - "Grand total" rows must ALWAYS be excluded from direct analysis
             - For calculations needing the grand total date, reference the grand_total_dates table
@@ -541,6 +572,12 @@ class SalesDataChatbot:
                 - Make sure no inf, negative values where not needed are generated as answers.
             """
             
+            # Precomputed report answers the query can read directly
+            insight_guidance = "\n".join(
+                f"            - Use `{table}` (SQLite) for: {question}"
+                for table, question in self.insight_tables.items()
+            )
+
             # Include actual data source details
             data_source_details = json.dumps(data_preview, indent=2, default=str)
             
@@ -562,6 +599,9 @@ class SalesDataChatbot:
             - Use `latest_month_no_grand_total`, `latest_week_no_grand_total`, or `latest_quarter_no_grand_total` (SQLite) for detailed analysis of the most recent periods, using sales_qty and purchase_qty (NOT SalesQty or PurchaseQty)
             - Use `latest_month`, `latest_week`, or `latest_quarter` (SQLite) only when querying the grand total row (brand = 'grand total') for summary metrics, using sales_qty or purchase_qty
             - If sales quantity asked query sales_qty and if Purchase quantity asked use purchase_qty for SQLite
+            - Use `daily_diff` (SQLite) for "what changed since yesterday" or since the previous upload, when it is listed in the available tables
+            - Use `abc_classes` (Postgres) for ABC, Pareto or "top sellers making up 80% of sales" questions; filter on period and scope (period = 'all' and scope = 'overall' unless asked otherwise)
+{insight_guidance}
             3. **Generate a clean, compatible SQL query**
             4. **Wrap your output in a single valid JSON object**, like this:
 
@@ -647,8 +687,7 @@ class SalesDataChatbot:
             
             print("Sending analysis prompt to Gemini...")
             # Generate the query plan
-            response = model.generate_content(decision_prompt)
-            query_plan_text = response.text
+            query_plan_text = generate_text(decision_prompt)
             
             # Extract and parse the JSON
             try:
@@ -755,8 +794,7 @@ class SalesDataChatbot:
                 Response:
                 """
                 
-                response = model.generate_content(error_feedback_prompt)
-                return response.text
+                return generate_text(error_feedback_prompt)
             
             # Use Gemini to format the result into a natural language response
             format_prompt = f"""
@@ -849,9 +887,9 @@ class SalesDataChatbot:
 
             
             print("Sending formatting prompt to Gemini...")
-            response = model.generate_content(format_prompt)
+            response_text = generate_text(format_prompt)
             print("Formatted response received.")
-            return response.text
+            return response_text
         
         except Exception as e:
             print(f"Error processing question: {str(e)}")
@@ -898,8 +936,18 @@ class SalesDataChatbot:
         # If we couldn't find or parse JSON, raise an exception
         raise ValueError("Could not extract valid JSON from response")
 
-print("Creating global chatbot instance...")
-chatbot_instance = SalesDataChatbot()
+chatbot_instance = None
+_chatbot_lock = threading.Lock()
+
+
+def get_chatbot() -> SalesDataChatbot:
+    """The global chatbot instance, created on first use rather than at import"""
+    global chatbot_instance
+    with _chatbot_lock:
+        if chatbot_instance is None:
+            print("Creating global chatbot instance...")
+            chatbot_instance = SalesDataChatbot()
+        return chatbot_instance
 
 def chat(question: str) -> str:
     """
@@ -913,11 +961,12 @@ def chat(question: str) -> str:
         return "## Error\n\nPlease provide a valid question."
 
     # Call the process method on the global instance
-    response = chatbot_instance.process_user_question(question)
+    response = get_chatbot().process_user_question(question)
     return response
 
 # --- Cleanup Function (Optional, for specific Flask shutdown hooks if needed) ---
 def cleanup_chatbot():
     """Function to explicitly call cleanup on the global instance."""
     print("Attempting chatbot cleanup...")
-    chatbot_instance.cleanup()
\ No newline at end of file
+    if chatbot_instance is not None:
+        chatbot_instance.cleanup()
\ No newline at end of file
@@ -0,0 +1,182 @@
+# cube.py - In-memory sales cube over sales_data with pre-aggregated cuboids
+import os
+import time
+import threading
+from collections import Counter
+import pandas as pd
+from flask import Blueprint, request, jsonify
+from dotenv import load_dotenv
+from forecasting import get_engine, get_sales_data_version
+
+# Load environment variables
+load_dotenv()
+
+# Blueprint setup for Flask
+cube_bp = Blueprint('cube', __name__)
+
+DIMENSIONS = ["brand", "category", "size", "color", "month", "week"]
+MEASURES = ["sales_qty", "purchase_qty", "sku_rows"]
+# Roll-ups the dashboard and reports ask for most; materialized on every rebuild
+DEFAULT_CUBOIDS = [
+    ("brand",), ("category",), ("month",), ("week",),
+    ("brand", "month"), ("category", "month"), ("brand", "category"),
+    ("category", "size"), ("category", "color"),
+]
+# Extra cuboids materialized from the most frequently requested uncovered roll-ups
+CUBE_ADAPTIVE_CUBOIDS = int(os.getenv("CUBE_ADAPTIVE_CUBOIDS", "5"))
+MAX_LIMIT = 5000
+# Seconds a checked sales_data version is trusted; uploads in this process invalidate sooner
+CUBE_VERSION_TTL_SECONDS = float(os.getenv("CUBE_VERSION_TTL_SECONDS", "60"))
+
+BASE_QUERY = """
+    SELECT brand, category, size, color, month, week,
+           SUM(sales_qty) AS sales_qty, SUM(purchase_qty) AS purchase_qty, COUNT(*) AS sku_rows
+    FROM sales_data
+    WHERE lower(brand) != 'grand total'
+    GROUP BY brand, category, size, color, month, week
+"""
+
+
+class SalesCube:
+    """Base cuboid plus materialized roll-ups; queries are answered from the smallest covering one"""
+
+    def __init__(self):
+        self.version = None
+        self.checked_at = 0.0  # time.monotonic() of the last version check
+        self.base = None
+        self.cuboids = {}
+        self.query_counts = Counter()  # Requested dimension sets that no cuboid covered
+        self.lock = threading.Lock()
+
+    def refresh(self):
+        """Rebuild from sales_data when its version changed.
+
+        The version check scans sales_data, so it runs at most once per
+        CUBE_VERSION_TTL_SECONDS unless invalidate() was called.
+        """
+        if self.version is not None and time.monotonic() - self.checked_at < CUBE_VERSION_TTL_SECONDS:
+            return self.version
+        engine = get_engine()
+        version = get_sales_data_version(engine)
+        with self.lock:
+            self.checked_at = time.monotonic()
+            if version == self.version:
+                return version
+            base = pd.read_sql_query(BASE_QUERY, engine)
+            for dimension in DIMENSIONS:
+                base[dimension] = base[dimension].fillna("").astype(str)
+            self.base = base
+            self.cuboids = {}
+            adaptive = [dims for dims, _ in self.query_counts.most_common(CUBE_ADAPTIVE_CUBOIDS)]
+            for dims in DEFAULT_CUBOIDS + adaptive:
+                key = frozenset(dims)
+                if key not in self.cuboids:
+                    self.cuboids[key] = self._aggregate(base, sorted(key, key=DIMENSIONS.index))
+            self.version = version
+            return version
+
+    def invalidate(self):
+        """sales_data changed; check the version again on the next query"""
+        with self.lock:
+            self.checked_at = 0.0
+
+    @staticmethod
+    def _aggregate(frame, dims):
+        if not dims:
+            return frame[MEASURES].sum().to_frame().T
+        return frame.groupby(list(dims), sort=False, observed=True)[MEASURES].sum().reset_index()
+
+    def _source_for(self, needed):
+        """Smallest materialized cuboid containing every needed dimension, else the base cuboid"""
+        candidates = [(len(frame), dims, frame) for dims, frame in self.cuboids.items() if needed <= dims]
+        if candidates:
+            _, dims, frame = min(candidates, key=lambda c: c[0])
+            return "+".join(sorted(dims, key=DIMENSIONS.index)), frame
+        if needed:
+            self.query_counts[tuple(sorted(needed, key=DIMENSIONS.index))] += 1
+        return "base", self.base
+
+    def query(self, dims=(), filters=None, ranges=None, sort=None, ascending=False, limit=None, refresh=True):
+        """Group by dims after slicing on exact-match filters and (low, high) ranges.
+
+        Drilling down adds a dimension, rolling up removes one; neither touches the database.
+        refresh=False answers from the cube as it is, for callers that refreshed it already.
+        """
+        filters = filters or {}
+        ranges = ranges or {}
+        dims = list(dims)
+        unknown = [d for d in dims + list(filters) + list(ranges) if d not in DIMENSIONS]
+        if unknown:
+            raise ValueError(f"Unknown dimension(s): {', '.join(unknown)}")
+
+        if refresh:
+            self.refresh()
+        with self.lock:
+            cuboid, frame = self._source_for(set(dims) | set(filters) | set(ranges))
+
+        mask = pd.Series(True, index=frame.index)
+        for dimension, values in filters.items():
+            mask &= frame[dimension].str.lower().isin([v.lower() for v in values])
+        for dimension, (low, high) in ranges.items():
+            if low:
+                mask &= frame[dimension] >= low
+            if high:
+                mask &= frame[dimension] <= high
+
+        result = self._aggregate(frame[mask], dims)
+        result["sell_through_pct"] = (
+            result["sales_qty"] * 100.0 / result["purchase_qty"].where(result["purchase_qty"] > 0)
+        ).round(2)
+        sort = sort or ("sales_qty" if not dims else None)
+        if sort:
+            if sort not in result.columns:
+                raise ValueError(f"Unknown sort column '{sort}'")
+            result = result.sort_values(sort, ascending=ascending, kind="stable")
+        elif dims:
+            result = result.sort_values(dims, kind="stable")
+        if limit:
+            result = result.head(limit)
+        return result.reset_index(drop=True), cuboid
+
+
+sales_cube = SalesCube()
+
+
+@cube_bp.route('/cube', methods=['GET'])
+def cube_route():
+    """Roll-up/drill-down/slice over sales_data.
+
+    dims=brand,month groups by those dimensions; brand=a,b or month=2025-06 slices;
+    month_from/month_to and week_from/week_to restrict ranges.
+    """
+    try:
+        dims = [d.strip() for d in request.args.get("dims", "").split(",") if d.strip()]
+        filters = {
+            dimension: [v.strip() for v in request.args[dimension].split(",") if v.strip()]
+            for dimension in DIMENSIONS if request.args.get(dimension)
+        }
+        ranges = {
+            dimension: (request.args.get(f"{dimension}_from"), request.args.get(f"{dimension}_to"))
+            for dimension in ("month", "week")
+            if request.args.get(f"{dimension}_from") or request.args.get(f"{dimension}_to")
+        }
+        limit = min(int(request.args.get("limit", 100)), MAX_LIMIT)
+        result, cuboid = sales_cube.query(
+            dims, filters, ranges,
+            sort=request.args.get("sort"),
+            ascending=request.args.get("order", "desc").lower() == "asc",
+            limit=limit,
+        )
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        return jsonify({"status": "error", "message": f"Error querying cube: {str(e)}"}), 500
+
+    records = result.astype(object).where(result.notna(), None).to_dict(orient="records")
+    return jsonify({
+        "status": "success",
+        "data_version": sales_cube.version,
+        "dims": dims,
+        "cuboid": cuboid,
+        "data": records,
+    })
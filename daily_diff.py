@@ -0,0 +1,340 @@
+# daily_diff.py - Per-SKU changes between consecutive daily files, computed once at ingest
+import os
+import re
+import glob
+import sqlite3
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from flask import Blueprint, request, jsonify
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Blueprint setup for Flask
+daily_diff_bp = Blueprint('daily_diff', __name__)
+
+PROCESSED_DIR = "processed_data"
+LOCAL_DB_PATH = os.path.join(PROCESSED_DIR, "local_sales_data.db")
+DAILY_FILE_PATTERN = re.compile(r'^salesninventory_\d{6}(?:_\d{6})?\.xlsx$')
+
+SKU_KEYS = ["brand", "category", "size", "color"]
+FILE_COLUMNS = {"Brand": "brand", "Category": "category", "Size": "size", "Color": "color",
+                "SalesQty": "sales_qty", "PurchaseQty": "purchase_qty"}
+DIFF_COLUMNS = SKU_KEYS + [
+    "change_type", "previous_sales", "current_sales", "sales_change",
+    "previous_purchase", "current_purchase", "purchase_change",
+]
+MAX_LIMIT = 1000
+
+
+def _ensure_tables(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS sku_keys (
+            sku_id INTEGER PRIMARY KEY,
+            brand TEXT NOT NULL,
+            category TEXT NOT NULL,
+            size TEXT NOT NULL,
+            color TEXT NOT NULL,
+            UNIQUE (brand, category, size, color)
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS daily_snapshot (
+            sku_id INTEGER PRIMARY KEY,
+            sales_qty INTEGER NOT NULL,
+            purchase_qty INTEGER NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS daily_diff_runs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            current_file TEXT NOT NULL,
+            current_file_date TEXT NOT NULL,
+            previous_file TEXT,
+            previous_file_date TEXT,
+            days_between REAL,
+            compared_rows INTEGER NOT NULL,
+            changed_rows INTEGER NOT NULL,
+            computed_at TEXT NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS daily_diff (
+            brand TEXT, category TEXT, size TEXT, color TEXT,
+            change_type TEXT NOT NULL,
+            previous_sales INTEGER, current_sales INTEGER, sales_change INTEGER,
+            previous_purchase INTEGER, current_purchase INTEGER, purchase_change INTEGER
+        )
+    """)
+    # Current-file totals per brand/category, so rates over unchanged SKUs need no full scan
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS daily_diff_totals (
+            brand TEXT, category TEXT, current_sales INTEGER, current_purchase INTEGER
+        )
+    """)
+
+
+def daily_files(directory=PROCESSED_DIR):
+    """Daily file names, oldest first; the names sort in upload date/time order"""
+    return sorted(
+        os.path.basename(path) for path in glob.glob(os.path.join(directory, "salesninventory_*.xlsx"))
+        if DAILY_FILE_PATTERN.match(os.path.basename(path))
+    )
+
+
+def _snapshot_rows(df):
+    """SKU rows of a preprocessed upload or daily file, without the grand total row"""
+    frame = df.rename(columns=FILE_COLUMNS)
+    frame = frame[frame["brand"] != "grand total"]
+    frame = frame[SKU_KEYS + ["sales_qty", "purchase_qty"]].copy()
+    for key in SKU_KEYS:
+        frame[key] = frame[key].fillna("").astype(str)
+    for column in ["sales_qty", "purchase_qty"]:
+        frame[column] = pd.to_numeric(frame[column], errors="coerce").fillna(0).astype(np.int64)
+    return frame
+
+
+def assign_sku_ids(conn, frame, known):
+    """Integer id per row from the persistent sku_keys dictionary, registering unseen SKUs.
+
+    known is the dictionary as loaded from sku_keys; returns (ids, updated dictionary).
+    """
+    merged = frame[SKU_KEYS].merge(known, on=SKU_KEYS, how="left")
+    missing = merged["sku_id"].isna().to_numpy()
+    if missing.any():
+        new_keys = frame.loc[missing, SKU_KEYS].drop_duplicates()
+        next_id = int(known["sku_id"].max()) + 1 if not known.empty else 1
+        new_keys.insert(0, "sku_id", np.arange(next_id, next_id + len(new_keys)))
+        conn.executemany(
+            "INSERT INTO sku_keys (sku_id, brand, category, size, color) VALUES (?, ?, ?, ?, ?)",
+            new_keys.itertuples(index=False, name=None)
+        )
+        known = pd.concat([known, new_keys], ignore_index=True)
+        merged = frame[SKU_KEYS].merge(known, on=SKU_KEYS, how="left")
+    return merged["sku_id"].to_numpy(np.int64), known
+
+
+def build_snapshot(sku_ids, frame):
+    """Sorted unique SKU ids with their summed (sales, purchase) quantities"""
+    ids, inverse = np.unique(sku_ids, return_inverse=True)
+    values = np.zeros((len(ids), 2), dtype=np.int64)
+    np.add.at(values, inverse, frame[["sales_qty", "purchase_qty"]].to_numpy(np.int64))
+    return ids, values
+
+
+def _absent(n):
+    return np.full((n, 2), -1, dtype=np.int64)
+
+
+def diff_snapshots(previous_ids, previous_values, current_ids, current_values):
+    """Sorted-merge two snapshots keyed by ascending SKU id.
+
+    Returns (ids, previous, current, change_type) for the rows that differ only; previous
+    or current is -1 where the SKU is absent from that snapshot.
+    """
+    if len(previous_ids):
+        position = np.minimum(np.searchsorted(previous_ids, current_ids), len(previous_ids) - 1)
+        matched = previous_ids[position] == current_ids
+    else:
+        position = np.zeros(len(current_ids), dtype=np.int64)
+        matched = np.zeros(len(current_ids), dtype=bool)
+
+    changed = matched & (current_values != previous_values[position]).any(axis=1)
+    added = ~matched
+    seen = np.zeros(len(previous_ids), dtype=bool)
+    seen[position[matched]] = True
+    removed = ~seen
+
+    ids = np.concatenate([current_ids[changed], current_ids[added], previous_ids[removed]])
+    previous = np.concatenate([previous_values[position[changed]], _absent(added.sum()), previous_values[removed]])
+    current = np.concatenate([current_values[changed], current_values[added], _absent(removed.sum())])
+    change_type = np.repeat(["changed", "added", "removed"], [changed.sum(), added.sum(), removed.sum()])
+    return ids, previous, current, change_type
+
+
+def _load_stored_snapshot(conn):
+    rows = np.array(conn.execute("SELECT sku_id, sales_qty, purchase_qty FROM daily_snapshot ORDER BY sku_id").fetchall(),
+                    dtype=np.int64).reshape(-1, 3)
+    return rows[:, 0], rows[:, 1:]
+
+
+def _file_date(df):
+    return pd.to_datetime(df["date"]).max()
+
+
+def update_daily_diff(df, file_path, log_output, db_path=LOCAL_DB_PATH):
+    """Diff a just-saved daily file against the file before it and store the changed SKUs.
+
+    The previous snapshot is kept in SQLite as integer SKU ids, so the usual case reads no
+    Excel file. Uploads older than the newest daily file leave the stored diff untouched.
+    """
+    try:
+        current_file = os.path.basename(file_path)
+        files = daily_files(os.path.dirname(file_path) or PROCESSED_DIR)
+        if files and current_file != files[-1]:
+            log_output.info(f"Skipping daily diff: {current_file} is older than {files[-1]}")
+            return None
+        earlier = [name for name in files if name < current_file]
+        previous_file = earlier[-1] if earlier else None
+
+        conn = sqlite3.connect(db_path, timeout=30)
+        try:
+            _ensure_tables(conn)
+            known = pd.read_sql_query("SELECT sku_id, brand, category, size, color FROM sku_keys", conn)
+            current_frame = _snapshot_rows(df)
+            sku_ids, known = assign_sku_ids(conn, current_frame, known)
+            current_ids, current_values = build_snapshot(sku_ids, current_frame)
+            current_date = _file_date(df)
+
+            last_run = conn.execute(
+                "SELECT current_file, current_file_date FROM daily_diff_runs ORDER BY id DESC LIMIT 1"
+            ).fetchone()
+            previous_date = None
+            if previous_file and last_run and last_run[0] == previous_file:
+                previous_ids, previous_values = _load_stored_snapshot(conn)
+                previous_date = pd.Timestamp(last_run[1])
+            elif previous_file:
+                # Stored snapshot is missing or belongs to another file: read the previous file once
+                log_output.info(f"Loading previous daily file {previous_file} for the diff")
+                previous_df = pd.read_excel(os.path.join(os.path.dirname(file_path), previous_file))
+                previous_frame = _snapshot_rows(previous_df)
+                sku_ids, known = assign_sku_ids(conn, previous_frame, known)
+                previous_ids, previous_values = build_snapshot(sku_ids, previous_frame)
+                previous_date = _file_date(previous_df)
+            else:
+                # First daily file: nothing to compare, only the snapshot is stored
+                previous_ids, previous_values = current_ids[:0], current_values[:0]
+
+            if previous_file:
+                ids, previous, current, change_type = diff_snapshots(previous_ids, previous_values, current_ids, current_values)
+            else:
+                ids, previous, current, change_type = current_ids[:0], _absent(0), _absent(0), np.array([], dtype=str)
+
+            diff = known.set_index("sku_id").loc[ids, SKU_KEYS].reset_index(drop=True)
+            diff["change_type"] = change_type
+            previous = np.where(previous < 0, np.nan, previous)
+            current = np.where(current < 0, np.nan, current)
+            diff["previous_sales"], diff["previous_purchase"] = previous[:, 0], previous[:, 1]
+            diff["current_sales"], diff["current_purchase"] = current[:, 0], current[:, 1]
+            diff["sales_change"] = np.nan_to_num(current[:, 0]) - np.nan_to_num(previous[:, 0])
+            diff["purchase_change"] = np.nan_to_num(current[:, 1]) - np.nan_to_num(previous[:, 1])
+            diff = diff[DIFF_COLUMNS].astype({c: "Int64" for c in DIFF_COLUMNS[5:]})
+
+            totals = current_frame.groupby(["brand", "category"], as_index=False)[["sales_qty", "purchase_qty"]].sum()
+            totals.columns = ["brand", "category", "current_sales", "current_purchase"]
+            days_between = (current_date - previous_date).total_seconds() / 86400 if previous_date is not None else None
+
+            with conn:
+                conn.execute("DELETE FROM daily_snapshot")
+                conn.executemany(
+                    "INSERT INTO daily_snapshot (sku_id, sales_qty, purchase_qty) VALUES (?, ?, ?)",
+                    zip(current_ids.tolist(), current_values[:, 0].tolist(), current_values[:, 1].tolist())
+                )
+                conn.execute("DELETE FROM daily_diff")
+                diff.to_sql("daily_diff", conn, if_exists="append", index=False)
+                conn.execute("DELETE FROM daily_diff_totals")
+                totals.to_sql("daily_diff_totals", conn, if_exists="append", index=False)
+                conn.execute(
+                    "INSERT INTO daily_diff_runs (current_file, current_file_date, previous_file, previous_file_date, "
+                    "days_between, compared_rows, changed_rows, computed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (current_file, current_date.isoformat(), previous_file,
+                     previous_date.isoformat() if previous_date is not None else None,
+                     days_between, len(current_ids), len(diff), datetime.now().isoformat())
+                )
+        finally:
+            conn.close()
+    except Exception as e:
+        log_output.error(f"Error computing daily diff: {str(e)}")
+        return None
+
+    if previous_file:
+        log_output.info(f"Daily diff {previous_file} -> {current_file}: {len(diff)} changed SKU(s)")
+    else:
+        log_output.info(f"Stored first daily snapshot {current_file}; no previous file to diff against")
+    return {"current_file": current_file, "previous_file": previous_file, "changed_rows": len(diff)}
+
+
+def get_latest_diff_run(db_path=LOCAL_DB_PATH):
+    """Metadata of the stored diff when it covers the two newest daily files, else None"""
+    files = daily_files(os.path.dirname(db_path) or PROCESSED_DIR)
+    if len(files) < 2 or not os.path.exists(db_path):
+        return None
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    try:
+        row = conn.execute("SELECT * FROM daily_diff_runs ORDER BY id DESC LIMIT 1").fetchone()
+    except sqlite3.OperationalError:
+        return None
+    finally:
+        conn.close()
+    if row is None or (row["previous_file"], row["current_file"]) != (files[-2], files[-1]):
+        return None
+    return dict(row)
+
+
+def execute_diff_query(sql, params=None, db_path=LOCAL_DB_PATH):
+    """Run a query against the stored diff tables; None when no current diff is stored"""
+    if get_latest_diff_run(db_path) is None:
+        return None
+    conn = sqlite3.connect(db_path)
+    try:
+        return pd.read_sql_query(sql, conn, params=params)
+    finally:
+        conn.close()
+
+
+@daily_diff_bp.route('/diff/latest', methods=['GET'])
+def latest_diff_route():
+    """Changed SKUs between the two newest daily files.
+
+    Filter with brand, category, size, color or change_type (changed/added/removed).
+    """
+    try:
+        run = get_latest_diff_run()
+        if run is None:
+            return jsonify({"status": "error", "message": "No diff available for the two latest daily files"}), 404
+
+        sort = request.args.get("sort", "sales_change")
+        if sort not in DIFF_COLUMNS:
+            return jsonify({"status": "error", "message": f"Unknown sort column '{sort}'"}), 400
+        ascending = request.args.get("order", "asc").lower() == "asc"
+        limit = min(int(request.args.get("limit", 100)), MAX_LIMIT)
+        offset = max(int(request.args.get("offset", 0)), 0)
+
+        where, params = [], []
+        for key in SKU_KEYS + ["change_type"]:
+            value = request.args.get(key)
+            if value:
+                where.append(f"{key} = ?")
+                params.append(value.strip().lower())
+        clause = f"WHERE {' AND '.join(where)}" if where else ""
+
+        conn = sqlite3.connect(LOCAL_DB_PATH)
+        try:
+            summary = dict(conn.execute(
+                f"SELECT change_type, COUNT(*) FROM daily_diff {clause} GROUP BY change_type", params
+            ).fetchall())
+            page = pd.read_sql_query(
+                f"SELECT * FROM daily_diff {clause} ORDER BY {sort} {'ASC' if ascending else 'DESC'} LIMIT ? OFFSET ?",
+                conn, params=params + [limit, offset]
+            )
+        finally:
+            conn.close()
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        return jsonify({"status": "error", "message": f"Error reading daily diff: {str(e)}"}), 500
+
+    records = page.astype(object).where(page.notna(), None).to_dict(orient="records")
+    return jsonify({
+        "status": "success",
+        "current_file": run["current_file"],
+        "previous_file": run["previous_file"],
+        "days_between": run["days_between"],
+        "compared_rows": run["compared_rows"],
+        "summary": summary,
+        "total": sum(summary.values()),
+        "data": records,
+    })
@@ -1,6 +1,6 @@
 # data.py
 # Import required libraries
-from flask import Flask, request, jsonify, send_file, render_template, Blueprint
+from flask import Flask, request, jsonify, send_file, render_template, Blueprint, current_app
 import pandas as pd
 import numpy as np
 import os
@@ -10,12 +10,8 @@ from datetime import datetime, timedelta
 from datetime import datetime
 import psycopg2
 import psycopg2.extras
-import matplotlib.pyplot as plt
-import seaborn as sns
 import logging
 from sqlalchemy import create_engine, text
-import plotly.express as px
-import plotly.graph_objects as go
 import shutil
 from dotenv import load_dotenv
 import json
@@ -36,11 +32,19 @@ from schedule_email import schedule_email_bp
 
 
 
-# Import chatbot functionality
-from chatbot import SalesDataChatbot  # Import the chat route handler
-from voice_control import VoiceAssistant
-
+# Chatbot and voice assistant are imported on first use (see chat_with_bot / get_voice_assistant)
 from report import report_bp
+from report_jobs import report_jobs_bp
+from sku_metrics import sku_metrics_bp
+from forecasting import forecasting_bp
+from replenishment import replenishment_bp
+from cube import cube_bp, sales_cube
+from llm_client import get_llm_metrics
+from insights import materialize_insights
+from anomaly_detection import detect_upload_anomalies, record_upload_totals
+from abc_classification import run_abc_classification
+from daily_diff import daily_diff_bp, update_daily_diff
+from preprocessing import FlaskLogger, preprocess_data
 
 # At the top of data.py
 azure_logs = []
@@ -65,13 +69,12 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Flask application setup
-app = Flask(__name__)
-
-
+# Routes live on data_bp; create_app() builds the Flask application
 data_bp = Blueprint('data', __name__)
-chatbot = SalesDataChatbot()
-voice_assistant = VoiceAssistant()
+
+# Background services started by create_app() and in gunicorn workers (gunicorn.conf.py),
+# comma-separated: "email_scheduler", "azure_monitoring". Importing data never starts them.
+BACKGROUND_SERVICES = os.getenv("BACKGROUND_SERVICES", "")
 
 
 # Define constants
@@ -111,97 +114,6 @@ def get_sqlalchemy_engine():
     )
 
 # Function to preprocess the uploaded file
-def preprocess_data(file_path, selected_date, log_output):
-    """Preprocess the uploaded Excel file, removing the last line if it’s 'Grand Total' in the first column"""
-    log_output.info(f"Starting your file…")
-    log_output.info(f"Starting preprocessing of file: {os.path.basename(file_path)}")
-    
-    try:
-        df = pd.read_excel(file_path, skiprows=9)
-        log_output.info(f"File loaded. Raw shape: {df.shape}")
-        
-        first_col_name = df.columns[0]
-        last_row_first_col = str(df.iloc[-1][first_col_name]).strip().lower()
-        if 'grand total' in last_row_first_col:
-            df = df.iloc[:-1].copy()
-            log_output.info("Removed the last row as it contained 'Grand Total' in the first column")
-        else:
-            log_output.info("Last row does not contain 'Grand Total' in the first column; proceeding as is")
-        
-        required_cols = ['Brand', 'Category', 'Size', 'MRP', 'Color', 'SalesQty', 'PurchaseQty']
-        if not all(col in df.columns for col in required_cols):
-            missing_cols = [col for col in required_cols if col not in df.columns]
-            log_output.error(f"Missing required columns: {missing_cols}")
-            return None
-        
-        df = df[required_cols].copy()
-        
-        for col in ['Brand', 'Category', 'Size', 'Color']:
-            df[col] = df[col].str.strip().str.lower()
-        
-        raw_sales_total = df['SalesQty'].sum()
-        raw_purchase_total = df['PurchaseQty'].sum()
-        sales_non_zero = (df['SalesQty'].fillna(0) != 0).sum()
-        purchase_non_zero = (df['PurchaseQty'].fillna(0) != 0).sum()
-        log_output.info(f"Raw totals before cleaning - SalesQty: {int(raw_sales_total)} (non-zero: {sales_non_zero}), PurchaseQty: {int(raw_purchase_total)} (non-zero: {purchase_non_zero})")
-        
-        for col in ['Brand', 'Category', 'Size', 'Color']:
-            df[col] = df[col].fillna('unknown')
-        df['MRP'] = df['MRP'].fillna(0.0)
-        df['SalesQty'] = pd.to_numeric(df['SalesQty'], errors='coerce').fillna(0).astype(int)
-        df['PurchaseQty'] = pd.to_numeric(df['PurchaseQty'], errors='coerce').fillna(0).astype(int)
-        
-        cleaned_sales_total = df['SalesQty'].sum()
-        cleaned_purchase_total = df['PurchaseQty'].sum()
-        log_output.info(f"Totals after numeric cleaning - SalesQty: {int(cleaned_sales_total)}, PurchaseQty: {int(cleaned_purchase_total)}")
-        
-        selected_date_ts = pd.to_datetime(selected_date)
-        df['date'] = selected_date_ts
-        df['Week'] = df['date'].dt.strftime('%Y-%W')
-        df['Month'] = df['date'].dt.strftime('%Y-%m')
-        
-        df['record_id'] = df.apply(
-            lambda x: f"{x['Brand']}_{x['Category']}_{x['Size']}_{x['Color']}_{x['Month']}", 
-            axis=1
-        )
-        log_output.info("Checking for duplicates in uploaded file...")
-        before_dedup = len(df)
-        
-        if df['record_id'].duplicated().any():
-            log_output.info(f"Found {df['record_id'].duplicated().sum()} duplicate record_ids to process")
-            final_df = df.groupby('record_id').agg({
-                'Brand': 'first', 'Category': 'first', 'Size': 'first', 'MRP': 'first',
-                'Color': 'first', 'SalesQty': 'sum', 'PurchaseQty': 'sum', 'date': 'first',
-                'Week': 'first', 'Month': 'first'
-            }).reset_index(drop=True)
-            log_output.info(f"After grouping duplicates - SalesQty sum: {int(final_df['SalesQty'].sum())}, PurchaseQty sum: {int(final_df['PurchaseQty'].sum())}")
-        else:
-            final_df = df.drop('record_id', axis=1)
-            log_output.info("No duplicates found")
-        
-        after_dedup = len(final_df)
-        log_output.info(f"Reduced to {after_dedup} unique records from {before_dedup} total rows")
-        
-        total_sales = int(final_df['SalesQty'].sum())
-        total_purchases = int(final_df['PurchaseQty'].sum())
-        log_output.info(f"Calculated grand totals - SalesQty: {total_sales}, PurchaseQty: {total_purchases}")
-        
-        grand_total_row = pd.DataFrame({
-            'Brand': ['grand total'], 'Category': [''], 'Size': [''], 'MRP': [0.0], 
-            'Color': [''], 'SalesQty': [total_sales], 'PurchaseQty': [total_purchases], 
-            'date': [selected_date_ts], 'Week': [selected_date_ts.strftime('%Y-%W')], 
-            'Month': [selected_date_ts.strftime('%Y-%m')]
-        })
-        
-        final_df_with_total = pd.concat([grand_total_row, final_df], ignore_index=True)
-        
-        log_output.info(f"Preprocessing complete with grand total at top. Final shape: {final_df_with_total.shape}")
-        return final_df_with_total
-    
-    except Exception as e:
-        log_output.error(f"Error during preprocessing: {str(e)}")
-        return None
-
 # Function to save preprocessed file with YYMMDD format
 def save_preprocessed_file(df, selected_date, log_output):
     """Save the preprocessed dataframe as Excel file with YYMMDD format"""
@@ -314,7 +226,28 @@ def enforce_retention_policy(log_output):
         return False
 
 # Updated function to upload data to Neon DB with month-specific logic
+# Uploads decide between insert and merge from what the month already holds, so two uploads
+# for the same month (e.g. an Azure batch and a manual upload) must not interleave
+_month_upload_locks = {}
+_month_upload_locks_guard = threading.Lock()
+
+
+def month_upload_lock(month):
+    with _month_upload_locks_guard:
+        return _month_upload_locks.setdefault(month, threading.Lock())
+
+
 def upload_to_database(df, selected_date, log_output):
+    """Upload preprocessed data to Neon DB; uploads for the same month run one at a time"""
+    upload_month = pd.to_datetime(selected_date).strftime('%Y-%m')
+    with month_upload_lock(upload_month):
+        uploaded = _upload_month_data(df, selected_date, log_output)
+    if uploaded:
+        sales_cube.invalidate()
+    return uploaded
+
+
+def _upload_month_data(df, selected_date, log_output):
     """Upload preprocessed data to Neon DB, treating first upload of new month as new records"""
     conn = get_db_connection()
     if not conn:
@@ -577,10 +510,27 @@ def update_neon_grand_total(log_output):
             conn.close()
 
 # Get data from Neon DB for preview
-def get_database_preview(log_output):
-    """Get latest 1000 records from Neon DB, ensuring Grand Total is first"""
+def get_database_preview(log_output, abc_class=None, abc_scope="overall"):
+    """Get latest 1000 records from Neon DB, ensuring Grand Total is first.
+
+    With abc_class, only records whose SKU has that ABC class for its month (within
+    abc_scope: overall, category or brand) are returned, plus the grand total row.
+    """
     try:
         engine = get_sqlalchemy_engine()
+        if abc_class:
+            query = text("""
+            SELECT s.*, a.abc_class FROM sales_data s
+            LEFT JOIN abc_classes a
+              ON a.scope = :scope AND a.period = s.month AND a.brand = s.brand
+             AND a.category = s.category AND a.size = s.size AND a.color = s.color
+            WHERE s.brand = 'grand total' OR a.abc_class = :abc_class
+            ORDER BY CASE WHEN s.brand = 'grand total' THEN 0 ELSE 1 END, s.created_at DESC
+            LIMIT 1000
+            """)
+            df = pd.read_sql(query, engine, params={"scope": abc_scope, "abc_class": abc_class.upper()})
+            log_output.info(f"Retrieved {len(df)} latest class {abc_class.upper()} records from Neon DB")
+            return df
         query = """
         SELECT * FROM sales_data 
         ORDER BY CASE WHEN brand = 'grand total' THEN 0 ELSE 1 END, created_at DESC 
@@ -686,6 +636,25 @@ def get_data_preview():
 # Get aggregated data for visualizations with date filters
 def get_visualization_data(log_output, start_date=None, end_date=None):
     """Get aggregated data from Neon DB with optional date range"""
+    if not (start_date and end_date):
+        # Without a created_at range every chart is a roll-up of the sales cube,
+        # with a single version check for all four
+        try:
+            totals = {"sales_qty": "total_sales", "purchase_qty": "total_purchases"}
+            sales_cube.refresh()
+            views = {
+                "brand": sales_cube.query(["brand"], sort="sales_qty", limit=10, refresh=False)[0],
+                "category": sales_cube.query(["category"], sort="sales_qty", limit=10, refresh=False)[0],
+                "monthly": sales_cube.query(["month"], refresh=False)[0],
+                "weekly": sales_cube.query(["week"], refresh=False)[0],
+            }
+            log_output.info("Retrieved aggregated data for visualizations from the sales cube")
+            return {
+                name: df.rename(columns=totals)[[df.columns[0], "total_sales", "total_purchases"]]
+                for name, df in views.items()
+            }
+        except Exception as e:
+            log_output.warning(f"Sales cube unavailable, querying the database: {str(e)}")
     try:
         engine = get_sqlalchemy_engine()
         where_clause = "WHERE created_at BETWEEN %s AND %s AND brand != 'grand total'" if start_date and end_date else "WHERE brand != 'grand total'"
@@ -821,6 +790,8 @@ def convert_numpy_to_list(obj):
 
 def create_visualizations(data):
     """Create visualizations using Plotly Graph Objects with a single trace per chart"""
+    import plotly.graph_objects as go
+
     visualizations = {}
     
     if not data:
@@ -920,38 +891,12 @@ def create_visualizations(data):
     
     return visualizations
 
-# Custom logger for Flask
-class FlaskLogger:
-    def __init__(self):
-        self.logs = []
-    
-    def info(self, message):
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        log_entry = f"[INFO] {timestamp} - {message}"
-        self.logs.append(log_entry)
-        logger.info(message)
-    
-    def error(self, message):
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        log_entry = f"[ERROR] {timestamp} - {message}"
-        self.logs.append(log_entry)
-        logger.error(message)
-    
-    def warning(self, message):
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        log_entry = f"[WARNING] {timestamp} - {message}"
-        self.logs.append(log_entry)
-        logger.warning(message)
-    
-    def get_logs(self):
-        return self.logs[-20:]  # Return last 20 logs
-
 # Flask Routes
-@app.route('/')
+@data_bp.route('/')
 def serve_index():
     return render_template('other.html', now=datetime.now)
 
-@app.route('/process', methods=['POST'])
+@data_bp.route('/process', methods=['POST'])
 def process_data():
     log_output = FlaskLogger()
     if 'file' not in request.files or 'date' not in request.form:
@@ -975,11 +920,17 @@ def process_data():
         os.remove(temp_file_path)
         return jsonify({"error": "Failed to preprocess data", "logs": log_output.get_logs()}), 500
 
+    # Compare this upload's totals with earlier uploads before it reaches the database
+    anomalies = detect_upload_anomalies(df, log_output)
+
     preprocessed_path = save_preprocessed_file(df, selected_date, log_output)
     if not preprocessed_path:
         os.remove(temp_file_path)
         return jsonify({"error": "Failed to save preprocessed file", "logs": log_output.get_logs()}), 500
 
+    # Per-SKU changes against the previous daily file, for "what changed since yesterday"
+    update_daily_diff(df, preprocessed_path, log_output)
+
     enforce_retention_policy(log_output)
     os.remove(temp_file_path)
 
@@ -989,7 +940,10 @@ def process_data():
             results = upload_to_database(df, selected_date, log_output)
             if results:
                 log_output.info("Database upload completed in background.")
+                record_upload_totals(df, log_output)
+                run_abc_classification(log_output, selected_date)
                 update_local_sqlite(log_output)
+                materialize_insights(log_output)
                 master_file = os.path.join(PROCESSED_DIR, MASTER_SUMMARY_FILE)
                 if os.path.exists(master_file):
                     master_df = pd.read_excel(master_file)
@@ -1031,23 +985,30 @@ def process_data():
             "master_total_purchases": "updating...",
             "file_name": file_name
         },
+        "anomalies": anomalies,
         "logs": log_output.get_logs()
     }
     log_output.info("Data pipeline started successfully. Background processing in progress.")
     return jsonify(response)
 
 
-@app.route('/download/<file_name>', methods=['GET'])
+@data_bp.route('/download/<file_name>', methods=['GET'])
 def download_file(file_name):
     file_path = os.path.join(PROCESSED_DIR, file_name)
     if os.path.exists(file_path):
         return send_file(file_path, as_attachment=True, download_name=file_name)
     return jsonify({"error": "File not found"}), 404
 
-@app.route('/preview', methods=['GET'])
+@data_bp.route('/preview', methods=['GET'])
 def get_preview():
     log_output = FlaskLogger()
-    preview_df = get_database_preview(log_output)
+    abc_class = request.args.get('abc_class')
+    abc_scope = request.args.get('abc_scope', 'overall')
+    if abc_class and abc_class.upper() not in ('A', 'B', 'C'):
+        return jsonify({"error": "abc_class must be A, B or C", "logs": log_output.get_logs()}), 400
+    if abc_scope not in ('overall', 'category', 'brand'):
+        return jsonify({"error": "abc_scope must be overall, category or brand", "logs": log_output.get_logs()}), 400
+    preview_df = get_database_preview(log_output, abc_class, abc_scope)
     
     if preview_df.empty:
         return jsonify({
@@ -1090,7 +1051,7 @@ def get_preview():
     }
     return jsonify(response)
 
-@app.route('/grand-total', methods=['GET'])
+@data_bp.route('/grand-total', methods=['GET'])
 def get_grand_total():
     log_output = FlaskLogger()
     preview_df = get_database_preview(log_output)
@@ -1122,7 +1083,7 @@ def get_grand_total():
     }
     return jsonify(response)
 
-@app.route('/visualizations', methods=['GET', 'POST'])
+@data_bp.route('/visualizations', methods=['GET', 'POST'])
 def get_visualizations():
     log_output = FlaskLogger()
     
@@ -1144,8 +1105,22 @@ def get_visualizations():
     visualizations = create_visualizations(viz_data)
     return jsonify({"visualizations": visualizations, "logs": log_output.get_logs()})
 
+_voice_assistant = None
+_voice_assistant_lock = threading.Lock()
+
+
+def get_voice_assistant():
+    """The voice assistant, created (with its Gemini client) on the first voice command"""
+    global _voice_assistant
+    with _voice_assistant_lock:
+        if _voice_assistant is None:
+            from voice_control import VoiceAssistant
+            _voice_assistant = VoiceAssistant()
+        return _voice_assistant
+
+
 # Register the chatbot route from chatbot.py
-@app.route('/chatbot', methods=['POST'])
+@data_bp.route('/chatbot', methods=['POST'])
 def chat_with_bot():
     data = request.get_json()
     question = data.get("question", "")
@@ -1153,10 +1128,16 @@ def chat_with_bot():
     if not question:
         return jsonify({"error": "No question provided"}), 400
 
-    response_text = chatbot.process_user_question(question)
+    from chatbot import get_chatbot
+    response_text = get_chatbot().process_user_question(question)
     return jsonify({"message": response_text}) 
 
-@app.route("/local-files")
+@data_bp.route('/llm/metrics', methods=['GET'])
+def llm_metrics():
+    """Latency, error rate and token usage of the shared Gemini client"""
+    return jsonify(get_llm_metrics())
+
+@data_bp.route("/local-files")
 def serve_local_file_data():
     try:
         preview = get_data_preview()
@@ -1165,7 +1146,7 @@ def serve_local_file_data():
         logger.error(f"Error serving local files: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
-@app.route('/delete/<file_name>', methods=['DELETE'])
+@data_bp.route('/delete/<file_name>', methods=['DELETE'])
 def delete_file(file_name):
     file_path = os.path.join(PROCESSED_DIR, file_name)
     if file_name == 'master_summary.xlsx':
@@ -1180,7 +1161,7 @@ def delete_file(file_name):
             return jsonify({"error": str(e)}), 500
     return jsonify({"error": "File not found"}), 404
 
-@app.route('/download-zip', methods=['GET'])
+@data_bp.route('/download-zip', methods=['GET'])
 def download_zip():
     try:
         memory_file = BytesIO()
@@ -1195,21 +1176,20 @@ def download_zip():
         return jsonify({"error": str(e)}), 500
 
 # Register voice control route
-data_bp.route('/voice_command', methods=['POST'])(voice_assistant.process_command)
-
-app.register_blueprint(data_bp)
-app.register_blueprint(report_bp)
+@data_bp.route('/voice_command', methods=['POST'])
+def voice_command():
+    return get_voice_assistant().process_command()
     
 #lance automation code continued
 scheduler_instance = None
 
-def start_azure_monitoring():
+def start_azure_monitoring(app=None):
     """Start Azure file monitoring"""
     global scheduler_instance
     if scheduler_instance is None:
         try:
             from scheduler import init_scheduler
-            scheduler_instance = init_scheduler(app)
+            scheduler_instance = init_scheduler(app or current_app._get_current_object())
             logger.info("Azure file monitoring started successfully")
             return True
         except Exception as e:
@@ -1231,7 +1211,7 @@ def stop_azure_monitoring():
             return False
     return True
 
-# @app.route('/azure/status')
+# @data_bp.route('/azure/status')
 # def azure_status():
 #     """Get Azure monitoring status"""
 #     global scheduler_instance
@@ -1283,7 +1263,7 @@ def stop_azure_monitoring():
 #             "last_check": datetime.now().isoformat()
 #         }), 500
 
-@app.route('/azure/status')
+@data_bp.route('/azure/status')
 def azure_status():
     """Get Azure monitoring status"""
     global scheduler_instance
@@ -1297,18 +1277,10 @@ def azure_status():
         # Get scheduler status
         scheduler_status = scheduler_instance.get_status() if scheduler_instance else {"running": False}
         
-        # Try to get processed files (implement this if you want to show processed files)
+        # Last 5 processed files, from the local manifest rather than listing the processed container
         processed_files = []
         try:
-            processed_container_client = azure_storage.blob_service_client.get_container_client(azure_storage.processed_container_name)
-            processed_blobs = processed_container_client.list_blobs()
-            for blob in processed_blobs:
-                processed_files.append({
-                    "name": blob.name,
-                    "date": blob.last_modified.strftime("%Y-%m-%d %H:%M:%S") if hasattr(blob, "last_modified") else ""
-                })
-            # Optionally, sort and limit to last 5
-            processed_files = sorted(processed_files, key=lambda x: x["date"], reverse=True)[:5]
+            processed_files = azure_storage.manifest.recent_processed(5)
         except Exception as e:
             append_azure_log(f"Error fetching processed files: {str(e)}", level="ERROR")
             processed_files = []
@@ -1321,6 +1293,7 @@ def azure_status():
             "scheduler": {
                 "running": scheduler_status.get("running", False),
                 "mode": scheduler_status.get("mode", "unknown"),
+                "trigger": scheduler_status.get("trigger", "poll"),
                 "next_run": scheduler_status.get("next_run"),
                 "processing_files": scheduler_status.get("processing_files", [])
             },
@@ -1343,19 +1316,19 @@ def azure_status():
             "last_check": datetime.now().isoformat()
         }), 500
 
-@app.route('/azure/start', methods=['POST'])
+@data_bp.route('/azure/start', methods=['POST'])
 def start_monitoring():
     """Start Azure monitoring manually"""
-    success = start_azure_monitoring()
+    success = start_azure_monitoring(current_app._get_current_object())
     return jsonify({"success": success, "message": "Monitoring started" if success else "Failed to start monitoring"})
 
-@app.route('/azure/stop', methods=['POST'])
+@data_bp.route('/azure/stop', methods=['POST'])
 def stop_monitoring():
     """Stop Azure monitoring manually"""
     success = stop_azure_monitoring()
     return jsonify({"success": success, "message": "Monitoring stopped" if success else "Failed to stop monitoring"})
 
-@app.route('/azure/process/<filename>', methods=['POST'])
+@data_bp.route('/azure/process/<filename>', methods=['POST'])
 def manual_process_file(filename):
     """Manually trigger processing of a specific file"""
     global scheduler_instance
@@ -1372,7 +1345,7 @@ def manual_process_file(filename):
         logger.error(f"Manual processing failed: {str(e)}")
         return jsonify({"success": False, "message": str(e)}), 500
 
-@app.route('/azure/config', methods=['GET', 'POST'])
+@data_bp.route('/azure/config', methods=['GET', 'POST'])
 def azure_config():
     """Get or update Azure monitoring configuration"""
     global scheduler_instance
@@ -1401,7 +1374,7 @@ def azure_config():
         if scheduler_instance:
             stop_azure_monitoring()
         
-        success = start_azure_monitoring()
+        success = start_azure_monitoring(current_app._get_current_object())
         
         return jsonify({
             "success": success,
@@ -1409,7 +1382,7 @@ def azure_config():
             "schedule": "12:15 AM daily" if production_mode else "Every 30 seconds"
         })
 
-@app.route('/azure/force-check', methods=['POST'])
+@data_bp.route('/azure/force-check', methods=['POST'])
 def force_azure_check():
     """Force an immediate check for new Azure files"""
     global scheduler_instance
@@ -1442,23 +1415,63 @@ def force_azure_check():
             "success": False,
             "message": f"Error: {str(e)}"
         }), 500
-    
-app.register_blueprint(schedule_email_bp)
+
+
+def start_background_services(app, services):
+    """Start the named background services in this process"""
+    if "email_scheduler" in services:
+        from schedule_email import start_email_services
+        start_email_services()
+    if "azure_monitoring" in services:
+        start_azure_monitoring(app)
+
+
+def stop_background_services():
+    from schedule_email import stop_email_services
+    stop_email_services()
+    stop_azure_monitoring()
+
+
+def configured_background_services():
+    return [name.strip() for name in BACKGROUND_SERVICES.split(",") if name.strip()]
+
+
+def create_app(services=None):
+    """Build the Flask app. Nothing heavy happens here: the database, schedulers, chatbot,
+    Gemini client and plotting/PDF libraries are all initialised on first use.
+
+    services lists the background services to start (default: BACKGROUND_SERVICES).
+    The schedulers elect a leader, so enabling them in several processes is safe.
+    """
+    app = Flask(__name__)
+    for blueprint in (data_bp, report_bp, report_jobs_bp, sku_metrics_bp, forecasting_bp,
+                      replenishment_bp, cube_bp, daily_diff_bp, schedule_email_bp):
+        app.register_blueprint(blueprint)
+
+    if services is None:
+        services = configured_background_services()
+    if services:
+        start_background_services(app, services)
+    return app
+
+
+# WSGI entry point (gunicorn data:app). Importing data starts nothing: worker processes
+# spawned for preprocessing and charts import it too. gunicorn.conf.py starts
+# BACKGROUND_SERVICES once a gunicorn worker has booted.
+app = create_app(services=[])
 
 
 if __name__ == "__main__":
-    # Only start Azure monitoring if not in Flask's reloader process
-    import os
+    # The development server runs the schedulers itself, but only in Flask's reloader child
     if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
-        # This is the reloaded process, start monitoring here
-        start_azure_monitoring()
+        start_background_services(app, ["email_scheduler", "azure_monitoring"])
     
     try:
         app.run(debug=True, host='0.0.0.0', port=5000, use_reloader=True)
     finally:
         # Clean shutdown
         if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
-            stop_azure_monitoring()
+            stop_background_services()
 
 
 
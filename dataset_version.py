@@ -0,0 +1,23 @@
+# dataset_version.py - Fingerprint of the processed data files that reports are built from
+import os
+import glob
+import hashlib
+
+PROCESSED_DIR = "processed_data"
+
+
+def get_dataset_version(processed_dir=PROCESSED_DIR) -> str:
+    """Short hash of the processed XLSX files (name, size, mtime).
+
+    Changes whenever an upload or Azure ingestion rewrites master_summary.xlsx or adds a
+    daily salesninventory file, so two reports with the same version were built from
+    identical inputs.
+    """
+    digest = hashlib.sha256()
+    for path in sorted(glob.glob(os.path.join(processed_dir, "*.xlsx"))):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue  # File replaced while listing
+        digest.update(f"{os.path.basename(path)}:{stat.st_size}:{stat.st_mtime_ns}\n".encode("utf-8"))
+    return digest.hexdigest()[:12]
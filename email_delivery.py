@@ -0,0 +1,209 @@
+# email_delivery.py - Pooled SMTP delivery of report emails with per-recipient status
+import os
+import time
+import queue
+import logging
+import smtplib
+import threading
+from email import policy
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from email.mime.application import MIMEApplication
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_USERNAME = os.getenv("SMTP_USERNAME")
+SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
+# Set to false only for local SMTP stand-ins that do not offer TLS
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "true").lower() == "true"
+# Authenticated SMTP connections kept open between sends
+EMAIL_SMTP_POOL_SIZE = int(os.getenv("EMAIL_SMTP_POOL_SIZE", "3"))
+# Recipients (or BCC batches) being sent concurrently
+EMAIL_SEND_WORKERS = int(os.getenv("EMAIL_SEND_WORKERS", "4"))
+# Extra attempts per recipient after a temporary failure
+EMAIL_SEND_RETRIES = int(os.getenv("EMAIL_SEND_RETRIES", "2"))
+# Recipients per message in BCC mode
+EMAIL_BCC_BATCH_SIZE = int(os.getenv("EMAIL_BCC_BATCH_SIZE", "50"))
+# Idle connections older than this are checked with NOOP before reuse
+SMTP_IDLE_CHECK_SECONDS = 30
+RETRY_BACKOFF_SECONDS = 0.5
+
+
+class SMTPConnectionPool:
+    """At most `size` logged-in SMTP connections, reused across messages and threads"""
+
+    def __init__(self, server=SMTP_SERVER, port=SMTP_PORT, username=SMTP_USERNAME,
+                 password=SMTP_PASSWORD, starttls=SMTP_STARTTLS, size=EMAIL_SMTP_POOL_SIZE, timeout=30):
+        self.server = server
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+        self.idle = queue.LifoQueue()
+        self.slots = threading.BoundedSemaphore(size)
+
+    def _connect(self):
+        connection = smtplib.SMTP(self.server, self.port, timeout=self.timeout)
+        if self.starttls:
+            connection.starttls()
+        if self.username:
+            connection.login(self.username, self.password)
+        return connection
+
+    def acquire(self):
+        """An open connection; blocks while all `size` connections are in use"""
+        self.slots.acquire()
+        try:
+            while True:
+                try:
+                    connection, released_at = self.idle.get_nowait()
+                except queue.Empty:
+                    return self._connect()
+                if time.monotonic() - released_at < SMTP_IDLE_CHECK_SECONDS:
+                    return connection
+                try:
+                    if connection.noop()[0] == 250:
+                        return connection
+                except smtplib.SMTPException:
+                    pass
+                self._close(connection)
+        except Exception:
+            self.slots.release()
+            raise
+
+    def release(self, connection, broken=False):
+        if broken:
+            self._close(connection)
+        else:
+            self.idle.put((connection, time.monotonic()))
+        self.slots.release()
+
+    @staticmethod
+    def _close(connection):
+        try:
+            connection.quit()
+        except Exception:
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+    def close_all(self):
+        while True:
+            try:
+                connection, _ = self.idle.get_nowait()
+            except queue.Empty:
+                return
+            self._close(connection)
+
+
+class PreparedMessage:
+    """A message encoded once; only the To header is added per recipient"""
+
+    def __init__(self, from_email, subject, body, subtype="html", attachment_path=None):
+        msg = MIMEMultipart()
+        msg['Subject'] = subject
+        msg['From'] = from_email
+        msg.attach(MIMEText(body, subtype))
+        if attachment_path:
+            with open(attachment_path, 'rb') as f:
+                attachment = MIMEApplication(f.read(), _subtype="pdf")
+            attachment.add_header('Content-Disposition', 'attachment',
+                                  filename=os.path.basename(attachment_path))
+            msg.attach(attachment)
+        self.from_email = from_email
+        self.encoded = msg.as_bytes(policy=policy.SMTP)
+
+    def for_recipient(self, to_header):
+        return f"To: {to_header}\r\n".encode("utf-8") + self.encoded
+
+
+class EmailDeliveryService:
+    """Sends prepared messages over a connection pool on a bounded worker pool"""
+
+    def __init__(self, pool=None, workers=EMAIL_SEND_WORKERS, retries=EMAIL_SEND_RETRIES):
+        self.pool = pool or SMTPConnectionPool()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="email-send")
+        self.retries = retries
+
+    def _send(self, message, to_header, envelope_recipients):
+        """One SMTP transaction with retries; returns {recipient: (status, attempts, error)}"""
+        data = message.for_recipient(to_header)
+        error = None
+        for attempt in range(1, self.retries + 2):
+            connection = None
+            try:
+                connection = self.pool.acquire()
+                refused = connection.sendmail(message.from_email, envelope_recipients, data)
+                self.pool.release(connection)
+                return {
+                    recipient: ("failed", attempt, str(refused[recipient])) if recipient in refused
+                    else ("sent", attempt, None)
+                    for recipient in envelope_recipients
+                }
+            except smtplib.SMTPRecipientsRefused as e:
+                self.pool.release(connection)
+                return {recipient: ("failed", attempt, str(e.recipients.get(recipient, e)))
+                        for recipient in envelope_recipients}
+            except (smtplib.SMTPResponseException, smtplib.SMTPSenderRefused) as e:
+                # 5xx replies are permanent; 4xx are worth another attempt
+                if connection is not None:
+                    self.pool.release(connection)
+                error = str(e)
+                if getattr(e, "smtp_code", 0) >= 500:
+                    break
+            except Exception as e:
+                if connection is not None:
+                    self.pool.release(connection, broken=True)
+                error = str(e)
+            if attempt <= self.retries:
+                logger.warning(f"Send to {to_header} failed (attempt {attempt}): {error}; retrying")
+                time.sleep(RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1))
+        return {recipient: ("failed", attempt, error) for recipient in envelope_recipients}
+
+    def deliver(self, message, recipients, bcc=False, bcc_batch_size=EMAIL_BCC_BATCH_SIZE):
+        """Send to every recipient; returns one status dict per recipient.
+
+        With bcc=True recipients are sent in batches of bcc_batch_size as one message with
+        undisclosed recipients, instead of one message per recipient.
+        """
+        if bcc:
+            batches = [recipients[i:i + bcc_batch_size] for i in range(0, len(recipients), bcc_batch_size)]
+            futures = [self.executor.submit(self._send, message, "undisclosed-recipients:;", batch)
+                       for batch in batches]
+        else:
+            futures = [self.executor.submit(self._send, message, recipient, [recipient])
+                       for recipient in recipients]
+
+        results = []
+        for future in futures:
+            for recipient, (status, attempts, error) in future.result().items():
+                results.append({"recipient": recipient, "status": status, "attempts": attempts, "error": error})
+        sent = sum(1 for result in results if result["status"] == "sent")
+        logger.info(f"Email delivery complete. Sent to {sent}/{len(results)} recipients")
+        return results
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.pool.close_all()
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_delivery_service():
+    """Process-wide delivery service, created on first use"""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = EmailDeliveryService()
+        return _service
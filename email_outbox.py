@@ -0,0 +1,234 @@
+# email_outbox.py - Durable per-recipient outbox for scheduled report emails
+import os
+import uuid
+import logging
+import threading
+from psycopg2.extras import Json, DictCursor
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Threads claiming and sending outbox rows in each process
+EMAIL_OUTBOX_WORKERS = int(os.getenv("EMAIL_OUTBOX_WORKERS", "2"))
+# Rows a worker claims at once
+EMAIL_OUTBOX_BATCH_SIZE = int(os.getenv("EMAIL_OUTBOX_BATCH_SIZE", "20"))
+# Attempts before a row is moved to the dead state
+EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.getenv("EMAIL_OUTBOX_MAX_ATTEMPTS", "5"))
+# First retry delay; doubled after every failed attempt
+EMAIL_OUTBOX_BACKOFF_SECONDS = float(os.getenv("EMAIL_OUTBOX_BACKOFF_SECONDS", "60"))
+# How long a claimed row stays locked; rows of a crashed worker are retried after this
+EMAIL_OUTBOX_LEASE_SECONDS = float(os.getenv("EMAIL_OUTBOX_LEASE_SECONDS", "900"))
+# Longest idle wait between checks for retries coming due
+EMAIL_OUTBOX_IDLE_SECONDS = float(os.getenv("EMAIL_OUTBOX_IDLE_SECONDS", "300"))
+
+OUTBOX_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS email_outbox (
+        id UUID PRIMARY KEY,
+        run_id UUID NOT NULL,
+        scheduled_report_id UUID REFERENCES scheduled_reports(id) ON DELETE CASCADE,
+        recipient VARCHAR(320) NOT NULL,
+        subject VARCHAR(200) NOT NULL,
+        message TEXT,
+        template_id VARCHAR(50),
+        status VARCHAR(20) NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        next_attempt_at TIMESTAMP NOT NULL DEFAULT LOCALTIMESTAMP,
+        locked_until TIMESTAMP,
+        last_error TEXT,
+        report_path VARCHAR(255),
+        data_version VARCHAR(64),
+        created_at TIMESTAMP NOT NULL DEFAULT LOCALTIMESTAMP,
+        sent_at TIMESTAMP,
+        UNIQUE (run_id, recipient)
+    );
+
+    CREATE INDEX IF NOT EXISTS idx_email_outbox_due
+    ON email_outbox(status, next_attempt_at);
+'''
+
+# Pending rows that are due, plus rows whose worker's lease ran out
+CLAIM_SQL = '''
+    UPDATE email_outbox
+    SET status = 'sending',
+        attempts = attempts + 1,
+        locked_until = LOCALTIMESTAMP + make_interval(secs => %s)
+    WHERE id IN (
+        SELECT id FROM email_outbox
+        WHERE (status = 'pending' AND next_attempt_at <= LOCALTIMESTAMP)
+           OR (status = 'sending' AND locked_until < LOCALTIMESTAMP)
+        ORDER BY next_attempt_at
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING *
+'''
+
+
+def enqueue_schedule_run(cursor, schedule_data, recipients):
+    """Add one outbox row per recipient for a schedule run, in the caller's transaction"""
+    run_id = str(uuid.uuid4())
+    for recipient in recipients:
+        cursor.execute('''
+            INSERT INTO email_outbox (id, run_id, scheduled_report_id, recipient, subject, message, template_id)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+        ''', (
+            str(uuid.uuid4()), run_id, str(schedule_data['id']), recipient,
+            schedule_data['subject'], schedule_data.get('message'), schedule_data.get('template_id') or 'default',
+        ))
+    return run_id
+
+
+class OutboxWorkerPool:
+    """Worker threads that claim outbox rows with SKIP LOCKED and send them run by run.
+
+    send_run(rows) builds/sends one run's email and returns (results, report_path,
+    data_version) where results are the delivery service's per-recipient dicts.
+    """
+
+    def __init__(self, get_connection, send_run, workers=EMAIL_OUTBOX_WORKERS):
+        self.get_connection = get_connection
+        self.send_run = send_run
+        self.workers = workers
+        self.threads = []
+        self.stop_flag = threading.Event()
+        self.condition = threading.Condition()
+        self.pending_wakeups = 0
+
+    def start(self):
+        self.threads = [t for t in self.threads if t.is_alive()]
+        self.stop_flag.clear()
+        while len(self.threads) < self.workers:
+            thread = threading.Thread(target=self._worker_loop, name=f"email-outbox-{len(self.threads)}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        logger.info(f"Email outbox started with {self.workers} workers")
+
+    def stop(self):
+        self.stop_flag.set()
+        with self.condition:
+            self.condition.notify_all()
+        for thread in self.threads:
+            thread.join(timeout=5)
+        self.threads = []
+
+    def wake(self):
+        """New rows were enqueued; let idle workers claim them now"""
+        with self.condition:
+            self.pending_wakeups = self.workers
+            self.condition.notify_all()
+
+    def _worker_loop(self):
+        while not self.stop_flag.is_set():
+            try:
+                rows, idle_seconds = self._claim()
+                if rows:
+                    self._process(rows)
+                    continue
+            except Exception as e:
+                logger.error(f"Email outbox worker error: {e}")
+                idle_seconds = EMAIL_OUTBOX_BACKOFF_SECONDS
+            with self.condition:
+                if self.pending_wakeups == 0 and not self.stop_flag.is_set():
+                    self.condition.wait(idle_seconds)
+                self.pending_wakeups = max(self.pending_wakeups - 1, 0)
+
+    def _claim(self):
+        """Claim a batch; when there is none, also return how long until the next row comes due"""
+        conn = self.get_connection()
+        if not conn:
+            raise Exception("Failed to connect to database to claim outbox rows")
+        try:
+            with conn.cursor(cursor_factory=DictCursor) as cursor:
+                cursor.execute(CLAIM_SQL, (EMAIL_OUTBOX_LEASE_SECONDS, EMAIL_OUTBOX_BATCH_SIZE))
+                rows = [dict(row) for row in cursor.fetchall()]
+                idle_seconds = EMAIL_OUTBOX_IDLE_SECONDS
+                if not rows:
+                    cursor.execute('''
+                        SELECT EXTRACT(EPOCH FROM MIN(CASE WHEN status = 'pending' THEN next_attempt_at
+                                                           ELSE locked_until END) - LOCALTIMESTAMP)
+                        FROM email_outbox WHERE status IN ('pending', 'sending')
+                    ''')
+                    next_due = cursor.fetchone()[0]
+                    if next_due is not None:
+                        idle_seconds = min(max(float(next_due), 0.1), EMAIL_OUTBOX_IDLE_SECONDS)
+            conn.commit()
+            return rows, idle_seconds
+        finally:
+            conn.close()
+
+    def _process(self, rows):
+        runs = {}
+        for row in rows:
+            runs.setdefault(row['run_id'], []).append(row)
+        for run_rows in runs.values():
+            report_path, data_version = None, None
+            try:
+                results, report_path, data_version = self.send_run(run_rows)
+            except Exception as e:
+                logger.error(f"Outbox run {run_rows[0]['run_id']} failed: {e}")
+                results = [{"recipient": row['recipient'], "status": "failed", "error": str(e)} for row in run_rows]
+            self._record(run_rows, results, report_path, data_version)
+
+    def _record(self, run_rows, results, report_path, data_version):
+        """Mark rows sent, schedule a retry with exponential backoff, or move them to dead"""
+        by_recipient = {result["recipient"]: result for result in results}
+        sent, retrying, dead = [], [], []
+        conn = self.get_connection()
+        if not conn:
+            # Rows stay leased and are retried once the lease expires
+            logger.error("Failed to connect to database to record outbox results")
+            return
+        try:
+            with conn.cursor() as cursor:
+                for row in run_rows:
+                    result = by_recipient.get(row['recipient'], {"status": "failed", "error": "No delivery result"})
+                    if result["status"] == "sent":
+                        sent.append(row)
+                        cursor.execute('''
+                            UPDATE email_outbox
+                            SET status = 'sent', sent_at = LOCALTIMESTAMP, locked_until = NULL,
+                                last_error = NULL, report_path = %s, data_version = %s
+                            WHERE id = %s
+                        ''', (report_path, data_version, row['id']))
+                    elif row['attempts'] >= EMAIL_OUTBOX_MAX_ATTEMPTS:
+                        dead.append(row)
+                        cursor.execute('''
+                            UPDATE email_outbox SET status = 'dead', locked_until = NULL, last_error = %s
+                            WHERE id = %s
+                        ''', (result["error"], row['id']))
+                    else:
+                        retrying.append(row)
+                        delay = EMAIL_OUTBOX_BACKOFF_SECONDS * 2 ** (row['attempts'] - 1)
+                        cursor.execute('''
+                            UPDATE email_outbox
+                            SET status = 'pending', locked_until = NULL, last_error = %s,
+                                next_attempt_at = LOCALTIMESTAMP + make_interval(secs => %s)
+                            WHERE id = %s
+                        ''', (result["error"], delay, row['id']))
+
+                first = run_rows[0]
+                for status, group in (("SUCCESS", sent), ("RETRYING", retrying), ("DEAD", dead)):
+                    if not group:
+                        continue
+                    errors = [by_recipient.get(row['recipient'], {}).get("error") for row in group]
+                    cursor.execute('''
+                        INSERT INTO email_logs
+                        (id, scheduled_report_id, status, recipient_count, report_path, error_message, metadata)
+                        VALUES (%s, %s, %s, %s, %s, %s, %s)
+                    ''', (
+                        str(uuid.uuid4()), str(first['scheduled_report_id']), status, len(group), report_path,
+                        None if status == "SUCCESS" else next((e for e in errors if e), None),
+                        Json({"run_id": str(first['run_id']), "data_version": data_version,
+                              "recipients": [row['recipient'] for row in group]}),
+                    ))
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"Error recording outbox results: {e}")
+        finally:
+            conn.close()
+
+        logger.info(f"Outbox run {run_rows[0]['run_id']}: {len(sent)} sent, {len(retrying)} to retry, {len(dead)} dead")
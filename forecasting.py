@@ -0,0 +1,209 @@
+# forecasting.py - Batched demand forecasts for every SKU in sales_data
+import os
+import hashlib
+import threading
+import calendar
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from flask import Blueprint, request, jsonify
+from sqlalchemy import create_engine
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Blueprint setup for Flask
+forecasting_bp = Blueprint('forecasting', __name__)
+
+FORECAST_HORIZON_WEEKS = 4
+WEEKS_PER_MONTH = 52 / 12
+# Smoothing constants tried per SKU; the one with the lowest one-step-ahead error wins
+SES_ALPHAS = np.array([0.1, 0.2, 0.3, 0.5, 0.7])
+CROSTON_ALPHA = 0.1
+# Average demand interval above which demand counts as intermittent (Syntetos-Boylan cut-off)
+INTERMITTENT_ADI = 1.32
+SKU_KEYS = ["brand", "category", "size", "color"]
+FORECAST_COLUMNS = SKU_KEYS + [
+    "method", "alpha", "history_months", "last_month", "monthly_demand",
+    "weekly_forecast", "forecast_4_weeks",
+]
+MAX_LIMIT = 1000
+
+SALES_HISTORY_QUERY = """
+    SELECT brand, category, size, color, month, SUM(sales_qty) AS sales_qty
+    FROM sales_data
+    WHERE lower(brand) != 'grand total'
+    GROUP BY brand, category, size, color, month
+"""
+SALES_VERSION_QUERY = """
+    SELECT COUNT(*), COALESCE(SUM(sales_qty), 0), MAX(created_at) FROM sales_data
+"""
+
+_engine = None
+_cache = {"version": None, "forecasts": None}
+_cache_lock = threading.Lock()
+
+
+def get_engine():
+    """SQLAlchemy engine for Neon, created once per process"""
+    global _engine
+    if _engine is None:
+        _engine = create_engine(
+            f'postgresql://{os.getenv("DB_USER")}:{os.getenv("DB_PASSWORD")}@{os.getenv("DB_HOST")}:{os.getenv("DB_PORT")}/{os.getenv("DB_NAME")}'
+        )
+    return _engine
+
+
+def get_sales_data_version(engine=None):
+    """Fingerprint of sales_data that changes with every upload or merge"""
+    engine = engine or get_engine()
+    with engine.connect() as conn:
+        row = conn.exec_driver_sql(SALES_VERSION_QUERY).fetchone()
+    return hashlib.sha256(repr(tuple(row)).encode("utf-8")).hexdigest()[:12]
+
+
+def build_demand_matrix(history, today=None):
+    """Pivot monthly sales rows into a (SKU x month) array with contiguous months.
+
+    The current month is still in progress, so its sales are scaled up to a full month.
+    Returns (keys DataFrame, month labels, matrix).
+    """
+    today = today or datetime.now()
+    history = history.copy()
+    for key in SKU_KEYS:
+        history[key] = history[key].fillna("").astype(str)
+    # Parse each distinct month label once rather than once per row
+    labels, label_codes = np.unique(history["month"].astype(str).to_numpy(), return_inverse=True)
+    label_periods = pd.PeriodIndex(labels, freq="M")
+    months = pd.period_range(label_periods.min(), label_periods.max(), freq="M")
+    month_codes = (label_periods.asi8 - months[0].ordinal)[label_codes]
+
+    grouped = history.groupby(SKU_KEYS, sort=False)
+    sku_codes = grouped.ngroup().to_numpy()
+    keys = grouped.size().index.to_frame(index=False)
+    sales = np.clip(pd.to_numeric(history["sales_qty"], errors="coerce").fillna(0).to_numpy(np.float64), 0, None)
+
+    matrix = np.zeros((len(keys), len(months)))
+    np.add.at(matrix, (sku_codes, month_codes), sales)
+
+    current = pd.Period(today, freq="M")
+    if months[-1] == current:
+        days_in_month = calendar.monthrange(today.year, today.month)[1]
+        matrix[:, -1] *= days_in_month / today.day
+
+    return keys, [str(month) for month in months], matrix
+
+
+def ses_forecast(matrix, first, alphas=SES_ALPHAS):
+    """Simple exponential smoothing for all rows at once, choosing alpha per row by SSE"""
+    n_skus, n_periods = matrix.shape
+    rows = np.arange(n_skus)
+    alphas = np.asarray(alphas)[:, None]
+    level = np.repeat(matrix[rows, first][None, :], len(alphas), axis=0)
+    sse = np.zeros_like(level)
+    for t in range(1, n_periods):
+        active = t > first
+        error = np.where(active, matrix[:, t] - level, 0.0)
+        sse += error ** 2
+        level += alphas * error
+    best = np.argmin(sse, axis=0)
+    return level[best, rows], alphas[best, 0]
+
+
+def croston_forecast(matrix, first, alpha=CROSTON_ALPHA):
+    """Croston's method with the Syntetos-Boylan bias correction for all rows at once"""
+    n_skus, n_periods = matrix.shape
+    rows = np.arange(n_skus)
+    size = matrix[rows, first].copy()  # Smoothed non-zero demand size
+    interval = np.ones(n_skus)         # Smoothed periods between demands
+    since_last = np.ones(n_skus)
+    for t in range(1, n_periods):
+        demand = (t > first) & (matrix[:, t] > 0)
+        size = np.where(demand, size + alpha * (matrix[:, t] - size), size)
+        interval = np.where(demand, interval + alpha * (since_last - interval), interval)
+        since_last = np.where(demand, 1.0, since_last + (t > first))
+    return (1 - alpha / 2) * size / interval
+
+
+def forecast_demand(keys, months, matrix):
+    """Per-SKU forecasts from a demand matrix; the method is picked from the demand pattern"""
+    n_skus, n_periods = matrix.shape
+    has_demand = matrix > 0
+    # Series start at the SKU's first sale; earlier zeros mean it did not exist yet
+    first = np.where(has_demand.any(axis=1), has_demand.argmax(axis=1), n_periods - 1)
+    history_months = n_periods - first
+    nonzero = has_demand.sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        adi = np.where(nonzero > 0, history_months / nonzero, np.inf)
+
+    ses_level, ses_alpha = ses_forecast(matrix, first)
+    croston_level = croston_forecast(matrix, first)
+
+    intermittent = adi > INTERMITTENT_ADI
+    monthly = np.where(intermittent, croston_level, ses_level)
+    monthly = np.where(nonzero > 0, np.clip(monthly, 0, None), 0.0)
+    method = np.select(
+        [nonzero == 0, history_months == 1, intermittent],
+        ["no_demand", "naive", "croston"],
+        default="ses",
+    )
+    weekly = monthly / WEEKS_PER_MONTH
+
+    result = keys.copy()
+    result["method"] = method
+    result["alpha"] = np.where(intermittent, CROSTON_ALPHA, ses_alpha)
+    result["history_months"] = history_months
+    result["last_month"] = months[-1] if months else None
+    result["monthly_demand"] = np.round(monthly, 2)
+    result["weekly_forecast"] = np.round(weekly, 2)
+    result["forecast_4_weeks"] = np.round(weekly * FORECAST_HORIZON_WEEKS, 1)
+    return result[FORECAST_COLUMNS]
+
+
+def get_forecasts():
+    """Forecasts for the current sales_data, recomputed only when its version changes"""
+    engine = get_engine()
+    version = get_sales_data_version(engine)
+    with _cache_lock:
+        if _cache["version"] != version:
+            history = pd.read_sql_query(SALES_HISTORY_QUERY, engine)
+            if history.empty:
+                forecasts = pd.DataFrame(columns=FORECAST_COLUMNS)
+            else:
+                forecasts = forecast_demand(*build_demand_matrix(history))
+            _cache["forecasts"] = forecasts
+            _cache["version"] = version
+        return _cache["forecasts"], version
+
+
+@forecasting_bp.route('/forecast', methods=['GET'])
+def forecast_route():
+    try:
+        forecasts, version = get_forecasts()
+        mask = np.ones(len(forecasts), dtype=bool)
+        for key in SKU_KEYS + ["method"]:
+            value = request.args.get(key)
+            if value:
+                mask &= forecasts[key].str.lower().to_numpy() == value.strip().lower()
+
+        sort = request.args.get("sort", "forecast_4_weeks")
+        if sort not in FORECAST_COLUMNS:
+            return jsonify({"status": "error", "message": f"Unknown sort column '{sort}'"}), 400
+        ascending = request.args.get("order", "desc").lower() == "asc"
+        limit = min(int(request.args.get("limit", 100)), MAX_LIMIT)
+        offset = max(int(request.args.get("offset", 0)), 0)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        return jsonify({"status": "error", "message": f"Error computing forecasts: {str(e)}"}), 500
+
+    filtered = forecasts[mask]
+    page = filtered.sort_values(sort, ascending=ascending, kind="stable").iloc[offset:offset + limit]
+    return jsonify({
+        "status": "success",
+        "data_version": version,
+        "horizon_weeks": FORECAST_HORIZON_WEEKS,
+        "total": len(filtered),
+        "data": page.to_dict(orient="records"),
+    })
@@ -0,0 +1,16 @@
+# gunicorn.conf.py - Loaded automatically by `gunicorn data:app` from the project root
+
+
+def post_worker_init(worker):
+    """Start BACKGROUND_SERVICES in the booted worker; the schedulers elect a single leader"""
+    from data import start_background_services, configured_background_services
+    services = configured_background_services()
+    if services:
+        start_background_services(worker.wsgi, services)
+
+
+def worker_exit(server, worker):
+    """Release scheduler leadership so another worker takes over straight away"""
+    from data import stop_background_services, configured_background_services
+    if configured_background_services():
+        stop_background_services()
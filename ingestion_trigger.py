@@ -0,0 +1,173 @@
+# ingestion_trigger.py - Ingest Azure blobs as blob-created events arrive instead of waiting for a poll
+import os
+import json
+import base64
+import logging
+import threading
+from collections import namedtuple
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# "poll" (scheduled listing only), "queue" (Azure Storage Queue fed by Event Grid BlobCreated
+# events) or "watch" (event files dropped into a local directory)
+AZURE_INGEST_TRIGGER = os.getenv("AZURE_INGEST_TRIGGER", "poll").lower()
+# Queue receiving the BlobCreated events; point the connection string at Azurite to test locally
+AZURE_EVENT_QUEUE_NAME = os.getenv("AZURE_EVENT_QUEUE_NAME", "inventory-blob-events")
+AZURE_QUEUE_CONNECTION_STRING = os.getenv("AZURE_QUEUE_CONNECTION_STRING") or os.getenv("AZURE_STORAGE_CONNECTION_STRING")
+# Directory read by the "watch" trigger; one event (or blob name) per file
+AZURE_EVENT_WATCH_DIR = os.getenv("AZURE_EVENT_WATCH_DIR", os.path.join("processed_data", "blob_events"))
+# Wait after an empty receive
+AZURE_EVENT_IDLE_SECONDS = float(os.getenv("AZURE_EVENT_IDLE_SECONDS", "5"))
+# Events ingested per batch (a queue returns at most 32 messages per receive)
+AZURE_EVENT_BATCH_SIZE = min(int(os.getenv("AZURE_EVENT_BATCH_SIZE", "32")), 32)
+# How long a received queue message stays hidden; unfinished events reappear after this
+AZURE_EVENT_VISIBILITY_SECONDS = int(os.getenv("AZURE_EVENT_VISIBILITY_SECONDS", "600"))
+# With an event trigger the listing poll only reconciles missed events
+AZURE_RECONCILE_MINUTES = float(os.getenv("AZURE_RECONCILE_MINUTES", "60"))
+
+BLOB_CREATED = "Microsoft.Storage.BlobCreated"
+EventMessage = namedtuple("EventMessage", ["content", "path"])
+
+
+def parse_blob_event(content, container_name):
+    """Blob names in container_name from one message: an Event Grid or CloudEvents BlobCreated
+    event (JSON, optionally base64 encoded, alone or in a list) or a plain blob name"""
+    text = content.strip()
+    if not text.startswith(("{", "[")):
+        try:
+            decoded = base64.b64decode(text, validate=True).decode("utf-8").strip()
+        except ValueError:  # Includes binascii.Error and UnicodeDecodeError
+            decoded = ""
+        if not decoded.startswith(("{", "[")):
+            return [text] if text else []
+        text = decoded
+
+    events = json.loads(text)
+    prefix = f"/containers/{container_name}/blobs/"
+    names = []
+    for event in events if isinstance(events, list) else [events]:
+        if (event.get("eventType") or event.get("type")) != BLOB_CREATED:
+            continue
+        subject = event.get("subject", "")
+        if prefix in subject:
+            names.append(subject.split(prefix, 1)[1])
+    return names
+
+
+class QueueEventSource:
+    """Azure Storage Queue that an Event Grid subscription delivers BlobCreated events to"""
+
+    def __init__(self, queue_name=AZURE_EVENT_QUEUE_NAME, connection_string=AZURE_QUEUE_CONNECTION_STRING):
+        from azure.core.exceptions import ResourceExistsError
+        from azure.storage.queue import QueueClient
+        self.queue_client = QueueClient.from_connection_string(connection_string, queue_name)
+        try:
+            self.queue_client.create_queue()
+        except ResourceExistsError:
+            pass
+
+    def receive(self, limit):
+        return list(self.queue_client.receive_messages(
+            messages_per_page=limit, max_messages=limit, visibility_timeout=AZURE_EVENT_VISIBILITY_SECONDS
+        ))
+
+    def delete(self, messages):
+        for message in messages:
+            try:
+                self.queue_client.delete_message(message)
+            except Exception as e:
+                # The event comes back after the visibility timeout and is deduplicated then
+                logger.warning(f"Could not delete blob event {message.id}: {str(e)}")
+
+
+class DirectoryEventSource:
+    """Event files in a local directory, oldest first. Writers should create a file under a
+    dot-name and rename it, since dot-files are skipped."""
+
+    def __init__(self, path=AZURE_EVENT_WATCH_DIR):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def receive(self, limit):
+        entries = [entry for entry in os.scandir(self.path) if entry.is_file() and not entry.name.startswith(".")]
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        messages = []
+        for entry in entries[:limit]:
+            with open(entry.path, encoding="utf-8") as event_file:
+                messages.append(EventMessage(event_file.read(), entry.path))
+        return messages
+
+    def delete(self, messages):
+        for message in messages:
+            try:
+                os.remove(message.path)
+            except FileNotFoundError:
+                pass
+
+
+class IngestionTrigger:
+    """Passes blobs announced by blob-created events to ingest(blob_names) as they arrive.
+
+    Runs only while this process leads the Azure file sync. Blobs that are gone or already
+    processed with the same content (per the manifest) are dropped. A batch's events are
+    removed only after it was ingested, so events lost by a crashed leader are received
+    again and deduplicated.
+    """
+
+    def __init__(self, azure_storage, ingest, source=None):
+        self.azure_storage = azure_storage
+        self.ingest = ingest
+        self.source = source or (QueueEventSource() if AZURE_INGEST_TRIGGER == "queue" else DirectoryEventSource())
+        self.stop_flag = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if self.thread is None or not self.thread.is_alive():
+            self.stop_flag.clear()
+            self.thread = threading.Thread(target=self._run, name="azure-ingest-trigger", daemon=True)
+            self.thread.start()
+            logger.info(f"Ingestion trigger started ({type(self.source).__name__})")
+
+    def stop(self):
+        self.stop_flag.set()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join(timeout=AZURE_EVENT_IDLE_SECONDS + 5)
+        self.thread = None
+
+    def _run(self):
+        while not self.stop_flag.is_set():
+            try:
+                received = self.poll_once()
+            except Exception as e:
+                logger.error(f"Ingestion trigger error: {str(e)}")
+                received = 0
+            if not received:
+                self.stop_flag.wait(AZURE_EVENT_IDLE_SECONDS)
+
+    def poll_once(self):
+        """Receive one batch of events and ingest the new blobs; returns the number of events"""
+        from azure_storage import EXCEL_EXTENSIONS
+
+        messages = self.source.receive(AZURE_EVENT_BATCH_SIZE)
+        if not messages:
+            return 0
+        names = []
+        for message in messages:
+            try:
+                parsed = parse_blob_event(message.content, self.azure_storage.container_name)
+            except (ValueError, AttributeError) as e:
+                logger.warning(f"Dropping unreadable blob event: {str(e)}")
+                continue
+            names.extend(name for name in parsed if name.lower().endswith(EXCEL_EXTENSIONS) and name not in names)
+
+        new_blobs = self.azure_storage.unprocessed_among(names)
+        logger.info(f"Received {len(messages)} blob events, {len(new_blobs)} new files")
+        if new_blobs:
+            self.ingest(new_blobs)
+        if not self.stop_flag.is_set():
+            self.source.delete(messages)
+        return len(messages)
@@ -0,0 +1,191 @@
+# insights.py - Report insights materialized into local SQLite after each ingest
+import os
+import sqlite3
+from datetime import datetime
+import pandas as pd
+from dotenv import load_dotenv
+from dataset_version import get_dataset_version
+from report_queries import REPORT_QUERIES, prepare_report_queries, execute_prepared_query
+
+# Load environment variables
+load_dotenv()
+
+PROCESSED_DIR = "processed_data"
+LOCAL_DB_PATH = os.path.join(PROCESSED_DIR, "local_sales_data.db")
+# Completed insight versions kept before older tables are dropped
+INSIGHT_VERSIONS_TO_KEEP = int(os.getenv("INSIGHT_VERSIONS_TO_KEEP", "3"))
+
+
+def _ensure_registry(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS insight_versions (
+            version INTEGER PRIMARY KEY AUTOINCREMENT,
+            data_version TEXT NOT NULL,
+            status TEXT NOT NULL,
+            started_at TEXT NOT NULL,
+            materialized_at TEXT
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS insight_tables (
+            version INTEGER NOT NULL,
+            question_id INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            table_name TEXT,
+            row_count INTEGER NOT NULL,
+            PRIMARY KEY (version, question_id)
+        )
+    """)
+    # Older registries required a table; questions without a result now have none
+    if any(column[1] == "table_name" and column[3] for column in conn.execute("PRAGMA table_info(insight_tables)")):
+        with conn:
+            conn.execute("ALTER TABLE insight_tables RENAME TO insight_tables_old")
+            conn.execute("""
+                CREATE TABLE insight_tables (
+                    version INTEGER NOT NULL,
+                    question_id INTEGER NOT NULL,
+                    name TEXT NOT NULL,
+                    table_name TEXT,
+                    row_count INTEGER NOT NULL,
+                    PRIMARY KEY (version, question_id)
+                )
+            """)
+            conn.execute("INSERT INTO insight_tables SELECT * FROM insight_tables_old")
+            conn.execute("DROP TABLE insight_tables_old")
+
+
+def insight_table_name(name, version):
+    return f"insight_{name}_v{version}"
+
+
+def materialize_insights(log_output, db_path=LOCAL_DB_PATH):
+    """Run every report catalog query once and store the results as a new insight version.
+
+    Called after upload_to_database/update_local_sqlite so reports and the chatbot can read
+    precomputed results instead of rebuilding a SQLite copy of every XLSX file.
+    """
+    # Imported here: report pulls in matplotlib/reportlab, which ingestion does not otherwise need
+    from report import DataSourceManager
+
+    data_version = get_dataset_version()
+    log_output.info(f"Materializing report insights for data version {data_version}")
+    data_manager = DataSourceManager()
+    conn = sqlite3.connect(db_path)
+    version = None
+    try:
+        _ensure_registry(conn)
+        with conn:
+            cursor = conn.execute(
+                "INSERT INTO insight_versions (data_version, status, started_at) VALUES (?, 'building', ?)",
+                (data_version, datetime.now().isoformat())
+            )
+            version = cursor.lastrowid
+
+        data_manager.create_temp_sqlite_db()
+        prepared_queries = prepare_report_queries(data_manager.available_tables)
+
+        for query in REPORT_QUERIES:
+            result = execute_prepared_query(data_manager, query, prepared_queries[query["id"]])
+            table_name = None
+            # A failed or unavailable query (e.g. day-over-day with one daily file) has no columns
+            # to create a table from; it is registered without one
+            if len(result.columns):
+                table_name = insight_table_name(query["name"], version)
+                result.to_sql(table_name, conn, if_exists='replace', index=False)
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO insight_tables (version, question_id, name, table_name, row_count) VALUES (?, ?, ?, ?, ?)",
+                    (version, query["id"], query["name"], table_name, len(result))
+                )
+
+        # Readers only ever see complete versions
+        with conn:
+            conn.execute(
+                "UPDATE insight_versions SET status = 'complete', materialized_at = ? WHERE version = ?",
+                (datetime.now().isoformat(), version)
+            )
+        _prune_versions(conn)
+        log_output.info(f"Materialized {len(REPORT_QUERIES)} report insights as version {version}")
+        return {"version": version, "data_version": data_version}
+    except Exception as e:
+        log_output.error(f"Error materializing insights: {str(e)}")
+        if version is not None:
+            with conn:
+                conn.execute("UPDATE insight_versions SET status = 'failed' WHERE version = ?", (version,))
+        return None
+    finally:
+        data_manager.cleanup()
+        conn.close()
+
+
+def _prune_versions(conn):
+    """Drop insight tables of all but the newest INSIGHT_VERSIONS_TO_KEEP complete versions"""
+    keep = [row[0] for row in conn.execute(
+        "SELECT version FROM insight_versions WHERE status = 'complete' ORDER BY version DESC LIMIT ?",
+        (INSIGHT_VERSIONS_TO_KEEP,)
+    )]
+    if not keep:
+        return
+    oldest_kept = min(keep)
+    stale = conn.execute(
+        "SELECT version FROM insight_versions WHERE version < ? AND status != 'building'",
+        (oldest_kept,)
+    ).fetchall()
+    for (version,) in stale:
+        tables = conn.execute("SELECT table_name FROM insight_tables WHERE version = ?", (version,)).fetchall()
+        with conn:
+            for (table_name,) in tables:
+                if table_name:
+                    conn.execute(f'DROP TABLE IF EXISTS "{table_name}"')
+            conn.execute("DELETE FROM insight_tables WHERE version = ?", (version,))
+            conn.execute("DELETE FROM insight_versions WHERE version = ?", (version,))
+
+
+def get_current_insight_tables(data_version=None, db_path=LOCAL_DB_PATH):
+    """Tables of the newest complete insight version, as {question_id: {"name", "table_name"}}.
+
+    table_name is None for a question that produced no result. Returns {} when nothing usable exists. Day-count columns are relative to the time of
+    materialization, so only a version built today from the current dataset is returned.
+    """
+    if not os.path.exists(db_path):
+        return {}
+    data_version = data_version or get_dataset_version()
+    conn = sqlite3.connect(db_path)
+    try:
+        row = conn.execute("""
+            SELECT version, materialized_at FROM insight_versions
+            WHERE status = 'complete' AND data_version = ?
+            ORDER BY version DESC LIMIT 1
+        """, (data_version,)).fetchone()
+        if row is None or not row[1] or row[1][:10] != datetime.now().strftime('%Y-%m-%d'):
+            return {}
+        return {
+            question_id: {"name": name, "table_name": table_name}
+            for question_id, name, table_name in conn.execute(
+                "SELECT question_id, name, table_name FROM insight_tables WHERE version = ?", (row[0],)
+            )
+        }
+    except sqlite3.Error as e:
+        print(f"Error reading insight registry: {e}")
+        return {}
+    finally:
+        conn.close()
+
+
+def load_insights(data_version=None, db_path=LOCAL_DB_PATH):
+    """Precomputed report results for the current data, as {question_id: DataFrame}"""
+    tables = get_current_insight_tables(data_version, db_path)
+    if not tables:
+        return {}
+    conn = sqlite3.connect(db_path)
+    try:
+        return {
+            question_id: pd.read_sql_query(f'SELECT * FROM "{info["table_name"]}"', conn)
+            if info["table_name"] else pd.DataFrame()
+            for question_id, info in tables.items()
+        }
+    except Exception as e:
+        print(f"Error loading insights: {e}")
+        return {}
+    finally:
+        conn.close()
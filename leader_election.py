@@ -0,0 +1,158 @@
+# leader_election.py - One process per background service, with takeover when the leader dies
+import os
+import hashlib
+import logging
+import tempfile
+import threading
+import psycopg2
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# "postgres" (advisory locks, works across hosts) or "file" (local lock file, one host only)
+LEADER_LOCK_BACKEND = os.getenv("LEADER_LOCK_BACKEND", "postgres" if os.getenv("DB_HOST") else "file")
+# Directory for the lock files of the "file" backend
+LEADER_LOCK_DIR = os.getenv("LEADER_LOCK_DIR", tempfile.gettempdir())
+# How often followers try to take over and the leader checks it still holds the lock
+LEADER_CHECK_SECONDS = float(os.getenv("LEADER_CHECK_SECONDS", "15"))
+
+
+def advisory_lock_key(name):
+    """Stable signed 64-bit key for pg_try_advisory_lock"""
+    return int.from_bytes(hashlib.sha256(f"inventorysync:{name}".encode("utf-8")).digest()[:8], "big", signed=True)
+
+
+class PostgresLeaderLock:
+    """Session-level advisory lock; Postgres releases it when the holder's connection drops"""
+
+    def __init__(self, name):
+        self.key = advisory_lock_key(name)
+        self.conn = None
+
+    def try_acquire(self):
+        self.release()
+        self.conn = psycopg2.connect(
+            host=os.getenv("DB_HOST"),
+            database=os.getenv("DB_NAME"),
+            user=os.getenv("DB_USER"),
+            password=os.getenv("DB_PASSWORD"),
+            port=os.getenv("DB_PORT"),
+        )
+        self.conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+        with self.conn.cursor() as cursor:
+            cursor.execute("SELECT pg_try_advisory_lock(%s)", (self.key,))
+            acquired = cursor.fetchone()[0]
+        if not acquired:
+            self.release()
+        return acquired
+
+    def still_held(self):
+        """The lock lives as long as the session; a dead connection means it is gone"""
+        try:
+            with self.conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            return True
+        except Exception:
+            return False
+
+    def release(self):
+        if self.conn is not None:
+            try:
+                self.conn.close()
+            except Exception:
+                pass
+            self.conn = None
+
+
+class FileLeaderLock:
+    """Exclusive lock on a local file; the OS releases it when the holder exits"""
+
+    def __init__(self, name):
+        self.path = os.path.join(LEADER_LOCK_DIR, f"inventorysync-{name}.lock")
+        self.handle = None
+
+    def try_acquire(self):
+        handle = open(self.path, "a+")
+        try:
+            if os.name == "nt":
+                import msvcrt
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return False
+        self.handle = handle
+        return True
+
+    def still_held(self):
+        return self.handle is not None
+
+    def release(self):
+        if self.handle is not None:
+            self.handle.close()  # Closing the descriptor drops the lock
+            self.handle = None
+
+
+class LeaderElection:
+    """Runs on_elected() in the one process holding the named lock, on_demoted() if it is lost.
+
+    Every process runs the election; followers retry every LEADER_CHECK_SECONDS, so a new
+    leader takes over within that interval after the old one dies.
+    """
+
+    def __init__(self, name, on_elected, on_demoted, backend=None, check_seconds=None):
+        self.name = name
+        self.on_elected = on_elected
+        self.on_demoted = on_demoted
+        self.check_seconds = check_seconds or LEADER_CHECK_SECONDS
+        backend = backend or LEADER_LOCK_BACKEND
+        self.lock = PostgresLeaderLock(name) if backend == "postgres" else FileLeaderLock(name)
+        self.is_leader = False
+        self.stop_flag = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if self.thread is None or not self.thread.is_alive():
+            self.stop_flag.clear()
+            self.thread = threading.Thread(target=self._run, name=f"leader-{self.name}", daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        """Step down and release the lock so another process can take over immediately"""
+        self.stop_flag.set()
+        if self.thread is not None:
+            self.thread.join(timeout=self.check_seconds + 5)
+            self.thread = None
+
+    def _run(self):
+        while not self.stop_flag.is_set():
+            try:
+                if not self.is_leader:
+                    if self.lock.try_acquire():
+                        self.is_leader = True
+                        logger.info(f"Process {os.getpid()} elected leader for {self.name}")
+                        self.on_elected()
+                elif not self.lock.still_held():
+                    self._demote(f"Lost leadership of {self.name}")
+            except Exception as e:
+                logger.error(f"Leader election for {self.name} failed: {e}")
+                if self.is_leader:
+                    self._demote(f"Stepping down as leader of {self.name}")
+            self.stop_flag.wait(self.check_seconds)
+        if self.is_leader:
+            self._demote(f"Released leadership of {self.name}")
+
+    def _demote(self, message):
+        logger.warning(message)
+        self.is_leader = False
+        try:
+            self.on_demoted()
+        finally:
+            self.lock.release()
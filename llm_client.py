@@ -0,0 +1,303 @@
+# llm_client.py - Shared Gemini client used by the chatbot, report builder and voice assistant
+import os
+import time
+import random
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, Any, Optional
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "gemini-2.0-flash"
+
+# Per-attempt timeout handed to the Gemini transport, and overall deadline across retries
+LLM_TIMEOUT_SECONDS = float(os.getenv("GEMINI_TIMEOUT_SECONDS", "30"))
+LLM_DEADLINE_SECONDS = float(os.getenv("GEMINI_DEADLINE_SECONDS", "90"))
+LLM_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "2"))
+LLM_BACKOFF_BASE_SECONDS = float(os.getenv("GEMINI_BACKOFF_BASE_SECONDS", "0.5"))
+LLM_BACKOFF_MAX_SECONDS = float(os.getenv("GEMINI_BACKOFF_MAX_SECONDS", "8"))
+# Maximum number of Gemini requests in flight across the whole process
+LLM_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "4"))
+# Seconds to wait before sending a duplicate (hedged) request; "auto" uses the observed p95
+# latency, empty disables hedging
+LLM_HEDGE_AFTER = os.getenv("GEMINI_HEDGE_AFTER_SECONDS", "").strip().lower()
+LLM_LATENCY_WINDOW = 500
+
+
+class LLMError(Exception):
+    """Raised when a Gemini request fails after all retries"""
+
+
+class LLMTimeoutError(LLMError):
+    """Raised when a Gemini request does not finish within its deadline"""
+
+
+def _is_retryable(exc: Exception) -> bool:
+    """Timeouts, throttling (429) and server-side (5xx) errors are worth retrying"""
+    if isinstance(exc, (LLMTimeoutError, TimeoutError, ConnectionError)):
+        return True
+    code = getattr(exc, "code", None)
+    return isinstance(code, int) and (code == 429 or code >= 500)
+
+
+class LLMMetrics:
+    """Thread-safe counters for latency, error rate and token usage"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = deque(maxlen=LLM_LATENCY_WINDOW)
+        self.requests = 0
+        self.attempts = 0
+        self.successes = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+        self.total_tokens = 0
+        self.by_model = {}
+
+    def record_request(self, model_name):
+        with self._lock:
+            self.requests += 1
+            self.by_model[model_name] = self.by_model.get(model_name, 0) + 1
+
+    def record_attempt(self, latency, usage=None, error=None):
+        with self._lock:
+            self.attempts += 1
+            if error is None:
+                self.successes += 1
+                self.latencies.append(latency)
+                if usage is not None:
+                    self.prompt_tokens += getattr(usage, "prompt_token_count", 0) or 0
+                    self.output_tokens += getattr(usage, "candidates_token_count", 0) or 0
+                    self.total_tokens += getattr(usage, "total_token_count", 0) or 0
+            else:
+                self.errors += 1
+
+    def record_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def record_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def record_hedge(self, won=False):
+        with self._lock:
+            if won:
+                self.hedge_wins += 1
+            else:
+                self.hedges += 1
+
+    def percentile(self, pct) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self.latencies)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(round(pct / 100.0 * (len(samples) - 1))))
+        return samples[index]
+
+    def snapshot(self) -> Dict[str, Any]:
+        p50, p95, p99 = self.percentile(50), self.percentile(95), self.percentile(99)
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "attempts": self.attempts,
+                "successes": self.successes,
+                "errors": self.errors,
+                "error_rate": round(self.errors / self.attempts, 4) if self.attempts else 0.0,
+                "timeouts": self.timeouts,
+                "retries": self.retries,
+                "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins,
+                "latency_seconds": {
+                    "p50": p50,
+                    "p95": p95,
+                    "p99": p99,
+                    "samples": len(self.latencies),
+                },
+                "tokens": {
+                    "prompt": self.prompt_tokens,
+                    "output": self.output_tokens,
+                    "total": self.total_tokens,
+                },
+                "requests_by_model": dict(self.by_model),
+            }
+
+
+class GeminiClient:
+    """Resilient wrapper around google.generativeai shared by every module that calls Gemini"""
+
+    def __init__(self, api_key=None, max_concurrency=LLM_MAX_CONCURRENCY):
+        import google.generativeai as genai
+
+        api_key = api_key if api_key is not None else os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            logger.warning("GEMINI_API_KEY not found in environment variables. Please set it.")
+            api_key = ""  # Placeholder, requests will fail until it is set
+        genai.configure(api_key=api_key)
+
+        self._genai = genai
+        self._models = {}
+        self._models_lock = threading.Lock()
+        # The semaphore bounds requests in flight; the executor only ever runs tasks holding a slot
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="gemini")
+        self.metrics = LLMMetrics()
+
+    def _get_model(self, model_name):
+        with self._models_lock:
+            model = self._models.get(model_name)
+            if model is None:
+                model = self._genai.GenerativeModel(model_name)
+                self._models[model_name] = model
+            return model
+
+    def _run_attempt(self, model_name, prompt, timeout):
+        """Executed on the worker pool; always gives its concurrency slot back"""
+        started = time.monotonic()
+        try:
+            response = self._get_model(model_name).generate_content(
+                prompt, request_options={"timeout": timeout}
+            )
+            text = response.text  # Raises ValueError when the response was blocked
+            self.metrics.record_attempt(time.monotonic() - started, getattr(response, "usage_metadata", None))
+            return text
+        except Exception as e:
+            self.metrics.record_attempt(time.monotonic() - started, error=e)
+            raise
+        finally:
+            self._semaphore.release()
+
+    def _submit(self, model_name, prompt, timeout, wait_for_slot):
+        if wait_for_slot is None:
+            acquired = self._semaphore.acquire(blocking=False)
+        else:
+            acquired = self._semaphore.acquire(timeout=max(wait_for_slot, 0))
+        if not acquired:
+            return None
+        try:
+            return self._executor.submit(self._run_attempt, model_name, prompt, timeout)
+        except Exception:
+            self._semaphore.release()
+            raise
+
+    def _hedge_delay(self, hedge):
+        if hedge is False or not LLM_HEDGE_AFTER:
+            return None
+        if LLM_HEDGE_AFTER == "auto":
+            # Only hedge once enough samples exist to make the p95 meaningful
+            if len(self.metrics.latencies) < 20:
+                return None
+            return self.metrics.percentile(95)
+        try:
+            return float(LLM_HEDGE_AFTER)
+        except ValueError:
+            return None
+
+    def _attempt(self, model_name, prompt, attempt_deadline, hedge):
+        """Run one attempt, optionally racing a hedged duplicate; returns the first successful text"""
+        now = time.monotonic()
+        timeout = max(attempt_deadline - now, 0.1)
+        primary = self._submit(model_name, prompt, timeout, wait_for_slot=attempt_deadline - now)
+        if primary is None:
+            raise LLMTimeoutError("Timed out waiting for a free Gemini request slot")
+
+        pending = {primary}
+        hedge_future = None
+        hedge_delay = self._hedge_delay(hedge)
+        if hedge_delay is not None and time.monotonic() + hedge_delay < attempt_deadline:
+            done, _ = wait(pending, timeout=hedge_delay)
+            if not done:
+                # Never block for a hedge: it only goes out if a slot is free right now
+                hedge_future = self._submit(model_name, prompt, max(attempt_deadline - time.monotonic(), 0.1), None)
+                if hedge_future is not None:
+                    self.metrics.record_hedge()
+                    pending.add(hedge_future)
+
+        last_error = None
+        while pending:
+            remaining = attempt_deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                error = future.exception()
+                if error is None:
+                    if future is hedge_future:
+                        self.metrics.record_hedge(won=True)
+                    return future.result()
+                last_error = error
+        if pending or last_error is None:
+            # Abandoned futures finish on their own once the transport timeout fires
+            raise LLMTimeoutError(f"Gemini request exceeded {timeout:.1f}s")
+        raise last_error
+
+    def generate_text(self, prompt, model_name=DEFAULT_MODEL, timeout=None, deadline=None,
+                      max_retries=None, hedge=None) -> str:
+        """Generate text for a prompt with per-attempt timeouts, jittered retries and an overall deadline.
+
+        Raises LLMTimeoutError when the deadline passes and LLMError (or the original
+        non-retryable exception) when the request cannot be completed.
+        """
+        timeout = LLM_TIMEOUT_SECONDS if timeout is None else timeout
+        deadline = LLM_DEADLINE_SECONDS if deadline is None else deadline
+        max_retries = LLM_MAX_RETRIES if max_retries is None else max_retries
+        overall_deadline = time.monotonic() + deadline
+        self.metrics.record_request(model_name)
+
+        attempt = 0
+        while True:
+            attempt_deadline = min(time.monotonic() + timeout, overall_deadline)
+            try:
+                return self._attempt(model_name, prompt, attempt_deadline, hedge)
+            except Exception as e:
+                if isinstance(e, LLMTimeoutError):
+                    self.metrics.record_timeout()
+                if attempt >= max_retries or not _is_retryable(e):
+                    logger.error(f"Gemini request failed after {attempt + 1} attempt(s): {e}")
+                    raise
+                # Full jitter backoff, never sleeping past the overall deadline
+                backoff = random.uniform(0, min(LLM_BACKOFF_MAX_SECONDS, LLM_BACKOFF_BASE_SECONDS * (2 ** attempt)))
+                if time.monotonic() + backoff >= overall_deadline:
+                    logger.error(f"Gemini request deadline of {deadline:g}s exhausted: {e}")
+                    raise LLMTimeoutError(f"Gemini request deadline of {deadline:g}s exhausted") from e
+                logger.warning(f"Gemini attempt {attempt + 1} failed ({e}); retrying in {backoff:.2f}s")
+                self.metrics.record_retry()
+                time.sleep(backoff)
+                attempt += 1
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_llm_client() -> GeminiClient:
+    """Return the process-wide Gemini client, creating it on first use"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = GeminiClient()
+    return _client
+
+
+def generate_text(prompt, model_name=DEFAULT_MODEL, **kwargs) -> str:
+    """Convenience wrapper around the shared client's generate_text"""
+    return get_llm_client().generate_text(prompt, model_name=model_name, **kwargs)
+
+
+def get_llm_metrics() -> Dict[str, Any]:
+    """Metrics snapshot for the shared client (empty until the first request)"""
+    if _client is None:
+        return LLMMetrics().snapshot()
+    return _client.metrics.snapshot()
@@ -0,0 +1,131 @@
+# preprocessing.py - Excel preprocessing shared by manual uploads and Azure ingestion
+# Kept free of Flask app and service setup: ingestion worker processes import it.
+import os
+import logging
+from datetime import datetime
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+# Custom logger for Flask
+class FlaskLogger:
+    def __init__(self):
+        self.logs = []
+    
+    def info(self, message):
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        log_entry = f"[INFO] {timestamp} - {message}"
+        self.logs.append(log_entry)
+        logger.info(message)
+    
+    def error(self, message):
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        log_entry = f"[ERROR] {timestamp} - {message}"
+        self.logs.append(log_entry)
+        logger.error(message)
+    
+    def warning(self, message):
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        log_entry = f"[WARNING] {timestamp} - {message}"
+        self.logs.append(log_entry)
+        logger.warning(message)
+    
+    def get_logs(self):
+        return self.logs[-20:]  # Return last 20 logs
+
+
+def preprocess_data(file_path, selected_date, log_output, source_name=None):
+    """Preprocess the uploaded Excel file, removing the last line if it’s 'Grand Total' in the first column
+
+    file_path may also be an in-memory buffer; source_name then names it in the logs.
+    """
+    log_output.info(f"Starting your file…")
+    log_output.info(f"Starting preprocessing of file: {source_name or os.path.basename(file_path)}")
+    
+    try:
+        df = pd.read_excel(file_path, skiprows=9)
+        log_output.info(f"File loaded. Raw shape: {df.shape}")
+        
+        first_col_name = df.columns[0]
+        last_row_first_col = str(df.iloc[-1][first_col_name]).strip().lower()
+        if 'grand total' in last_row_first_col:
+            df = df.iloc[:-1].copy()
+            log_output.info("Removed the last row as it contained 'Grand Total' in the first column")
+        else:
+            log_output.info("Last row does not contain 'Grand Total' in the first column; proceeding as is")
+        
+        required_cols = ['Brand', 'Category', 'Size', 'MRP', 'Color', 'SalesQty', 'PurchaseQty']
+        if not all(col in df.columns for col in required_cols):
+            missing_cols = [col for col in required_cols if col not in df.columns]
+            log_output.error(f"Missing required columns: {missing_cols}")
+            return None
+        
+        df = df[required_cols].copy()
+        
+        for col in ['Brand', 'Category', 'Size', 'Color']:
+            df[col] = df[col].str.strip().str.lower()
+        
+        raw_sales_total = df['SalesQty'].sum()
+        raw_purchase_total = df['PurchaseQty'].sum()
+        sales_non_zero = (df['SalesQty'].fillna(0) != 0).sum()
+        purchase_non_zero = (df['PurchaseQty'].fillna(0) != 0).sum()
+        log_output.info(f"Raw totals before cleaning - SalesQty: {int(raw_sales_total)} (non-zero: {sales_non_zero}), PurchaseQty: {int(raw_purchase_total)} (non-zero: {purchase_non_zero})")
+        
+        for col in ['Brand', 'Category', 'Size', 'Color']:
+            df[col] = df[col].fillna('unknown')
+        df['MRP'] = df['MRP'].fillna(0.0)
+        df['SalesQty'] = pd.to_numeric(df['SalesQty'], errors='coerce').fillna(0).astype(int)
+        df['PurchaseQty'] = pd.to_numeric(df['PurchaseQty'], errors='coerce').fillna(0).astype(int)
+        
+        cleaned_sales_total = df['SalesQty'].sum()
+        cleaned_purchase_total = df['PurchaseQty'].sum()
+        log_output.info(f"Totals after numeric cleaning - SalesQty: {int(cleaned_sales_total)}, PurchaseQty: {int(cleaned_purchase_total)}")
+        
+        selected_date_ts = pd.to_datetime(selected_date)
+        df['date'] = selected_date_ts
+        df['Week'] = df['date'].dt.strftime('%Y-%W')
+        df['Month'] = df['date'].dt.strftime('%Y-%m')
+        
+        # Vectorized; a row-wise apply here was a third of the preprocessing time
+        df['record_id'] = (
+            df['Brand'].astype(str) + '_' + df['Category'].astype(str) + '_' + df['Size'].astype(str)
+            + '_' + df['Color'].astype(str) + '_' + df['Month']
+        )
+        log_output.info("Checking for duplicates in uploaded file...")
+        before_dedup = len(df)
+        
+        if df['record_id'].duplicated().any():
+            log_output.info(f"Found {df['record_id'].duplicated().sum()} duplicate record_ids to process")
+            final_df = df.groupby('record_id').agg({
+                'Brand': 'first', 'Category': 'first', 'Size': 'first', 'MRP': 'first',
+                'Color': 'first', 'SalesQty': 'sum', 'PurchaseQty': 'sum', 'date': 'first',
+                'Week': 'first', 'Month': 'first'
+            }).reset_index(drop=True)
+            log_output.info(f"After grouping duplicates - SalesQty sum: {int(final_df['SalesQty'].sum())}, PurchaseQty sum: {int(final_df['PurchaseQty'].sum())}")
+        else:
+            final_df = df.drop('record_id', axis=1)
+            log_output.info("No duplicates found")
+        
+        after_dedup = len(final_df)
+        log_output.info(f"Reduced to {after_dedup} unique records from {before_dedup} total rows")
+        
+        total_sales = int(final_df['SalesQty'].sum())
+        total_purchases = int(final_df['PurchaseQty'].sum())
+        log_output.info(f"Calculated grand totals - SalesQty: {total_sales}, PurchaseQty: {total_purchases}")
+        
+        grand_total_row = pd.DataFrame({
+            'Brand': ['grand total'], 'Category': [''], 'Size': [''], 'MRP': [0.0], 
+            'Color': [''], 'SalesQty': [total_sales], 'PurchaseQty': [total_purchases], 
+            'date': [selected_date_ts], 'Week': [selected_date_ts.strftime('%Y-%W')], 
+            'Month': [selected_date_ts.strftime('%Y-%m')]
+        })
+        
+        final_df_with_total = pd.concat([grand_total_row, final_df], ignore_index=True)
+        
+        log_output.info(f"Preprocessing complete with grand total at top. Final shape: {final_df_with_total.shape}")
+        return final_df_with_total
+    
+    except Exception as e:
+        log_output.error(f"Error during preprocessing: {str(e)}")
+        return None
@@ -0,0 +1,126 @@
+# replenishment.py - Reorder points, safety stock and overstock flags for every SKU
+import os
+from statistics import NormalDist
+import numpy as np
+from flask import Blueprint, request, jsonify
+from dotenv import load_dotenv
+from sku_metrics import get_sku_metrics
+
+# Load environment variables
+load_dotenv()
+
+# Blueprint setup for Flask
+replenishment_bp = Blueprint('replenishment', __name__)
+
+# Days between placing an order and the stock arriving
+REPLENISHMENT_LEAD_TIME_DAYS = float(os.getenv("REPLENISHMENT_LEAD_TIME_DAYS", "14"))
+# Probability of not running out during the lead time
+REPLENISHMENT_SERVICE_LEVEL = float(os.getenv("REPLENISHMENT_SERVICE_LEVEL", "0.95"))
+# Days of demand an order should cover beyond the reorder point
+REPLENISHMENT_REVIEW_DAYS = float(os.getenv("REPLENISHMENT_REVIEW_DAYS", "14"))
+# Stock beyond this many days of demand (plus safety stock) is flagged as overstock
+OVERSTOCK_DAYS = float(os.getenv("OVERSTOCK_DAYS", "90"))
+
+REPLENISHMENT_COLUMNS = [
+    "brand", "category", "size", "color", "mrp", "inventory", "daily_velocity", "daily_sales_std",
+    "safety_stock", "reorder_point", "order_qty", "excess_qty", "excess_value", "action",
+]
+MAX_LIMIT = 1000
+
+
+def compute_replenishment(metrics, lead_time_days=REPLENISHMENT_LEAD_TIME_DAYS,
+                          service_level=REPLENISHMENT_SERVICE_LEVEL,
+                          review_days=REPLENISHMENT_REVIEW_DAYS, overstock_days=OVERSTOCK_DAYS):
+    """Add replenishment columns to a sku_metrics frame, for all SKUs at once.
+
+    Safety stock is z * sigma_daily * sqrt(lead time); without two days of daily files the
+    daily standard deviation is unknown and Poisson demand (sigma = sqrt(velocity)) is assumed.
+    """
+    if not 0 < service_level < 1:
+        raise ValueError("service_level must be between 0 and 1")
+    if lead_time_days < 0 or review_days < 0 or overstock_days < 0:
+        raise ValueError("lead time, review and overstock days must not be negative")
+
+    z = NormalDist().inv_cdf(service_level)
+    velocity = metrics["daily_velocity"].to_numpy(np.float64)
+    sigma = metrics["daily_sales_std"].to_numpy(np.float64)
+    sigma = np.where(np.isnan(sigma), np.sqrt(velocity), sigma)
+    inventory = metrics["inventory"].to_numpy(np.float64)
+    mrp = metrics["mrp"].to_numpy(np.float64)
+
+    safety_stock = z * sigma * np.sqrt(lead_time_days)
+    reorder_point = velocity * lead_time_days + safety_stock
+    # Order up to the reorder point plus one review period of demand
+    order_qty = np.where(
+        (velocity > 0) & (inventory <= reorder_point),
+        np.ceil(np.clip(reorder_point + velocity * review_days - inventory, 0, None)),
+        0.0,
+    )
+    excess_qty = np.clip(inventory - (velocity * overstock_days + safety_stock), 0, None)
+    excess_qty = np.floor(excess_qty)
+
+    action = np.select(
+        [order_qty > 0, (velocity == 0) & (inventory > 0), excess_qty > 0, velocity == 0],
+        ["reorder", "no_demand", "overstock", "inactive"],
+        default="ok",
+    )
+
+    result = metrics.copy()
+    result["daily_sales_std"] = np.round(sigma, 4)
+    result["safety_stock"] = np.round(safety_stock, 1)
+    result["reorder_point"] = np.round(reorder_point, 1)
+    result["order_qty"] = order_qty
+    # SKUs without demand tie up their entire stock
+    result["excess_qty"] = np.where(action == "no_demand", inventory, excess_qty)
+    result["excess_value"] = np.round(result["excess_qty"].to_numpy() * mrp, 2)
+    result["action"] = action
+    return result[REPLENISHMENT_COLUMNS]
+
+
+def get_replenishment(**params):
+    """Replenishment plan for the current processed data"""
+    metrics, version = get_sku_metrics()
+    return compute_replenishment(metrics, **params), version
+
+
+@replenishment_bp.route('/replenishment', methods=['GET'])
+def replenishment_route():
+    try:
+        params = {
+            "lead_time_days": float(request.args.get("lead_time_days", REPLENISHMENT_LEAD_TIME_DAYS)),
+            "service_level": float(request.args.get("service_level", REPLENISHMENT_SERVICE_LEVEL)),
+            "review_days": float(request.args.get("review_days", REPLENISHMENT_REVIEW_DAYS)),
+            "overstock_days": float(request.args.get("overstock_days", OVERSTOCK_DAYS)),
+        }
+        plan, version = get_replenishment(**params)
+
+        mask = np.ones(len(plan), dtype=bool)
+        for key in ["brand", "category", "size", "color", "action"]:
+            value = request.args.get(key)
+            if value:
+                mask &= plan[key].to_numpy() == value.strip().lower()
+
+        sort = request.args.get("sort", "order_qty")
+        if sort not in REPLENISHMENT_COLUMNS:
+            return jsonify({"status": "error", "message": f"Unknown sort column '{sort}'"}), 400
+        ascending = request.args.get("order", "desc").lower() == "asc"
+        limit = min(int(request.args.get("limit", 100)), MAX_LIMIT)
+        offset = max(int(request.args.get("offset", 0)), 0)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        return jsonify({"status": "error", "message": f"Error computing replenishment plan: {str(e)}"}), 500
+
+    filtered = plan[mask]
+    page = filtered.sort_values(sort, ascending=ascending, kind="stable").iloc[offset:offset + limit]
+    records = page.astype(object).where(page.notna(), None).to_dict(orient="records")
+    return jsonify({
+        "status": "success",
+        "data_version": version,
+        "parameters": params,
+        "summary": {
+            action: int(count) for action, count in filtered["action"].value_counts().items()
+        },
+        "total": len(filtered),
+        "data": records,
+    })
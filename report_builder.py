@@ -0,0 +1,2112 @@
+# report_builder.py - PDF and chart rendering for the business report
+# Kept apart from report.py so the plotting and PDF libraries are only imported by the
+# process that builds a report, not by every web worker at startup.
+import os
+import pandas as pd
+import numpy as np
+import time
+import json
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import matplotlib
+matplotlib.use('Agg')  # Use non-interactive backend to avoid thread warnings
+import matplotlib.pyplot as plt
+from datetime import datetime
+from reportlab.lib.pagesizes import A4
+from reportlab.lib import colors
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image, Table, TableStyle, PageBreak
+from reportlab.lib.units import mm
+from reportlab.lib.enums import TA_LEFT, TA_CENTER, TA_RIGHT
+from reportlab.platypus.flowables import HRFlowable
+from reportlab.pdfgen import canvas
+from reportlab.lib.colors import HexColor
+from markdown import markdown
+import re
+from bs4 import BeautifulSoup
+from io import BytesIO
+import seaborn as sns
+
+from llm_client import generate_text
+from chart_cache import ChartCache, normalize_day_columns
+from analysis_cache import AnalysisCache
+from report_queries import REPORT_QUERIES, prepare_report_queries, execute_prepared_query
+from insights import load_insights
+from forecasting import get_forecasts
+from replenishment import get_replenishment, REPLENISHMENT_LEAD_TIME_DAYS, REPLENISHMENT_SERVICE_LEVEL, OVERSTOCK_DAYS
+from abc_classification import get_abc_summary, ABC_A_SHARE, ABC_B_SHARE
+from report import REPORT_DIR, ARCHIVED_REPORTS_DIR, DataSourceManager
+
+logger = logging.getLogger(__name__)
+
+LOGO_PATH = "static/images/logo.png"
+DEFAULT_LOGO = "static/images/default-logo.png"
+
+# Report pipeline concurrency: threads for queries + Gemini analyses, processes for charts
+REPORT_MAX_WORKERS = int(os.getenv("REPORT_MAX_WORKERS", "4"))
+REPORT_CHART_PROCESSES = int(os.getenv("REPORT_CHART_PROCESSES", str(min(4, os.cpu_count() or 1))))
+
+# Modern color scheme
+BRAND_COLORS = {
+    'primary': '#1E88E5',     # Modern blue
+    'secondary': '#26A69A',   # Teal green
+    'accent': '#FF5252',      # Bright red
+    'neutral': '#F5F5F5',     # Off-white
+    'dark_text': '#212121',   # Almost black
+    'light_text': '#FFFFFF',  # White
+    'positive': '#4CAF50',    # Green
+    'negative': '#F44336',    # Red
+    'warning': '#FFC107',     # Amber yellow
+    'info': '#2196F3',        # Info blue
+    'background': '#FFFFFF'   # White
+}
+
+# Define a modern color palette for charts
+CHART_COLORS = [
+    '#1E88E5', '#26A69A', '#FF5252', '#7E57C2', 
+    '#FFCA28', '#5C6BC0', '#9CCC65', '#EC407A',
+    '#29B6F6', '#FFA726'
+]
+
+# Custom page class for adding headers, footers and page numbering
+class PageTemplate(canvas.Canvas):
+    def __init__(self, *args, **kwargs):
+        canvas.Canvas.__init__(self, *args, **kwargs)
+        self.pages = []
+        
+    def showPage(self):
+        self.pages.append(dict(self.__dict__))
+        self._startPage()
+        
+    def save(self):
+        page_count = len(self.pages)
+        for i, page in enumerate(self.pages):
+            self.__dict__.update(page)
+            self.draw_page_template(i + 1, page_count)
+            canvas.Canvas.showPage(self)
+        canvas.Canvas.save(self)
+        
+    def draw_page_template(self, page_num, page_count):
+        # Skip header/footer for cover page
+        if page_num == 1:
+            return
+            
+        width, height = A4
+        
+        # Top header bar
+        self.setFillColor(HexColor(BRAND_COLORS['primary']))
+        self.rect(0, height - 25*mm, width, 25*mm, fill=1, stroke=0)
+        
+        # Add logo if exists
+        if os.path.exists(LOGO_PATH):
+            self.drawImage(LOGO_PATH, 10*mm, height - 20*mm, width=25*mm, height=15*mm, mask='auto')
+        
+        # Add header text
+        self.setFillColor(HexColor(BRAND_COLORS['light_text']))
+        self.setFont("Helvetica-Bold", 12)
+        self.drawString(40*mm, height - 15*mm, "InventorySync Business Intelligence")
+        
+        # Add date
+        self.setFont("Helvetica", 9)
+        self.drawString(width - 50*mm, height - 15*mm, datetime.now().strftime("%B %d, %Y"))
+        
+        # Bottom footer bar
+        self.setFillColor(HexColor(BRAND_COLORS['neutral']))
+        self.rect(0, 0, width, 12*mm, fill=1, stroke=0)
+        
+        # Add page number
+        self.setFillColor(HexColor(BRAND_COLORS['primary']))
+        self.setFont("Helvetica", 9)
+        self.drawString(width/2 - 10*mm, 5*mm, f"Page {page_num} of {page_count}")
+        
+        # Add user info
+        self.drawString(15*mm, 5*mm, "Generated by: Tanman")
+        
+        # Add company info
+        self.drawRightString(width - 15*mm, 5*mm, "Confidential")
+
+
+class ChartRenderError(Exception):
+    """Raised when the chart for a question cannot be drawn"""
+
+
+def render_chart(data: pd.DataFrame, question_id: int) -> bytes:
+    """Render the chart for a question and return it as PNG bytes.
+
+    Kept at module level so it can run in a worker process; pyplot keeps global
+    state and is not safe to drive from several threads at once. Raises
+    ChartRenderError on failure so the error placeholder is never cached.
+    """
+    buffer = BytesIO()
+    
+    if data.empty:
+        # Create empty figure with message
+        fig, ax = plt.subplots(figsize=(8, 4))
+        ax.text(0.5, 0.5, "No data available for visualization", 
+               horizontalalignment='center', verticalalignment='center',
+               fontsize=16, color='gray')
+        ax.axis('off')
+        plt.savefig(buffer, format='png', dpi=150, bbox_inches='tight')
+        plt.close()
+        return buffer.getvalue()
+        
+    try:
+        # Set style for consistent, modern visuals
+        plt.style.use('seaborn-v0_8-whitegrid')
+        
+        # Convert column names to lowercase for consistent access
+        data.columns = [col.lower() for col in data.columns]
+        
+        # Create figure with consistent size and high-quality settings
+        fig, ax = plt.subplots(figsize=(8, 4.5), dpi=150)
+        
+        # Modern style settings
+        plt.rcParams['font.family'] = 'sans-serif'
+        plt.rcParams['font.sans-serif'] = ['Arial', 'DejaVu Sans', 'Liberation Sans']
+        
+        if question_id == 1:  # Items reaching inventory thresholds
+            if all(col in data.columns for col in ['percent_sold', 'est_days_to_sellout']):
+                # Define size based on purchase quantity
+                if 'purchaseqty' in data.columns:
+                    sizes = data['purchaseqty'] * 3
+                    sizes = sizes.clip(20, 200)  # Min/max bubble size
+                else:
+                    sizes = 100
+                
+                # Create scatter plot with color gradient
+                scatter = ax.scatter(
+                    x=data['percent_sold'],
+                    y=data['est_days_to_sellout'],
+                    c=data['percent_sold'],
+                    cmap='viridis',
+                    s=sizes,
+                    alpha=0.7,
+                    edgecolors='white'
+                )
+                
+                # Add reference lines for thresholds
+                ax.axvline(x=75, color=BRAND_COLORS['negative'], linestyle='--', linewidth=1, alpha=0.7)
+                ax.axvline(x=50, color=BRAND_COLORS['warning'], linestyle='--', linewidth=1, alpha=0.7)
+                
+                # Add labels for threshold lines
+                ax.text(76, ax.get_ylim()[1]*0.95, "75% Threshold", rotation=90, 
+                        color=BRAND_COLORS['negative'], alpha=0.8)
+                ax.text(51, ax.get_ylim()[1]*0.95, "50% Threshold", rotation=90, 
+                        color=BRAND_COLORS['warning'], alpha=0.8)
+                
+                # Add data labels for important points
+                for i, row in data.iterrows():
+                    if row['percent_sold'] > 70:
+                        ax.annotate(
+                            row['brand'],
+                            (row['percent_sold'], row['est_days_to_sellout']),
+                            fontsize=8,
+                            ha='center',
+                            va='bottom'
+                        )
+                
+                # Customize chart
+                ax.set_xlabel("Percentage Sold (%)")
+                ax.set_ylabel("Estimated Days to Sell Out")
+                ax.set_title("Inventory Alert - Items at Risk of Stock-Out", fontweight='bold')
+                
+                # Add colorbar
+                cbar = plt.colorbar(scatter, ax=ax)
+                cbar.set_label('Percentage Sold (%)')
+                
+            else:
+                # Fallback for missing columns
+                sns.barplot(
+                    x=data['brand'] if 'brand' in data.columns else data.columns[0],
+                    y=data['purchaseqty'] if 'purchaseqty' in data.columns else data.columns[1],
+                    hue=data['category'] if 'category' in data.columns else None,
+                    palette=CHART_COLORS,
+                    ax=ax
+                )
+                ax.set_title("Inventory by Brand", fontweight='bold')
+                ax.set_xlabel("Brand")
+                ax.set_ylabel("Purchase Quantity")
+                plt.xticks(rotation=45, ha='right')
+            
+        elif question_id == 2:  # Best-selling items by period
+            if 'period' in data.columns and 'sales' in data.columns:
+                # Filter to show only top 5 items per period
+                periods = data['period'].unique()
+                filtered_data = pd.DataFrame()
+                
+                for period in periods:
+                    period_data = data[data['period'] == period].nlargest(5, 'sales')
+                    filtered_data = pd.concat([filtered_data, period_data])
+                
+                # Create grouped bar chart
+                sns.barplot(
+                    x='brand',
+                    y='sales',
+                    hue='period',
+                    data=filtered_data,
+                    palette=[BRAND_COLORS['primary'], BRAND_COLORS['secondary'], BRAND_COLORS['accent']],
+                    ax=ax
+                )
+                
+                # Customize
+                ax.set_title("Best-Selling Items by Period", fontweight='bold')
+                ax.set_xlabel("Brand")
+                ax.set_ylabel("Sales Quantity")
+                plt.xticks(rotation=45, ha='right')
+                
+                # Add legend at bottom
+                ax.legend(title="Period", loc='upper center', bbox_to_anchor=(0.5, -0.15), ncol=3)
+                
+            else:
+                # Fallback if period column is missing
+                sns.barplot(
+                    x=data['brand'] if 'brand' in data.columns else data.columns[0],
+                    y=data['salesqty'] if 'salesqty' in data.columns else data.columns[1],
+                    hue=data['category'] if 'category' in data.columns else None,
+                    palette=CHART_COLORS,
+                    ax=ax
+                )
+                ax.set_title("Best-Selling Items", fontweight='bold')
+                ax.set_xlabel("Brand")
+                ax.set_ylabel("Sales Quantity")
+                plt.xticks(rotation=45, ha='right')
+            
+        elif question_id == 3:  # Non-moving products
+            if all(col in data.columns for col in ['brand', 'purchaseqty', 'days_in_inventory']):
+                # Sort and get top items
+                data = data.sort_values('days_in_inventory', ascending=False).head(10)
+                
+                # Create a proper colormap
+                norm = plt.Normalize(data['days_in_inventory'].min(), data['days_in_inventory'].max())
+                cmap = plt.cm.YlOrRd
+                colors = cmap(norm(data['days_in_inventory']))
+                
+                # Create horizontal bar chart
+                bars = ax.barh(
+                    y=data['brand'],
+                    width=data['purchaseqty'],
+                    color=colors
+                )
+                
+                # Add day counts at the end of each bar
+                for i, bar in enumerate(bars):
+                    days = data.iloc[i]['days_in_inventory']
+                    ax.text(
+                        bar.get_width() + 0.5, 
+                        bar.get_y() + bar.get_height()/2, 
+                        f"{int(days)} days", 
+                        ha='left', va='center', 
+                        fontweight='bold', 
+                        fontsize=8,
+                        color='dimgray'
+                    )
+                
+                ax.set_title("Non-Moving Products by Days in Inventory", fontweight='bold')
+                ax.set_xlabel("Inventory Quantity")
+                ax.set_ylabel("Brand")
+                
+                # Create a properly configured colorbar
+                sm = plt.cm.ScalarMappable(cmap=cmap, norm=norm)
+                sm.set_array([])
+                fig.colorbar(sm, ax=ax, label='Days in Inventory')
+            
+        elif question_id == 4:  # Slow-moving sizes
+            if all(col in data.columns for col in ["category", "size", "percent_sold"]):
+                # Create scatter plot
+                y_column = "avg_days_in_inventory" if "avg_days_in_inventory" in data.columns else "size_count"
+                
+                # Use different colors for different categories
+                categories = data['category'].unique()
+                category_colors = dict(zip(categories, CHART_COLORS[:len(categories)]))
+                colors = [category_colors[cat] for cat in data['category']]
+                
+                # Create scatter with size variation
+                size_var = "total_purchased" if "total_purchased" in data.columns else "size_count"
+                sizes = data[size_var] / data[size_var].max() * 500 + 50  # Scale sizes
+                
+                ax.scatter(
+                    x=data["percent_sold"],
+                    y=data[y_column],
+                    s=sizes,
+                    c=colors,
+                    alpha=0.7,
+                    edgecolors='white'
+                )
+                
+                # Add size labels
+                for i, row in data.iterrows():
+                    ax.annotate(
+                        row["size"], 
+                        (row["percent_sold"], row[y_column]),
+                        fontsize=9,
+                        ha='center',
+                        color='black'
+                    )
+                
+                ax.set_title("Slow-Moving Sizes Analysis", fontweight='bold')
+                ax.set_xlabel("Percentage Sold (%)")
+                ax.set_ylabel("Avg Days in Inventory" if "avg_days_in_inventory" in data.columns 
+                            else "Number of Items in Size")
+                
+                # Manual legend for categories
+                handles = [plt.Line2D([0], [0], marker='o', color='w', markerfacecolor=color, markersize=8)
+                          for color in category_colors.values()]
+                ax.legend(handles, category_colors.keys(), title="Category",
+                         loc='upper left', bbox_to_anchor=(1, 1))
+                
+            else:
+                # Fallback visualization
+                sns.barplot(
+                    x=data["category"] if "category" in data.columns else data.columns[0],
+                    y=data["percent_sold"] if "percent_sold" in data.columns else data.columns[1],
+                    palette=CHART_COLORS,
+                    ax=ax
+                )
+                ax.set_title("Slow-Moving Items Analysis", fontweight='bold')
+                ax.set_xlabel("Category")
+                ax.set_ylabel("Percent Sold")
+                plt.xticks(rotation=45, ha='right')
+            
+        elif question_id == 5:  # Category variance analysis
+            if all(col in data.columns for col in ["variance_from_avg", "category"]):
+                # Sort data by variance
+                data = data.sort_values("variance_from_avg")
+                
+                # Create a color map for positive and negative variances
+                colors = [BRAND_COLORS['negative'] if x < 0 else BRAND_COLORS['positive'] for x in data['variance_from_avg']]
+                
+                # Create horizontal bar chart
+                bars = ax.barh(
+                    y=data["category"], 
+                    width=data["variance_from_avg"],
+                    color=colors,
+                    height=0.6
+                )
+                
+                # Add value labels
+                for i, bar in enumerate(bars):
+                    width = bar.get_width()
+                    label_x = width + 0.5 if width >= 0 else width - 0.5
+                    ax.text(
+                        label_x, 
+                        bar.get_y() + bar.get_height()/2, 
+                        f"{width:+.1f}%", 
+                        ha='left' if width >= 0 else 'right', 
+                        va='center',
+                        fontsize=9,
+                        weight='bold',
+                        color='dimgray'
+                    )
+                
+                # Add vertical line at 0
+                ax.axvline(x=0, color='black', linestyle='-', linewidth=0.8, alpha=0.3)
+                
+                ax.set_title("Category Performance Variance from Average", fontweight='bold')
+                ax.set_xlabel("Variance from Average Sell-Through Rate (%)")
+                ax.set_ylabel("Category")
+                
+                # Add custom legend
+                ax.legend(
+                    [plt.Rectangle((0,0),1,1,color=BRAND_COLORS['positive']),
+                     plt.Rectangle((0,0),1,1,color=BRAND_COLORS['negative'])], 
+                    ['Above Average', 'Below Average']
+                )
+                
+            else:
+                # Fallback for missing columns
+                sns.barplot(
+                    x=data.columns[0],
+                    y=data.columns[1],
+                    palette=CHART_COLORS,
+                    ax=ax
+                )
+                ax.set_title("Category Performance Analysis", fontweight='bold')
+                ax.set_xlabel(data.columns[0])
+                ax.set_ylabel(data.columns[1])
+                plt.xticks(rotation=45, ha='right')
+            
+        elif question_id == 6:  # Returns and exchanges analysis
+            if 'return_qty' in data.columns:
+                # Get top 5 brands by return quantity for better visualization
+                data = data.nlargest(5, 'return_qty')
+                
+                # Create bar chart
+                bars = ax.bar(
+                    x=data["brand"],
+                    height=data["return_qty"],
+                    color=BRAND_COLORS['accent'],
+                    edgecolor='white',
+                    linewidth=1
+                )
+                
+                # Add return rate labels if it exists
+                if "return_rate" in data.columns:
+                    for i, bar in enumerate(bars):
+                        rate = data.iloc[i]["return_rate"]
+                        if not pd.isna(rate):
+                            ax.text(
+                                bar.get_x() + bar.get_width()/2, 
+                                bar.get_height() + 0.5, 
+                                f"{rate:.1f}%", 
+                                ha='center', 
+                                va='bottom',
+                                fontsize=9,
+                                fontweight='bold'
+                            )
+                
+                ax.set_title("Returns Analysis by Brand", fontweight='bold')
+                ax.set_xlabel("Brand")
+                ax.set_ylabel("Return Quantity")
+                plt.xticks(rotation=45, ha='right')
+                
+            else:
+                # Fallback visualization with any data
+                sns.barplot(
+                    x=data.columns[0],
+                    y=data.columns[1],
+                    palette=[BRAND_COLORS['accent']],
+                    ax=ax
+                )
+                ax.set_title("Returns Analysis", fontweight='bold')
+                ax.set_xlabel(data.columns[0])
+                ax.set_ylabel(data.columns[1])
+                plt.xticks(rotation=45, ha='right')
+            
+        elif question_id == 7:  # Rejected goods analysis
+            if all(col in data.columns for col in ["brand", "return_qty", "rejected_qty"]):
+                # Get top 5 brands for better visualization
+                if 'total_issues' in data.columns:
+                    data = data.nlargest(5, 'total_issues')
+                else:
+                    data = data.nlargest(5, 'return_qty')
+                
+                # Set up positions for bars
+                x = np.arange(len(data['brand']))
+                width = 0.35
+                
+                # Create grouped bar chart
+                bar1 = ax.bar(
+                    x - width/2, 
+                    data['return_qty'], 
+                    width, 
+                    label='Returns',
+                    color=BRAND_COLORS['accent'],
+                    edgecolor='white',
+                    linewidth=0.5
+                )
+                
+                bar2 = ax.bar(
+                    x + width/2, 
+                    data['rejected_qty'], 
+                    width, 
+                    label='Rejected',
+                    color=BRAND_COLORS['warning'],
+                    edgecolor='white',
+                    linewidth=0.5
+                )
+                
+                ax.set_title("Returns and Rejected Goods by Brand", fontweight='bold')
+                ax.set_xlabel("Brand")
+                ax.set_ylabel("Quantity")
+                ax.set_xticks(x)
+                ax.set_xticklabels(data['brand'], rotation=45, ha='right')
+                ax.legend()
+                
+            else:
+                # Fallback visualization
+                sns.barplot(
+                    x=data.columns[0],
+                    y=data.columns[1] if len(data.columns) > 1 else "value",
+                    palette=CHART_COLORS[:1],
+                    ax=ax
+                )
+                ax.set_title("Returns and Rejected Goods Analysis", fontweight='bold')
+                ax.set_xlabel(data.columns[0])
+                ax.set_ylabel(data.columns[1] if len(data.columns) > 1 else "Value")
+                plt.xticks(rotation=45, ha='right')
+            
+        elif question_id == 8:  # Online sales recommendations
+            if all(col in data.columns for col in ["sell_through_rate", "stock_value"]):
+                # Create scatter plot with size based on remaining stock
+                sizes = data["remaining_stock"] * 5 if "remaining_stock" in data.columns else 100
+                sizes = sizes.clip(50, 300)  # Min/max size for better visuals
+                
+                # Create custom colormap for categories
+                categories = data['category'].unique() if 'category' in data.columns else []
+                n_categories = len(categories)
+                colors = CHART_COLORS[:n_categories] if n_categories > 0 else [BRAND_COLORS['primary']]
+                category_colors = dict(zip(categories, colors))
+                
+                if 'category' in data.columns:
+                    scatter_colors = [category_colors[c] for c in data['category']]
+                else:
+                    scatter_colors = BRAND_COLORS['primary']
+                
+                # Create scatter plot
+                ax.scatter(
+                    data["sell_through_rate"],
+                    data["stock_value"],
+                    s=sizes,
+                    c=scatter_colors,
+                    alpha=0.7,
+                    edgecolors='white',
+                    linewidth=1
+                )
+                
+                # Add brand labels
+                for i, row in data.iterrows():
+                    ax.annotate(
+                        row["brand"], 
+                        (row["sell_through_rate"], row["stock_value"]),
+                        fontsize=8,
+                        ha='center',
+                        va='bottom',
+                        color='black'
+                    )
+                
+                ax.set_title("Products Recommended for Online Sales", fontweight='bold')
+                ax.set_xlabel("Sell-Through Rate (%)")
+                ax.set_ylabel("Remaining Stock Value")
+                
+                # Add legend for categories
+                if 'category' in data.columns:
+                    handles = [plt.Line2D([0], [0], marker='o', color='w', 
+                                        markerfacecolor=color, markersize=8)
+                              for color in category_colors.values()]
+                    ax.legend(handles, category_colors.keys(), 
+                             title="Category", loc='best')
+                
+            else:
+                # Fallback visualization
+                sns.barplot(
+                    x=data.columns[0],
+                    y=data.columns[1] if len(data.columns) > 1 else "value",
+                    palette=CHART_COLORS,
+                    ax=ax
+                )
+                ax.set_title("Products for Online Sales", fontweight='bold')
+                ax.set_xlabel(data.columns[0])
+                ax.set_ylabel(data.columns[1] if len(data.columns) > 1 else "Value")
+                plt.xticks(rotation=45, ha='right')
+            
+        elif question_id == 9:  # Unique products
+            if all(col in data.columns for col in ["category_size_count", "brand_count"]):
+                # Create scatter plot
+                ax.scatter(
+                    data["category_size_count"],
+                    data["brand_count"],
+                    s=data["mrp"]*3 if "mrp" in data.columns else 100,
+                    c=CHART_COLORS[:len(data)],
+                    alpha=0.7,
+                    edgecolors='white'
+                )
+                
+                # Add brand labels
+                for i, row in data.iterrows():
+                    ax.annotate(
+                        row["brand"], 
+                        (row["category_size_count"], row["brand_count"]),
+                        fontsize=9,
+                        ha='center',
+                        va='bottom',
+                        color='black'
+                    )
+                
+                ax.set_title("Unique Products for Online Portfolio Enhancement", fontweight='bold')
+                ax.set_xlabel("Category/Size Uniqueness (Lower is More Unique)")
+                ax.set_ylabel("Brand Uniqueness (Lower is More Unique)")
+                
+                # Add diagonal line to show 'total uniqueness'
+                max_val = max(ax.get_xlim()[1], ax.get_ylim()[1])
+                ax.plot([0, max_val], [0, max_val], 'k--', alpha=0.3)
+                
+            else:
+                # Fallback visualization
+                sns.barplot(
+                    x=data.columns[0],
+                    y=data.columns[1] if len(data.columns) > 1 else "value",
+                    palette=CHART_COLORS,
+                    ax=ax
+                )
+                ax.set_title("Unique Products Analysis", fontweight='bold')
+                ax.set_xlabel(data.columns[0])
+                ax.set_ylabel(data.columns[1] if len(data.columns) > 1 else "Value")
+                plt.xticks(rotation=45, ha='right')
+            
+        elif question_id == 10:  # Pareto analysis (80/20 rule)
+            if all(col in data.columns for col in ["percent_of_total", "cumulative_percent"]):
+                # Create second y-axis for cumulative percentage
+                ax2 = ax.twinx()
+                
+                # Bar chart for individual contribution
+                bars = ax.bar(
+                    range(len(data)), 
+                    data["percent_of_total"], 
+                    color=BRAND_COLORS['secondary'],
+                    alpha=0.7,
+                    label="Revenue Contribution (%)"
+                )
+                
+                # Add data labels to bars
+                for i, bar in enumerate(bars):
+                    height = bar.get_height()
+                    ax.text(
+                        bar.get_x() + bar.get_width()/2,
+                        height + 0.3,
+                        f"{height:.1f}%",
+                        ha='center',
+                        va='bottom',
+                        fontsize=8
+                    )
+                
+                # Plot the cumulative percentage line
+                ax2.plot(
+                    range(len(data)), 
+                    data["cumulative_percent"], 
+                    'o-', 
+                    color=BRAND_COLORS['primary'],
+                    linewidth=2,
+                    markersize=6,
+                    label="Cumulative Revenue (%)"
+                )
+                
+                # Add 80% reference line
+                ax2.axhline(y=80, color=BRAND_COLORS['accent'], linestyle='--', 
+                           linewidth=1, alpha=0.8)
+                ax2.text(
+                    0, 81, 
+                    "80% Revenue Threshold", 
+                    color=BRAND_COLORS['accent'], 
+                    fontsize=9,
+                    fontweight='bold'
+                )
+                
+                                    #  Set up axes
+                ax.set_xlabel("Products (Top Revenue Contributors)")
+                ax.set_ylabel("Revenue Contribution (%)")
+                ax2.set_ylabel("Cumulative Revenue (%)")
+                
+                # Set tick positions and labels
+                ax.set_xticks(range(len(data)))
+                ax.set_xticklabels([f"{b[:8]}..." for b in data["brand"]], rotation=45, ha='right')
+                ax.set_ylim(0, data["percent_of_total"].max() * 1.2)
+                ax2.set_ylim(0, 100)
+                
+                # Add legend
+                lines1, labels1 = ax.get_legend_handles_labels()
+                lines2, labels2 = ax2.get_legend_handles_labels()
+                ax2.legend(lines1 + lines2, labels1 + labels2, loc='upper center', 
+                          bbox_to_anchor=(0.5, -0.15), ncol=2)
+                
+                ax.set_title("Pareto Analysis: Top Products by Revenue Contribution", fontweight='bold')
+                
+            else:
+                # Fallback visualization
+                sns.barplot(
+                    x=data.columns[0],
+                    y=data.columns[1] if len(data.columns) > 1 else "value",
+                    palette=CHART_COLORS,
+                    ax=ax
+                )
+                ax.set_title("Top Products Analysis", fontweight='bold')
+                ax.set_xlabel(data.columns[0])
+                ax.set_ylabel(data.columns[1] if len(data.columns) > 1 else "Value")
+                plt.xticks(rotation=45, ha='right')
+            
+        elif question_id == 11:  # Low-performing inventory reduction
+            if all(col in data.columns for col in ["sell_through_rate", "locked_capital"]):
+                # Get top items for better visualization
+                data = data.nlargest(8, 'locked_capital')
+                
+                # Create bubble chart style
+                scatter = ax.scatter(
+                    data["sell_through_rate"],
+                    data["locked_capital"],
+                    s=data["excess_inventory"] if "excess_inventory" in data.columns else 100,
+                    c=data["sell_through_rate"],  # Color by sell-through rate
+                    cmap="RdYlGn",  # Red to Yellow to Green
+                    vmin=0,
+                    vmax=30,  # 30% as upper bound for better color contrast
+                    alpha=0.7,
+                    edgecolors='white'
+                )
+                
+                # Add brand labels
+                for i, row in data.iterrows():
+                    ax.annotate(
+                        row["brand"], 
+                        (row["sell_through_rate"], row["locked_capital"]),
+                        fontsize=9,
+                        ha='center',
+                        va='bottom',
+                        color='black'
+                    )
+                
+                ax.set_title("Low-Performing Items with Locked Capital", fontweight='bold')
+                ax.set_xlabel("Sell-Through Rate (%)")
+                ax.set_ylabel("Locked Capital Value")
+                
+                # Add colorbar to show sell-through rate with explicit ax parameter
+                cbar = fig.colorbar(scatter, ax=ax)
+                cbar.set_label('Sell-Through Rate (%)')
+                
+            else:
+                # Fallback visualization
+                sns.barplot(
+                    x=data.columns[0],
+                    y=data.columns[1] if len(data.columns) > 1 else "value",
+                    palette=CHART_COLORS,
+                    ax=ax
+                )
+                ax.set_title("Low-Performing Inventory Analysis", fontweight='bold')
+                ax.set_xlabel(data.columns[0])
+                ax.set_ylabel(data.columns[1] if len(data.columns) > 1 else "Value")
+                plt.xticks(rotation=45, ha='right')
+            
+        else:
+            # Generic bar chart for any other question
+            if 'brand' in data.columns and 'category' in data.columns:
+                y_column = [col for col in data.columns if col not in ['brand', 'category']][0] if len(data.columns) > 2 else data.columns[1]
+                
+                # Create grouped bar chart by category
+                sns.barplot(
+                    x='brand',
+                    y=y_column,
+                    hue='category',
+                    data=data,
+                    palette=CHART_COLORS,
+                    ax=ax
+                )
+                
+                ax.set_title(f"Analysis for Question {question_id}", fontweight='bold')
+                ax.set_xlabel("Brand")
+                ax.set_ylabel(y_column.replace('_', ' ').title())
+                plt.xticks(rotation=45, ha='right')
+                ax.legend(title="Category", bbox_to_anchor=(1, 1))
+                
+            else:
+                # Very generic fallback
+                sns.barplot(
+                    x=data.columns[0],
+                    y=data.columns[1] if len(data.columns) > 1 else "value",
+                    palette=CHART_COLORS,
+                    ax=ax
+                )
+                ax.set_title(f"Analysis for Question {question_id}", fontweight='bold')
+                ax.set_xlabel(data.columns[0])
+                ax.set_ylabel(data.columns[1] if len(data.columns) > 1 else "Value")
+                plt.xticks(rotation=45, ha='right')
+        
+        # Add overall styling improvements
+        
+        # Add subtle grid lines
+        ax.grid(True, linestyle='--', alpha=0.3)
+        
+        # Add a border around the chart area
+        for spine in ax.spines.values():
+            spine.set_edgecolor(BRAND_COLORS['primary'])
+            spine.set_linewidth(0.8)
+        
+        # Add subtle box around the figure with brand color
+        fig.patch.set_edgecolor(BRAND_COLORS['primary'])
+        fig.patch.set_linewidth(2)
+        
+        # Modern padding and alignment
+        plt.tight_layout()
+        
+        # Save high-quality figure
+        plt.savefig(buffer, format='png', dpi=300, bbox_inches='tight')
+        plt.close(fig)
+        return buffer.getvalue()
+        
+    except Exception as e:
+        plt.close('all')
+        raise ChartRenderError(str(e)) from e
+
+
+def render_error_chart(question_id: int, error) -> bytes:
+    """Placeholder PNG shown in the report when a question's chart fails"""
+    print(f"Error creating chart for question {question_id}: {str(error)}")
+    buffer = BytesIO()
+    with _chart_lock:
+        fig, ax = plt.subplots(figsize=(8, 4))
+        ax.text(0.5, 0.5, f"Error creating visualization: {str(error)}", 
+               horizontalalignment='center', verticalalignment='center',
+               fontsize=12, color='red', wrap=True)
+        ax.axis('off')
+        plt.savefig(buffer, format='png', dpi=150, bbox_inches='tight')
+        plt.close(fig)
+    return buffer.getvalue()
+
+
+# Serialises in-process chart rendering (pyplot keeps global figure state)
+_chart_lock = threading.Lock()
+
+
+def _render_chart_locked(data: pd.DataFrame, question_id: int) -> bytes:
+    with _chart_lock:
+        return render_chart(data, question_id)
+
+
+_chart_pool = None
+_chart_pool_lock = threading.Lock()
+
+
+def get_chart_pool():
+    """Executor used to render charts while queries and Gemini analyses are in flight.
+
+    One pool of spawned worker processes, started on first use and shared by every report.
+    Forking is avoided because this process runs query, LLM and scheduler threads whose
+    locks a forked child could inherit held. Spawned workers re-import the entry module
+    (data.py as __mp_main__ under `python data.py`), which is safe only because importing
+    data never starts background services. Falls back to a single rendering thread.
+    """
+    global _chart_pool
+    with _chart_pool_lock:
+        # A worker that died leaves the pool broken; replace it
+        if _chart_pool is None or getattr(_chart_pool, "_broken", False):
+            _chart_pool = None
+            if REPORT_CHART_PROCESSES > 0:
+                try:
+                    _chart_pool = ProcessPoolExecutor(
+                        max_workers=REPORT_CHART_PROCESSES,
+                        mp_context=multiprocessing.get_context("spawn")
+                    )
+                except Exception as e:
+                    logger.warning(f"Chart process pool unavailable, rendering charts in-process: {e}")
+            if _chart_pool is None:
+                _chart_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="report-chart")
+        return _chart_pool
+
+
+class ReportBuilder:
+    def __init__(self, data_version=None, progress_callback=None):
+        self.data_version = data_version
+        # Called as progress_callback(stage, completed, total, question_id=None)
+        self.progress_callback = progress_callback
+        self._progress_lock = threading.Lock()
+        self._completed_steps = 0
+        # Sections whose Gemini call failed; such a report is not reused for its data version
+        self.llm_failures = []
+        self.supplementary_sections = []
+        self.data_manager = DataSourceManager()
+        self.chart_cache = ChartCache()
+        self.analysis_cache = AnalysisCache()
+        
+        # Report questions come from the query catalog; their SQL is resolved once per builder
+        self.questions = REPORT_QUERIES
+        # Results materialized at ingest time; the temp SQLite copy of the XLSX files is only
+        # built when a question has no precomputed result for the current data
+        self.insights = load_insights(data_version)
+        self.conn = None
+        self.prepared_queries = None
+        self._local_db_lock = threading.Lock()
+    
+    def get_logo_path(self):
+        """Return path to logo image"""
+        if os.path.exists(LOGO_PATH):
+            return LOGO_PATH
+        else:
+            # Ensure default logo exists, otherwise create one
+            if not os.path.exists(DEFAULT_LOGO):
+                os.makedirs(os.path.dirname(DEFAULT_LOGO), exist_ok=True)
+                # Create a simple default logo
+                from PIL import Image, ImageDraw, ImageFont
+                img = Image.new('RGB', (400, 100), color=(255, 255, 255))
+                d = ImageDraw.Draw(img)
+                try:
+                    font = ImageFont.truetype("arial.ttf", 36)
+                except IOError:
+                    font = ImageFont.load_default()
+                d.text((20, 30), "InventorySync", fill=(0, 0, 0), font=font)
+                img.save(DEFAULT_LOGO)
+            return DEFAULT_LOGO
+    
+    def create_visualization(self, data: pd.DataFrame, question_id: int) -> BytesIO:
+        """Create a visualization image based on the question and data"""
+        try:
+            return BytesIO(_render_chart_locked(data, question_id))
+        except ChartRenderError as e:
+            return BytesIO(render_error_chart(question_id, e))
+    
+    # def execute_query_for_question(self, question):
+    #     """Execute the query for a specific question"""
+    #     query = question["query"]
+    #     data_source = question["data_source"]
+        
+    #     if data_source == "neon_db":
+    #         result = self.data_manager.execute_neon_query(query)
+    #     elif data_source == "local_master" or data_source == "local_daily":
+    #         result = self.data_manager.execute_sqlite_query(query)
+    #     else:  # Try local first, then neon
+    #         result = self.data_manager.execute_sqlite_query(query)
+    #         if isinstance(result, dict) and "error" in result:
+    #             print(f"Falling back to Neon DB for question {question['id']}")
+    #             # Adjust query for Neon DB if needed
+    #             adjusted_query = query.replace("master_summary", "sales_data")
+    #             adjusted_query = adjusted_query.replace("daily_", "sales_data")
+    #             adjusted_query = adjusted_query.replace("Brand", "brand")
+    #             adjusted_query = adjusted_query.replace("Category", "category")
+    #             adjusted_query = adjusted_query.replace("Size", "size")
+    #             adjusted_query = adjusted_query.replace("Color", "color")
+    #             adjusted_query = adjusted_query.replace("MRP", "mrp")
+    #             adjusted_query = adjusted_query.replace("SalesQty", "sales_qty")
+    #             adjusted_query = adjusted_query.replace("PurchaseQty", "purchase_qty")
+    #             adjusted_query = re.sub(r'julianday\([^)]+\)', "EXTRACT(DAY FROM NOW() - created_at)", adjusted_query)
+    #             adjusted_query = re.sub(r'julianday\(\'now\'\)\s*-\s*julianday\(date\)', "EXTRACT(DAY FROM NOW() - created_at)", adjusted_query)
+    #             adjusted_query = adjusted_query.replace("ROUND(", "")
+    #             adjusted_query = adjusted_query.replace(", 2)", "")
+    #             adjusted_query = adjusted_query.replace(", 0)", "")
+                
+    #             result = self.data_manager.execute_neon_query(adjusted_query)
+        
+    #     # If we still have an error, return empty DataFrame with error message
+    #     if isinstance(result, dict) and "error" in result:
+    #         print(f"Error executing query for question {question['id']}: {result['error']}")
+    #         return pd.DataFrame()
+        
+    #     return result
+
+
+    def get_question_metrics(self, question_id, data):
+        """Extract key metrics for the dashboard shown above a question's chart"""
+        metrics_dict = {}
+        try:
+            # Get metrics based on the question
+            if question_id == 1:  # Inventory thresholds
+                metrics_dict = {
+                    "Items ≥75% Sold": len(data[data['percent_sold'] >= 75]),
+                    "Items ≥50% Sold": len(data[data['percent_sold'] >= 50]) - len(data[data['percent_sold'] >= 75]),
+                    "Avg Days to Sellout": int(data['est_days_to_sellout'].mean()) if 'est_days_to_sellout' in data.columns else 'N/A'
+                }
+            elif question_id == 2:  # Best-selling items
+                if 'period' in data.columns and 'sales' in data.columns:
+                    weekly = data[data['period'] == 'weekly']['sales'].sum() if 'weekly' in data['period'].values else 0
+                    monthly = data[data['period'] == 'monthly']['sales'].sum() if 'monthly' in data['period'].values else 0
+                    metrics_dict = {
+                        "Weekly Sales": int(weekly),
+                        "Monthly Sales": int(monthly),
+                        "Top Seller": data.iloc[0]['brand'] if 'brand' in data.columns and len(data) > 0 else 'N/A'
+                    }
+            elif question_id == 3:  # Non-moving products
+                if 'days_in_inventory' in data.columns and 'purchaseqty' in data.columns:
+                    metrics_dict = {
+                        "Non-Moving Count": len(data),
+                        "Total Stock Value": int(sum(data['purchaseqty'] * data['mrp'])) if 'mrp' in data.columns else 'N/A',
+                        "Avg Days in Stock": int(data['days_in_inventory'].mean())
+                    }
+            elif question_id == 10:  # Pareto analysis
+                if all(col in data.columns for col in ["percent_of_total", "cumulative_percent"]):
+                    metrics_dict = {
+                        "Top Product Share": f"{data['percent_of_total'].max():.1f}%",
+                        "Products for 80%": len(data),
+                        "Coverage": f"{data['cumulative_percent'].iloc[-1]:.1f}%"
+                    }
+            # Add metrics for other questions as needed
+        except Exception as e:
+            print(f"Error creating metrics for question {question_id}: {str(e)}")
+        return metrics_dict
+
+    def report_progress(self, stage, question_id=None, step_done=False):
+        """Forward pipeline progress to the progress callback, if any.
+
+        The total counts one step per question plus the executive summary and PDF assembly.
+        """
+        if not self.progress_callback:
+            return
+        with self._progress_lock:
+            if step_done:
+                self._completed_steps += 1
+            completed = self._completed_steps
+        try:
+            self.progress_callback(stage, completed, len(self.questions) + 2, question_id=question_id)
+        except Exception as e:
+            print(f"Error reporting progress: {str(e)}")
+
+    def process_question(self, question, chart_pool):
+        """Query, chart and analyse one question; runs on the report worker pool"""
+        try:
+            return self._process_question(question, chart_pool)
+        finally:
+            self.report_progress("done", question["id"], step_done=True)
+
+    def _process_question(self, question, chart_pool):
+        self.report_progress("query", question["id"])
+        data = self.execute_query_for_question(question)
+        if not isinstance(data, pd.DataFrame) or data.empty:
+            return {"data": None}
+
+        metrics_dict = self.get_question_metrics(question["id"], data)
+        # Unchanged query results reuse the previously rendered chart
+        chart_key = self.chart_cache.make_key(question["id"], data)
+        chart = self.chart_cache.get(chart_key)
+        if chart is None:
+            # The chart renders in parallel with the Gemini call; it gets its own copy of
+            # the data because render_chart normalises column names in place
+            chart = chart_pool.submit(render_chart, data.copy(), question["id"])
+        self.report_progress("analysis", question["id"])
+        analysis = self.get_gemini_analysis(question["question"], data, question_id=question["id"])
+        return {
+            "data": data,
+            "metrics": metrics_dict,
+            "analysis": analysis,
+            "chart": chart,
+            "chart_key": chart_key,
+        }
+
+    def run_question_pipeline(self):
+        """Process every question concurrently and return the results in question order"""
+        chart_pool = get_chart_pool()
+        with ThreadPoolExecutor(max_workers=max(1, REPORT_MAX_WORKERS), thread_name_prefix="report") as executor:
+            futures = [executor.submit(self.process_question, question, chart_pool) for question in self.questions]
+            results = []
+            for question, future in zip(self.questions, futures):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"Error processing question {question['id']}: {str(e)}")
+                    result = {"data": None}
+                if result["data"] is not None and not isinstance(result["chart"], bytes):
+                    try:
+                        try:
+                            result["chart"] = result["chart"].result()
+                        except ChartRenderError:
+                            raise
+                        except Exception as e:
+                            # A broken worker process should not cost the report its chart
+                            print(f"Chart worker failed for question {question['id']}, rendering in-process: {str(e)}")
+                            result["chart"] = _render_chart_locked(result["data"].copy(), question["id"])
+                        self.chart_cache.put(result["chart_key"], result["chart"])
+                    except ChartRenderError as e:
+                        # Only successfully rendered charts are cached
+                        result["chart"] = render_error_chart(question["id"], e)
+                results.append(result)
+            return results
+
+    def ensure_local_db(self):
+        """Build the temp SQLite copy and prepare the catalog queries on first use"""
+        with self._local_db_lock:
+            if self.prepared_queries is None:
+                self.conn = self.data_manager.create_temp_sqlite_db()
+                self.prepared_queries = prepare_report_queries(self.data_manager.available_tables)
+
+    def execute_query_for_question(self, question):
+        """Return the precomputed insight for a question, or run its prepared query"""
+        if question["id"] in self.insights:
+            return self.insights[question["id"]].copy()
+        self.ensure_local_db()
+        return execute_prepared_query(self.data_manager, question, self.prepared_queries[question["id"]])
+
+    
+    def get_gemini_analysis(self, question_text, data, question_id=None):
+        """Get natural language analysis from Gemini with enhanced prompting"""
+        if isinstance(data, pd.DataFrame) and not data.empty:
+            # Convert to JSON format with limit of 10 rows, day counts in whole days so the
+            # sample (and its cache key) stays stable for unchanged data
+            sample = normalize_day_columns(data.head(10))
+            data_json = sample.to_json(orient="records")
+            
+            # The same sample for the same question gets the same answer as last time
+            cache_key = None
+            if question_id is not None:
+                cache_key = self.analysis_cache.question_key(question_id, data_json)
+                cached = self.analysis_cache.get(cache_key)
+                if cached is not None:
+                    return cached
+            
+            # Define the enhanced prompt for Gemini
+            prompt = f"""
+            # Business Intelligence Analysis
+            
+            ## Context
+            As a senior business analytics expert, analyze retail inventory and sales data to answer:
+            
+            **Question:** "{question_text}"
+            
+            ## Data Sample (up to 10 rows):
+            ```json
+            {data_json}
+            ```
+            
+            ## Analysis Task
+            Please provide:
+            
+            ### Executive Summary
+            A clear, concise summary of what this data shows (1-2 sentences)
+            
+            ### Key Insights
+            - Identify 2-3 specific metrics or patterns
+            - Highlight any outliers or unusual trends
+            - Note relationships between variables
+            
+            ### Business Implications
+            - What these findings mean for the business
+            - Potential opportunities or risks
+            - How this impacts inventory or sales strategy
+            
+            ### Actionable Recommendations
+            - 2-3 specific, data-driven recommendations
+            - Prioritize actions by potential business impact
+            - Include timeframes for implementation when relevant
+            
+            ## Output Format
+            - Use Markdown with consistent heading hierarchy
+            - Include bullet points for lists
+            - Bold important metrics and conclusions
+            - Keep analysis under 250 words
+            - Focus on business value, not technical details
+            
+            ## Tone Guidelines
+            Professional but conversational, suitable for retail business executives.
+            Always include specific numbers from the data to support your points.
+            """
+            
+            try:
+                analysis = generate_text(prompt)
+                if cache_key:
+                    self.analysis_cache.put(cache_key, "question", analysis)
+                return analysis
+            except Exception as e:
+                print(f"Error getting analysis from Gemini: {str(e)}")
+                self.llm_failures.append(question_text)
+                return f"*Error getting AI analysis: {str(e)}*\n\nThe data shows {len(data)} records with columns: {', '.join(data.columns)}."
+        else:
+            return "*No data available for analysis.*"
+    
+    def get_executive_summary(self, all_analyses):
+        """Generate an executive summary based on all the analyses"""
+        # Unchanged analyses produce the same summary; only ask Gemini when they differ
+        cache_key = self.analysis_cache.summary_key(all_analyses)
+        cached = self.analysis_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        # Combine all analyses
+        combined_analyses = "\n\n---\n\n".join(all_analyses)
+        
+        # Define the enhanced prompt for Gemini
+        prompt = f"""
+        # Executive Summary Request for Retail Inventory Business
+        
+        ## Context
+        As the Chief Analytics Officer preparing a concise, high-impact executive summary based on 11 key inventory and sales analyses.
+        
+        ## Source Analyses
+        Here are the individual analyses from our business questions:
+        
+        {combined_analyses}
+        
+        ## Executive Summary Requirements
+        Create a professional executive summary with these sections:
+        
+        ### 1. Executive Overview (1-2 paragraphs)
+        - Current business performance status
+        - Most critical metrics and their trends
+        - Overall inventory health assessment
+        
+        ### 2. Key Strategic Insights (3-5 bullets)
+        - Identify patterns across multiple analyses
+        - Highlight revenue opportunities and inventory risks
+        - Emphasize connections between different metrics
+        
+        ### 3. Performance Assessment
+        - Which categories/products are over/underperforming
+        - Inventory efficiency metrics
+        - Sales velocity insights
+        
+        ### 4. Strategic Recommendations (3-5 points)
+        - Specific, actionable recommendations
+        - Clear business outcomes expected
+        - Timelines for implementation where appropriate
+        
+        ### 5. Immediate Action Items (2-3 bullets)
+        - Highest priority tasks
+        - Who should take action
+        - Expected timeline (next 7-14 days)
+        
+        ## Formatting Requirements
+        - Use high-impact business language
+        - Include specific numbers and percentages
+        - Use bold for key metrics
+        - Include relevant emojis (📊 📈 📉 ⚠️ 💰 🔍) 
+        - Keep to 500 words maximum
+        
+        ## Style Guidelines
+        Write as a strategic advisor speaking to the CEO and board. Balance opportunity with risk management. 
+        Focus on revenue growth, inventory optimization, and operational efficiency. 
+        Emphasize how data insights can translate into better business decisions.
+        Include current date: 2025-06-12
+        """
+        
+        try:
+            executive_summary = generate_text(prompt)
+            self.analysis_cache.put(cache_key, "summary", executive_summary)
+            return executive_summary
+        except Exception as e:
+            print(f"Error getting executive summary from Gemini: {str(e)}")
+            self.llm_failures.append("executive_summary")
+            return f"*Error generating executive summary: {str(e)}*\n\nPlease review the individual analyses for insights."
+    
+    def markdown_to_reportlab(self, md_text):
+        """Convert markdown text to ReportLab elements for PDF generation"""
+        # Convert markdown to HTML
+        html = markdown(md_text)
+        
+        # Parse HTML
+        soup = BeautifulSoup(html, 'html.parser')
+        
+        # Get styles
+        styles = getSampleStyleSheet()
+        
+        # Create custom styles with different names to avoid conflicts
+        custom_heading1 = ParagraphStyle(
+            'CustomHeading1',
+            fontName='Helvetica-Bold',
+            fontSize=16,
+            textColor=HexColor(BRAND_COLORS['primary']),
+            spaceAfter=12,
+            leading=20,
+            spaceBefore=6
+        )
+        
+        custom_heading2 = ParagraphStyle(
+            'CustomHeading2',
+            fontName='Helvetica-Bold',
+            fontSize=14,
+            textColor=HexColor(BRAND_COLORS['primary']),
+            spaceAfter=10,
+            spaceBefore=6,
+            leading=18
+        )
+        
+        custom_heading3 = ParagraphStyle(
+            'CustomHeading3',
+            fontName='Helvetica-Bold',
+            fontSize=12,
+            textColor=HexColor(BRAND_COLORS['secondary']),
+            spaceAfter=8,
+            spaceBefore=4,
+            leading=16
+        )
+        
+        custom_bullet = ParagraphStyle(
+            'CustomBullet',
+            fontName='Helvetica',
+            fontSize=10,
+            leftIndent=20,
+            bulletIndent=10,
+            spaceBefore=2,
+            spaceAfter=2,
+            leading=14
+        )
+        
+        normal_style = ParagraphStyle(
+            'CustomNormal',
+            parent=styles['Normal'],
+            fontSize=10,
+            leading=14,
+            spaceBefore=4,
+            spaceAfter=4
+        )
+        
+        # Process HTML and create elements
+        elements = []
+        
+        in_list = False
+        list_items = []
+        list_type = None
+        
+        for tag in soup.find_all(['h1', 'h2', 'h3', 'p', 'ul', 'ol', 'li', 'hr', 'blockquote']):
+            if in_list and tag.name != 'li':
+                # End of a list, process the accumulated list items
+                if list_type == 'ul':
+                    for item in list_items:
+                        bullet_text = '• ' + item
+                        elements.append(Paragraph(bullet_text, custom_bullet))
+                elif list_type == 'ol':
+                    for i, item in enumerate(list_items):
+                        numbered_text = f"{i+1}. {item}"
+                        elements.append(Paragraph(numbered_text, custom_bullet))
+                in_list = False
+                list_items = []
+                list_type = None
+                
+            if tag.name == 'h1':
+                elements.append(Paragraph(tag.text, custom_heading1))
+            elif tag.name == 'h2':
+                elements.append(Paragraph(tag.text, custom_heading2))
+            elif tag.name == 'h3':
+                elements.append(Paragraph(tag.text, custom_heading3))
+            elif tag.name == 'p':
+                # Handle rich text in paragraphs (bold, italics, etc.)
+                para_content = str(tag)
+                para_content = para_content.replace('<p>', '').replace('</p>', '')
+                para_content = para_content.replace('<strong>', '<b>').replace('</strong>', '</b>')
+                para_content = para_content.replace('<em>', '<i>').replace('</em>', '</i>')
+                elements.append(Paragraph(para_content, normal_style))
+            elif tag.name == 'ul':
+                in_list = True
+                list_type = 'ul'
+                list_items = []
+            elif tag.name == 'ol':
+                in_list = True
+                list_type = 'ol'
+                list_items = []
+            elif tag.name == 'li':
+                # Process li content to handle nested tags
+                li_content = str(tag)
+                li_content = li_content.replace('<li>', '').replace('</li>', '')
+                li_content = li_content.replace('<strong>', '<b>').replace('</strong>', '</b>')
+                li_content = li_content.replace('<em>', '<i>').replace('</em>', '</i>')
+                
+                # Strip HTML tags but keep formatting tags
+                soup_li = BeautifulSoup(li_content, 'html.parser')
+                text = soup_li.get_text()
+                if '<b>' in li_content:
+                    # Put back bold formatting
+                    for bold in soup_li.find_all(['strong', 'b']):
+                        text = text.replace(bold.text, f"<b>{bold.text}</b>")
+                if '<i>' in li_content:
+                    # Put back italic formatting
+                    for italic in soup_li.find_all(['em', 'i']):
+                        text = text.replace(italic.text, f"<i>{italic.text}</i>")
+                
+                list_items.append(text)
+                
+            elif tag.name == 'hr':
+                elements.append(HRFlowable(
+                    width='100%',
+                    thickness=1,
+                    color=HexColor(BRAND_COLORS['neutral']),
+                    spaceBefore=6,
+                    spaceAfter=6)
+                )
+            elif tag.name == 'blockquote':
+                # Create a styled blockquote
+                blockquote_style = ParagraphStyle(
+                    'BlockQuote',
+                    parent=normal_style,
+                    leftIndent=30,
+                    rightIndent=30,
+                    spaceBefore=6,
+                    spaceAfter=6,
+                    borderWidth=1,
+                    borderColor=HexColor(BRAND_COLORS['neutral']),
+                    borderPadding=5,
+                    backColor=HexColor(BRAND_COLORS['neutral'])
+                )
+                blockquote_content = str(tag)
+                blockquote_content = blockquote_content.replace('<blockquote>', '').replace('</blockquote>', '')
+                elements.append(Paragraph(blockquote_content, blockquote_style))
+        
+        # If we were processing a list and reached the end of the document
+        if in_list:
+            if list_type == 'ul':
+                for item in list_items:
+                    bullet_text = '• ' + item
+                    elements.append(Paragraph(bullet_text, custom_bullet))
+            elif list_type == 'ol':
+                for i, item in enumerate(list_items):
+                    numbered_text = f"{i+1}. {item}"
+                    elements.append(Paragraph(numbered_text, custom_bullet))
+        
+        return elements
+    
+    def create_metrics_table(self, data_dict):
+        """Create a table displaying key metrics"""
+        if not data_dict:
+            return None
+        
+        # Table data structure
+        table_data = [
+            # Headers row - the metric names
+            list(data_dict.keys()),
+            # Values row
+            []
+        ]
+        
+        # Create the values row
+        for key, value in data_dict.items():
+            if isinstance(value, dict):
+                main_value = value.get('value', 'N/A')
+                table_data[1].append(str(main_value))
+            else:
+                table_data[1].append(str(value))
+        
+        # Calculate column widths - distribute evenly
+        page_width = 450  # A4 width minus margins
+        col_widths = [page_width/len(data_dict)] * len(data_dict)
+        
+        # Create and style the metrics table
+        metrics_table = Table(table_data, colWidths=col_widths)
+        
+        # Style the table for a modern look
+        table_style = TableStyle([
+            # Headers styling
+            ('BACKGROUND', (0, 0), (-1, 0), HexColor(BRAND_COLORS['primary'])),
+            ('TEXTCOLOR', (0, 0), (-1, 0), HexColor(BRAND_COLORS['light_text'])),
+            ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 10),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
+            ('TOPPADDING', (0, 0), (-1, 0), 8),
+            # Values styling
+            ('BACKGROUND', (0, 1), (-1, 1), HexColor(BRAND_COLORS['neutral'])),
+            ('TEXTCOLOR', (0, 1), (-1, 1), HexColor(BRAND_COLORS['primary'])),
+            ('ALIGN', (0, 1), (-1, 1), 'CENTER'),
+            ('FONTNAME', (0, 1), (-1, 1), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 1), (-1, 1), 14),
+            ('BOTTOMPADDING', (0, 1), (-1, 1), 12),
+            ('TOPPADDING', (0, 1), (-1, 1), 12),
+            # Overall styling
+            ('GRID', (0, 0), (-1, -1), 1, HexColor(BRAND_COLORS['neutral'])),
+            ('BOX', (0, 0), (-1, -1), 1, HexColor(BRAND_COLORS['primary'])),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ])
+        
+        metrics_table.setStyle(table_style)
+        return metrics_table
+    
+    def create_cover_page(self):
+        """Create a modern, aesthetic cover page for the report"""
+        elements = []
+        
+        # Add Logo
+        logo_path = self.get_logo_path()
+        if os.path.exists(logo_path):
+            elements.append(Image(
+                logo_path, 
+                width=250, 
+                height=100, 
+                hAlign='CENTER'
+            ))
+        
+        elements.append(Spacer(1, 50))
+        
+        # Add decorative element
+        elements.append(HRFlowable(
+            width='70%',
+            thickness=4,
+            color=HexColor(BRAND_COLORS['primary']),
+            hAlign='CENTER',
+            spaceBefore=0,
+            spaceAfter=0
+        ))
+        elements.append(HRFlowable(
+            width='50%',
+            thickness=4,
+            color=HexColor(BRAND_COLORS['secondary']),
+            hAlign='CENTER',
+            spaceBefore=5,
+            spaceAfter=20
+        ))
+        
+        # Add title
+        title_style = ParagraphStyle(
+            'CoverTitle',
+            fontSize=32,
+            fontName='Helvetica-Bold',
+            textColor=HexColor(BRAND_COLORS['primary']),
+            alignment=TA_CENTER,
+            leading=36,
+            spaceBefore=0,
+            spaceAfter=20
+        )
+        elements.append(Paragraph("Business Intelligence<br/>Inventory Report", title_style))
+        
+        # Add current date
+        current_date = datetime.now().strftime("%B %d, %Y")
+        date_style = ParagraphStyle(
+            'CoverDate',
+            fontSize=16,
+            fontName='Helvetica',
+            textColor=HexColor(BRAND_COLORS['secondary']),
+            alignment=TA_CENTER,
+            leading=20
+        )
+        elements.append(Paragraph(f"Generated on {current_date}", date_style))
+        if self.data_version:
+            elements.append(Paragraph(f"Data version {self.data_version}", ParagraphStyle(
+                'CoverDataVersion',
+                parent=date_style,
+                fontSize=10,
+                leading=14
+            )))
+        
+        # Add decorative element
+        elements.append(Spacer(1, 50))
+        elements.append(HRFlowable(
+            width='50%',
+            thickness=2,
+            color=HexColor(BRAND_COLORS['secondary']),
+            hAlign='CENTER',
+            spaceBefore=0,
+            spaceAfter=5
+        ))
+        elements.append(HRFlowable(
+            width='70%',
+            thickness=2,
+            color=HexColor(BRAND_COLORS['primary']),
+            hAlign='CENTER',
+            spaceBefore=0,
+            spaceAfter=40
+        ))
+        
+        # Add company information
+        company_info_style = ParagraphStyle(
+            'CompanyInfo',
+            fontSize=12,
+            fontName='Helvetica-Bold',
+            textColor=HexColor(BRAND_COLORS['dark_text']),
+            alignment=TA_CENTER,
+            leading=16
+        )
+        elements.append(Paragraph("InventorySync Business Intelligence", company_info_style))
+        
+        user_info_style = ParagraphStyle(
+            'UserInfo',
+            fontSize=10,
+            fontName='Helvetica',
+            textColor=HexColor(BRAND_COLORS['primary']),
+            alignment=TA_CENTER,
+            leading=12
+        )
+        elements.append(Paragraph("Prepared for: Executive Management<br/>Generated by: Tanman", user_info_style))
+        
+        # Add decorative bottom element
+        elements.append(Spacer(1, 80))
+        elements.append(HRFlowable(
+            width='100%',
+            thickness=15,
+            color=HexColor(BRAND_COLORS['primary']),
+            hAlign='CENTER',
+            spaceBefore=0,
+            spaceAfter=0
+        ))
+        
+        # Add page break
+        elements.append(PageBreak())
+        
+        return elements
+    
+    def create_table_of_contents(self):
+        """Create a modern table of contents page"""
+        elements = []
+        
+        # Add TOC heading
+        toc_title_style = ParagraphStyle(
+            'TOCTitle',
+            fontSize=20,
+            fontName='Helvetica-Bold',
+            textColor=HexColor(BRAND_COLORS['primary']),
+            spaceAfter=20,
+            spaceBefore=10
+        )
+        elements.append(Paragraph("Table of Contents", toc_title_style))
+        elements.append(Spacer(1, 10))
+        
+        # Add decorative element
+        elements.append(HRFlowable(
+            width='100%',
+            thickness=2,
+            color=HexColor(BRAND_COLORS['primary']),
+            spaceBefore=0,
+            spaceAfter=20
+        ))
+        
+        # Create table of contents
+        toc_data = []
+        for i, q in enumerate(self.questions, 1):
+            question_text = q["question"].strip()
+            # Truncate long questions
+            if len(question_text) > 60:
+                question_text = question_text[:57] + "..."
+            toc_data.append([str(i), question_text, str(i+2)])  # +2 for cover page and TOC
+            
+        # Supplementary table pages follow the questions
+        for i, section in enumerate(self.supplementary_sections, len(self.questions) + 1):
+            toc_data.append([str(i), section["title"], str(i + 2)])
+
+        # Add the Executive Summary entry at the end
+        summary_number = len(self.questions) + len(self.supplementary_sections) + 1
+        toc_data.append([str(summary_number), "Executive Summary", str(summary_number + 2)])
+            
+        # Define a simpler table style without the problematic commands
+        toc_style = TableStyle([
+            # Basic styling
+            ('BACKGROUND', (0, 0), (0, -1), HexColor(BRAND_COLORS['primary'])),        # Number column
+            ('TEXTCOLOR', (0, 0), (0, -1), HexColor(BRAND_COLORS['light_text'])),
+            ('ALIGNMENT', (0, 0), (0, -1), 'CENTER'),
+            ('ALIGNMENT', (2, 0), (2, -1), 'CENTER'),
+            # Fonts
+            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+            ('FONTNAME', (2, 0), (2, -1), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+            ('TOPPADDING', (0, 0), (-1, -1), 8),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+            # Borders
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.lightgrey),
+            ('BOX', (0, 0), (-1, -1), 1, HexColor(BRAND_COLORS['primary'])),
+            # Executive Summary row
+            ('BACKGROUND', (0, -1), (-1, -1), HexColor(BRAND_COLORS['secondary'] + '40')),
+            ('FONTNAME', (1, -1), (1, -1), 'Helvetica-Bold'),
+            ('TEXTCOLOR', (1, -1), (1, -1), HexColor(BRAND_COLORS['secondary'])),
+        ])
+        
+        # Create the table with appropriate column widths
+        toc_table = Table(toc_data, colWidths=[25, 400, 25])
+        toc_table.setStyle(toc_style)
+        elements.append(toc_table)
+        
+        # Add company information at the bottom of TOC page
+        elements.append(Spacer(1, 40))
+        company_info_style = ParagraphStyle(
+            'CompanyInfo',
+            fontSize=9,
+            textColor=HexColor(BRAND_COLORS['dark_text']),
+            alignment=TA_CENTER
+        )
+        elements.append(Paragraph(
+            "InventorySync Business Intelligence Platform<br/>"
+            "Confidential Business Document | © 2025 InventorySync", 
+            company_info_style
+        ))
+        
+        # Add page break
+        elements.append(PageBreak())
+        
+        return elements
+    
+    def get_forecast_section(self):
+        """Top SKUs by projected demand, or None when forecasts are unavailable"""
+        try:
+            forecasts, _ = get_forecasts()
+        except Exception as e:
+            print(f"Demand forecast unavailable: {str(e)}")
+            return None
+        if forecasts.empty:
+            return None
+
+        top = forecasts[forecasts["method"] != "no_demand"].nlargest(15, "forecast_4_weeks")
+        method_counts = forecasts["method"].value_counts().to_dict()
+        summary = (
+            f"Projected demand over the next 4 weeks is {forecasts['forecast_4_weeks'].sum():,.0f} units "
+            f"across {len(forecasts):,} SKUs ({method_counts.get('croston', 0):,} with intermittent demand). "
+            "Highest projected demand: " + "; ".join(
+                f"{row.brand} {row.category} {row.size} {row.color}: {row.forecast_4_weeks:g}"
+                for row in top.head(5).itertuples()
+            )
+        )
+        return {
+            "title": "Demand Forecast (Next 4 Weeks)",
+            "description": (
+                "Weekly demand per SKU projected from its monthly sales history in the database. "
+                "Simple exponential smoothing is used for regular sellers and Croston's method for "
+                "items that sell intermittently."
+            ),
+            "columns": {
+                "brand": "Brand", "category": "Category", "size": "Size", "color": "Color",
+                "method": "Method", "weekly_forecast": "Per Week", "forecast_4_weeks": "Next 4 Weeks",
+            },
+            "data": top,
+            "summary": summary,
+        }
+
+    def get_replenishment_sections(self):
+        """Reorder and overstock pages from the replenishment plan for the whole catalog"""
+        try:
+            plan, _ = get_replenishment()
+        except Exception as e:
+            print(f"Replenishment plan unavailable: {str(e)}")
+            return []
+        if plan.empty:
+            return []
+
+        sku_columns = {"brand": "Brand", "category": "Category", "size": "Size", "color": "Color"}
+        reorder = plan[plan["action"] == "reorder"]
+        overstock = plan[plan["action"].isin(["overstock", "no_demand"])]
+        sections = []
+        if not reorder.empty:
+            top = reorder.nlargest(15, "order_qty")
+            sections.append({
+                "title": "Replenishment: Items to Reorder",
+                "description": (
+                    f"{len(reorder):,} SKUs are at or below their reorder point "
+                    f"(lead time {REPLENISHMENT_LEAD_TIME_DAYS:g} days, service level {REPLENISHMENT_SERVICE_LEVEL:.0%}). "
+                    "Order quantities cover the lead time, safety stock and the next review period."
+                ),
+                "columns": {**sku_columns, "inventory": "In Stock", "reorder_point": "Reorder Point",
+                            "order_qty": "Order Qty"},
+                "data": top,
+                "summary": (
+                    f"{len(reorder):,} SKUs need reordering, {reorder['order_qty'].sum():,.0f} units in total. "
+                    "Largest orders: " + "; ".join(
+                        f"{row.brand} {row.category} {row.size} {row.color}: {row.order_qty:g}"
+                        for row in top.head(5).itertuples()
+                    )
+                ),
+            })
+        if not overstock.empty:
+            top = overstock.nlargest(15, "excess_value")
+            sections.append({
+                "title": "Replenishment: Overstocked Items",
+                "description": (
+                    f"{len(overstock):,} SKUs hold more than {OVERSTOCK_DAYS:g} days of demand plus safety stock, "
+                    "or stock that is not selling at all. Candidates for markdowns, online push or vendor returns."
+                ),
+                "columns": {**sku_columns, "inventory": "In Stock", "excess_qty": "Excess Qty",
+                            "excess_value": "Excess Value (Rs)"},
+                "data": top,
+                "summary": (
+                    f"{len(overstock):,} SKUs are overstocked, tying up Rs {overstock['excess_value'].sum():,.0f} "
+                    "in excess inventory."
+                ),
+            })
+        return sections
+
+    def get_abc_section(self):
+        """Pareto (ABC) split of the catalog over the whole history, or None when not computed yet"""
+        try:
+            summary, top = get_abc_summary()
+        except Exception as e:
+            print(f"ABC classification unavailable: {str(e)}")
+            return None
+        if summary.empty:
+            return None
+
+        total_skus = summary["skus"].sum()
+        total_sales = summary["sales_qty"].sum()
+        shares = "; ".join(
+            f"class {row.abc_class}: {row.skus:,} SKUs ({row.skus * 100.0 / total_skus:.1f}%) "
+            f"with {(row.sales_qty * 100.0 / total_sales) if total_sales else 0:.1f}% of sales"
+            for row in summary.itertuples()
+        )
+        top = top.copy()
+        top["cumulative_share"] = (top["cumulative_share"] * 100).round(1)
+        return {
+            "title": "ABC Classification (Pareto)",
+            "description": (
+                f"SKUs ranked by total units sold. Class A covers the first {ABC_A_SHARE:.0%} of sales, "
+                f"class B the next {ABC_B_SHARE - ABC_A_SHARE:.0%} and class C the remainder. {shares}."
+            ),
+            "columns": {
+                "brand": "Brand", "category": "Category", "size": "Size", "color": "Color",
+                "sales_qty": "Units Sold", "cumulative_share": "Cumulative %",
+            },
+            "data": top,
+            "summary": f"ABC classification across {total_skus:,} SKUs: {shares}.",
+        }
+
+    def get_supplementary_sections(self):
+        """Table pages added after the question pages and before the executive summary"""
+        sections = [self.get_forecast_section(), *self.get_replenishment_sections(), self.get_abc_section()]
+        return [section for section in sections if section is not None]
+
+    def create_data_section(self, section):
+        """Render a supplementary section as a titled page with a data table"""
+        elements = []
+        elements.append(Paragraph(section["title"], ParagraphStyle(
+            'SectionHeader',
+            fontSize=18,
+            fontName='Helvetica-Bold',
+            textColor=HexColor(BRAND_COLORS['dark_text']),
+            alignment=TA_LEFT,
+            leading=22,
+            spaceBefore=10,
+            spaceAfter=10
+        )))
+        elements.append(HRFlowable(
+            width='100%',
+            thickness=1,
+            color=HexColor(BRAND_COLORS['primary']),
+            spaceBefore=2,
+            spaceAfter=10
+        ))
+        elements.append(Paragraph(section["description"], ParagraphStyle(
+            'SectionDescription',
+            fontSize=10,
+            fontName='Helvetica',
+            textColor=HexColor(BRAND_COLORS['dark_text']),
+            spaceAfter=12
+        )))
+
+        columns = section["columns"]
+        cell_style = ParagraphStyle('SectionCell', fontSize=8, fontName='Helvetica', leading=10)
+        table_data = [list(columns.values())]
+        for record in section["data"][list(columns)].itertuples(index=False):
+            table_data.append([Paragraph(str(value), cell_style) for value in record])
+
+        table = Table(table_data, colWidths=[450 / len(columns)] * len(columns), repeatRows=1)
+        table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), HexColor(BRAND_COLORS['primary'])),
+            ('TEXTCOLOR', (0, 0), (-1, 0), HexColor(BRAND_COLORS['light_text'])),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 9),
+            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, HexColor(BRAND_COLORS['neutral'])]),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.lightgrey),
+            ('BOX', (0, 0), (-1, -1), 1, HexColor(BRAND_COLORS['primary'])),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ]))
+        elements.append(table)
+        elements.append(Spacer(1, 20))
+        elements.append(Paragraph(
+            f"Generated: {datetime.now().strftime('%Y-%m-%d')} | Tanman{self.version_label()}",
+            ParagraphStyle(
+                'SectionPageInfo',
+                fontSize=8,
+                fontName='Helvetica',
+                textColor=HexColor(BRAND_COLORS['dark_text']),
+                alignment=TA_RIGHT
+            )
+        ))
+        elements.append(PageBreak())
+        return elements
+
+    def version_label(self):
+        """Footer suffix identifying the dataset version the report was built from"""
+        return f" | Data version {self.data_version}" if self.data_version else ""
+    
+    def create_pdf_report(self, filename="business_report.pdf"):
+        """Create a PDF report with all analyses"""
+        # Archive old report if it exists
+        if os.path.exists(os.path.join(REPORT_DIR, filename)):
+            archive_path = os.path.join(ARCHIVED_REPORTS_DIR, f"{datetime.now().strftime('%Y%m%d%H%M%S')}_{filename}")
+            try:
+                import shutil
+                shutil.copy2(os.path.join(REPORT_DIR, filename), archive_path)
+                print(f"Archived previous report to {archive_path}")
+            except Exception as e:
+                print(f"Error archiving previous report: {str(e)}")
+        
+        # Prepare document with custom page template for headers and footers
+        report_path = os.path.join(REPORT_DIR, filename)
+        doc = SimpleDocTemplate(
+            report_path,
+            pagesize=A4,
+            rightMargin=72,
+            leftMargin=72,
+            topMargin=72,
+            bottomMargin=72,
+        )
+        
+        # Document elements
+        elements = []
+        
+        # Add cover page
+        elements.extend(self.create_cover_page())
+        
+        # Add table of contents
+        self.supplementary_sections = self.get_supplementary_sections()
+        elements.extend(self.create_table_of_contents())
+        
+        # Initialize list to store all analyses for executive summary
+        all_analyses = []
+        
+        # Queries, charts and Gemini analyses run concurrently; the PDF is assembled in order
+        question_results = self.run_question_pipeline()
+        
+        # Process each question - one per page
+        for question, result in zip(self.questions, question_results):
+            question_id = question["id"]
+            question_text = question["question"]
+            
+            # Add question header with clean styling (no colored background)
+            header_style = ParagraphStyle(
+                'QuestionHeader',
+                fontSize=18,
+                fontName='Helvetica-Bold',
+                textColor=HexColor(BRAND_COLORS['dark_text']),  # Change to dark text color
+                alignment=TA_LEFT,  # Left align the header 
+                leading=22,
+                spaceBefore=10,
+                spaceAfter=10
+            )
+            
+            # Add the question header directly (no background)
+            elements.append(Paragraph(f"Question {question_id}: {question_text}", header_style))
+            
+            # Add a subtle horizontal line below the header
+            elements.append(HRFlowable(
+                width='100%',
+                thickness=1,
+                color=HexColor(BRAND_COLORS['primary']),
+                spaceBefore=2,
+                spaceAfter=10
+            ))
+            
+            data = result["data"]
+            
+            if data is None:
+                elements.append(Paragraph(
+                    "No data available for this question. Please check the data sources or refine the query.",
+                    ParagraphStyle(
+                        'NoData',
+                        fontSize=11,
+                        fontName='Helvetica',
+                        textColor=HexColor(BRAND_COLORS['secondary']),
+                        spaceBefore=10,
+                        spaceAfter=10
+                    )
+                ))
+                all_analyses.append(f"Question {question_id}: {question_text}\n\nNo data available.")
+            else:
+                metrics_dict = result["metrics"]
+                
+                # Add metrics dashboard if we have metrics
+                if metrics_dict:
+                    metrics_table = self.create_metrics_table(metrics_dict)
+                    if metrics_table:
+                        elements.append(metrics_table)
+                        elements.append(Spacer(1, 15))
+                
+                analysis = result["analysis"]
+                all_analyses.append(f"Question {question_id}: {question_text}\n\n{analysis}")
+                
+                # Add visualization first
+                try:
+                    visual_buffer = BytesIO(result["chart"])
+                    img = Image(visual_buffer, width=450, height=225)
+                    
+                    # Add a border around the image
+                    img_with_border = Table([[img]], 
+                                        colWidths=[460], 
+                                        rowHeights=[235],
+                                        style=[
+                                            ('BOX', (0, 0), (-1, -1), 1, HexColor(BRAND_COLORS['primary'])),
+                                            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+                                            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+                                            ('BACKGROUND', (0, 0), (-1, -1), HexColor(BRAND_COLORS['neutral']+'20'))
+                                        ])
+                    elements.append(img_with_border)
+                except Exception as e:
+                    print(f"Error adding visualization for question {question_id}: {str(e)}")
+                    elements.append(Paragraph(
+                        f"Error generating visualization: {str(e)}", 
+                        ParagraphStyle(
+                            'ErrorText',
+                            textColor=HexColor(BRAND_COLORS['negative']),
+                            fontSize=9,
+                            fontName='Helvetica'
+                        )
+                    ))
+                
+                # Add analysis text
+                elements.append(Spacer(1, 15))
+                elements.append(HRFlowable(
+                    width='30%',
+                    thickness=3,
+                    color=HexColor(BRAND_COLORS['secondary']),
+                    spaceBefore=0,
+                    spaceAfter=5
+                ))
+                
+                analysis_header = ParagraphStyle(
+                    'AnalysisHeader', 
+                    fontSize=14, 
+                    fontName='Helvetica-Bold',
+                    textColor=HexColor(BRAND_COLORS['secondary']),
+                    spaceBefore=0,
+                    spaceAfter=10
+                )
+                elements.append(Paragraph("Analysis & Recommendations", analysis_header))
+                
+                analysis_elements = self.markdown_to_reportlab(analysis)
+                for element in analysis_elements:
+                    elements.append(element)
+            
+            # Add page footer
+            elements.append(Spacer(1, 20))
+            page_info_style = ParagraphStyle(
+                'PageInfo',
+                fontSize=8,
+                fontName='Helvetica',
+                textColor=HexColor(BRAND_COLORS['dark_text']),
+                alignment=TA_RIGHT
+            )
+            elements.append(Paragraph(
+                f"Generated: {datetime.now().strftime('%Y-%m-%d')} | Tanman{self.version_label()}", 
+                page_info_style
+            ))
+            
+            # Add page break after each question
+            elements.append(PageBreak())
+        
+        for section in self.supplementary_sections:
+            elements.extend(self.create_data_section(section))
+            all_analyses.append(f"{section['title']}\n\n{section['summary']}")
+        
+        # Generate Executive Summary
+        self.report_progress("executive_summary")
+        executive_summary = self.get_executive_summary(all_analyses)
+        self.report_progress("pdf", step_done=True)
+        
+        # Add executive summary page header - using similar clean style as questions
+        exec_summary_title = ParagraphStyle(
+            'ExecutiveSummaryTitle',
+            fontSize=22,
+            fontName='Helvetica-Bold',
+            textColor=HexColor(BRAND_COLORS['dark_text']),
+            alignment=TA_LEFT,
+            leading=26,
+            spaceBefore=10,
+            spaceAfter=5
+        )
+        elements.append(Paragraph("Executive Summary", exec_summary_title))
+        
+        # Add decorative element
+        elements.append(HRFlowable(
+            width='100%', 
+            thickness=2, 
+            color=HexColor(BRAND_COLORS['secondary']), 
+            spaceBefore=2, 
+            spaceAfter=15
+        ))
+        
+        # Add executive summary content
+        summary_elements = self.markdown_to_reportlab(executive_summary)
+        for element in summary_elements:
+            elements.append(element)
+        
+        # Add footer to executive summary page
+        elements.append(Spacer(1, 20))
+        elements.append(HRFlowable(
+            width='100%',
+            thickness=1,
+            color=HexColor(BRAND_COLORS['secondary']),
+            spaceBefore=5,
+            spaceAfter=5
+        ))
+        
+        elements.append(Paragraph(
+            f"InventorySync Business Intelligence | {datetime.now().strftime('%Y-%m-%d')}{self.version_label()}", 
+            page_info_style
+        ))
+        
+        # Build the PDF document with custom canvas for headers/footers
+        doc.build(
+            elements,
+            canvasmaker=PageTemplate
+        )
+        
+        self.report_progress("completed", step_done=True)
+        print(f"Report generated and saved to {report_path}")
+        return report_path
+    
+    def generate_report(self, filename="business_report.pdf"):
+        """Main function to generate the report"""
+        try:
+            # Generate the PDF report
+            report_path = self.create_pdf_report(filename)
+            
+            # Clean up resources
+            self.data_manager.cleanup()
+            
+            return report_path
+        except Exception as e:
+            print(f"Error generating report: {str(e)}")
+            import traceback
+            traceback.print_exc()
+            return None
@@ -0,0 +1,301 @@
+# report_jobs.py - Background report generation jobs with progress tracking
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from flask import Blueprint, request, jsonify
+from dotenv import load_dotenv
+from report import get_or_build_report, send_report_email
+
+# Load environment variables
+load_dotenv()
+
+# Blueprint setup for Flask
+report_jobs_bp = Blueprint('report_jobs', __name__)
+
+# Reports built concurrently in each process; further jobs wait in the queue
+REPORT_JOB_WORKERS = int(os.getenv("REPORT_JOB_WORKERS", "2"))
+# Jobs accepted but not yet finished, across all processes, before new requests are rejected
+REPORT_JOB_MAX_PENDING = int(os.getenv("REPORT_JOB_MAX_PENDING", "20"))
+# How long finished jobs stay queryable
+REPORT_JOB_TTL_SECONDS = int(os.getenv("REPORT_JOB_TTL_SECONDS", "3600"))
+# Job state shared by every worker process, so any of them can answer a status poll
+REPORT_JOBS_DB = os.getenv("REPORT_JOBS_DB", os.path.join("processed_data", "report_jobs.db"))
+# Unfinished jobs whose process stopped sending heartbeats for this long are marked failed
+REPORT_JOB_STALE_SECONDS = float(os.getenv("REPORT_JOB_STALE_SECONDS", "120"))
+
+REPORT_JOBS_SCHEMA = '''
+    PRAGMA journal_mode=WAL;
+    CREATE TABLE IF NOT EXISTS report_jobs (
+        job_id TEXT PRIMARY KEY,
+        dedup_key TEXT NOT NULL,
+        status TEXT NOT NULL,
+        stage TEXT NOT NULL,
+        percent INTEGER NOT NULL DEFAULT 0,
+        questions TEXT NOT NULL DEFAULT '{}',
+        recipients TEXT NOT NULL,
+        created_at TEXT NOT NULL,
+        updated_at TEXT NOT NULL,
+        heartbeat REAL NOT NULL,
+        finished_at REAL,
+        message TEXT,
+        report_path TEXT,
+        data_version TEXT,
+        download_url TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_report_jobs_active ON report_jobs(status, dedup_key);
+'''
+JOB_FIELDS = ("status", "stage", "percent", "questions", "message", "report_path", "data_version",
+              "download_url", "finished_at")
+
+
+class ReportQueueFullError(Exception):
+    """Raised when too many report jobs are already waiting"""
+
+
+class ReportJobQueue:
+    """Runs report jobs on a bounded worker pool in this process.
+
+    Job state lives in a SQLite table shared by all worker processes, so any of them can
+    serve status polls, and deduplication and the pending limit hold across processes.
+    Each process heartbeats the jobs it runs; jobs of a process that died are marked failed.
+    """
+
+    def __init__(self, max_workers=REPORT_JOB_WORKERS, max_pending=REPORT_JOB_MAX_PENDING, db_path=REPORT_JOBS_DB):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="report-job")
+        self.max_pending = max_pending
+        self.db_path = db_path
+        self.schema_ready = False
+        self.questions = {}  # job_id -> {question_id: stage} for jobs queued or running here
+        self.lock = threading.Lock()
+        self.heartbeat_thread = None
+
+    def _connect(self):
+        """Autocommit connection; submit opens its own transaction"""
+        if not self.schema_ready:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        if not self.schema_ready:
+            conn.executescript(REPORT_JOBS_SCHEMA)
+            self.schema_ready = True
+        return conn
+
+    def submit(self, recipients):
+        """Queue a report for the recipients; returns (job, deduplicated)"""
+        key = json.dumps(sorted({r.lower() for r in recipients}))
+        conn = self._connect()
+        try:
+            # Serializes submits across processes, so two workers never start the same report
+            conn.execute("BEGIN IMMEDIATE")
+            self._expire(conn)
+            existing = conn.execute(
+                "SELECT * FROM report_jobs WHERE dedup_key = ? AND status IN ('queued', 'running') "
+                "ORDER BY created_at LIMIT 1", (key,)
+            ).fetchone()
+            if existing is not None:
+                conn.execute("COMMIT")
+                return self._to_job(existing), True
+            active = conn.execute("SELECT COUNT(*) FROM report_jobs WHERE status IN ('queued', 'running')").fetchone()[0]
+            if active >= self.max_pending:
+                raise ReportQueueFullError("Too many reports are already being generated. Please try again shortly.")
+
+            job_id = uuid.uuid4().hex
+            now = datetime.now().isoformat()
+            conn.execute('''
+                INSERT INTO report_jobs (job_id, dedup_key, status, stage, recipients, created_at, updated_at,
+                                         heartbeat, message)
+                VALUES (?, ?, 'queued', 'queued', ?, ?, ?, ?, 'Waiting for a free report worker')
+            ''', (job_id, key, json.dumps(list(recipients)), now, now, time.time()))
+            job = self._to_job(conn.execute("SELECT * FROM report_jobs WHERE job_id = ?", (job_id,)).fetchone())
+            conn.execute("COMMIT")
+        finally:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            conn.close()
+
+        with self.lock:
+            self.questions[job_id] = {}
+            self._ensure_heartbeat()
+        self.executor.submit(self._run, job_id, list(recipients))
+        return job, False
+
+    def get(self, job_id):
+        conn = self._connect()
+        try:
+            self._expire(conn)
+            row = conn.execute("SELECT * FROM report_jobs WHERE job_id = ?", (job_id,)).fetchone()
+            return self._to_job(row) if row is not None else None
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _to_job(row):
+        job = dict(row)
+        job["questions"] = json.loads(job["questions"])
+        job["recipients"] = json.loads(job["recipients"])
+        job.pop("dedup_key")
+        job.pop("heartbeat")
+        return job
+
+    def _update(self, job_id, **fields):
+        assert set(fields) <= set(JOB_FIELDS)
+        assignments = "".join(f"{name} = ?, " for name in fields)
+        conn = self._connect()
+        try:
+            conn.execute(
+                f"UPDATE report_jobs SET {assignments}updated_at = ?, heartbeat = ? WHERE job_id = ?",
+                (*fields.values(), datetime.now().isoformat(), time.time(), job_id)
+            )
+        finally:
+            conn.close()
+
+    def _on_progress(self, job_id, stage, completed, total, question_id=None):
+        with self.lock:
+            questions = self.questions.setdefault(job_id, {})
+            if question_id is not None:
+                questions[str(question_id)] = stage
+                stage = "questions"
+            questions_json = json.dumps(questions)
+        self._update(
+            job_id,
+            stage=stage,
+            questions=questions_json,
+            percent=int(completed * 100 / total) if total else 0,
+            message=f"{completed} of {total} report steps complete",
+        )
+
+    def _run(self, job_id, recipients):
+        self._update(job_id, status="running", stage="loading_data", message="Loading sales data")
+        try:
+            report_path, data_version = get_or_build_report(
+                progress_callback=lambda *args, **kwargs: self._on_progress(job_id, *args, **kwargs)
+            )
+            if not report_path:
+                self._update(job_id, status="failed", stage="failed", message="Failed to generate report")
+                return
+
+            self._update(job_id, stage="emailing", report_path=report_path, data_version=data_version)
+            try:
+                results = send_report_email(
+                    report_path,
+                    recipients,
+                    subject="InventorySync Report",
+                    message="Your sales report is attached."
+                )
+                failed = [result["recipient"] for result in results if result["status"] != "sent"]
+                if failed:
+                    email_status = f"Report generated, but failed to email {', '.join(failed)}"
+                else:
+                    email_status = "Report generated and emailed successfully"
+            except Exception as e:
+                print(f"Error sending email: {e}")
+                email_status = f"Report generated, but failed to send email: {e}"
+
+            self._update(
+                job_id,
+                status="completed",
+                stage="completed",
+                percent=100,
+                message=email_status,
+                download_url=f"/download-report/{os.path.basename(report_path)}"
+            )
+        except Exception as e:
+            print(f"Error in report job {job_id}: {str(e)}")
+            self._update(job_id, status="failed", stage="failed", message=f"Error generating report: {str(e)}")
+        finally:
+            self._update(job_id, finished_at=time.time())
+            with self.lock:
+                self.questions.pop(job_id, None)
+
+    def _ensure_heartbeat(self):
+        # Caller holds self.lock
+        if self.heartbeat_thread is None or not self.heartbeat_thread.is_alive():
+            self.heartbeat_thread = threading.Thread(target=self._heartbeat_loop, name="report-job-heartbeat", daemon=True)
+            self.heartbeat_thread.start()
+
+    def _heartbeat_loop(self):
+        """Keep this process's queued and running jobs from being taken for abandoned"""
+        while True:
+            time.sleep(REPORT_JOB_STALE_SECONDS / 4)
+            with self.lock:
+                job_ids = list(self.questions)
+                if not job_ids:
+                    self.heartbeat_thread = None
+                    return
+            try:
+                conn = self._connect()
+                try:
+                    conn.execute(
+                        f"UPDATE report_jobs SET heartbeat = ? WHERE job_id IN ({','.join('?' * len(job_ids))})",
+                        (time.time(), *job_ids)
+                    )
+                finally:
+                    conn.close()
+            except sqlite3.Error as e:
+                print(f"Error updating report job heartbeats: {e}")
+
+    @staticmethod
+    def _expire(conn):
+        """Fail jobs whose process died and drop finished jobs past their TTL"""
+        now = time.time()
+        conn.execute('''
+            UPDATE report_jobs
+            SET status = 'failed', stage = 'failed', finished_at = ?,
+                message = 'The server process generating this report stopped. Please try again.'
+            WHERE status IN ('queued', 'running') AND heartbeat < ?
+        ''', (now, now - REPORT_JOB_STALE_SECONDS))
+        conn.execute("DELETE FROM report_jobs WHERE finished_at IS NOT NULL AND finished_at < ?",
+                     (now - REPORT_JOB_TTL_SECONDS,))
+
+
+report_job_queue = ReportJobQueue()
+
+
+def _public_job(job):
+    job = dict(job)
+    job.pop("report_path", None)
+    job.pop("finished_at", None)
+    return job
+
+
+@report_jobs_bp.route('/generate-report', methods=['POST'])
+def generate_report_route():
+    try:
+        # Get recipient emails from request
+        data = request.get_json() or {}
+        recipient_emails = data.get("recipient_email", [])
+        if isinstance(recipient_emails, str):
+            recipient_emails = [e.strip() for e in recipient_emails.split(',') if e.strip()]
+        if not recipient_emails:
+            return jsonify({"status": "error", "message": "Recipient email is required."}), 400
+
+        try:
+            job, deduplicated = report_job_queue.submit(recipient_emails)
+        except ReportQueueFullError as e:
+            return jsonify({"status": "error", "message": str(e)}), 503
+
+        return jsonify({
+            "status": "accepted",
+            "message": "An identical report is already being generated" if deduplicated else "Report generation started",
+            "job_id": job["job_id"],
+            "deduplicated": deduplicated,
+            "status_url": f"/report-jobs/{job['job_id']}"
+        }), 202
+    except Exception as e:
+        return jsonify({
+            "status": "error",
+            "message": f"Error generating report: {str(e)}"
+        }), 500
+
+
+@report_jobs_bp.route('/report-jobs/<job_id>', methods=['GET'])
+def get_report_job(job_id):
+    job = report_job_queue.get(job_id)
+    if job is None:
+        return jsonify({"status": "error", "message": "Report job not found"}), 404
+    return jsonify({"status": "success", "job": _public_job(job)})
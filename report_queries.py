@@ -0,0 +1,883 @@
+# report_queries.py - Parameterized, dialect-aware query catalog for the business report
+import re
+import pandas as pd
+from sqlalchemy import text
+from daily_diff import execute_diff_query
+
+# Table names cannot be bound as parameters, so daily snapshot tables are substituted
+# into the SQL only after matching this pattern and existing in the SQLite database
+DAILY_TABLE_PATTERN = re.compile(r'^daily_(\d{6})(?:_(\d{6}))?$')
+
+# Postgres has no master_summary; this CTE rebuilds it from the latest month in sales_data.
+# Unquoted identifiers fold to lower case in Postgres, so the report queries can keep
+# writing Brand/SalesQty and results are renamed back with POSTGRES_COLUMN_NAMES.
+POSTGRES_MASTER_SUMMARY_CTE = """
+    master_summary AS (
+        SELECT
+            brand,
+            category,
+            size,
+            color,
+            MAX(mrp) AS mrp,
+            SUM(sales_qty) AS salesqty,
+            SUM(purchase_qty) AS purchaseqty,
+            MAX(created_at) AS last_seen_at
+        FROM sales_data
+        WHERE lower(brand) <> 'grand total'
+        AND month = (SELECT MAX(month) FROM sales_data)
+        GROUP BY brand, category, size, color
+    )
+"""
+
+POSTGRES_COLUMN_NAMES = {
+    "brand": "Brand",
+    "category": "Category",
+    "size": "Size",
+    "color": "Color",
+    "mrp": "MRP",
+    "salesqty": "SalesQty",
+    "purchaseqty": "PurchaseQty",
+}
+
+
+def _with_master_summary(sql):
+    """Prefix a Postgres query with the master_summary CTE (continuing its WITH clause if it has one)"""
+    sql = sql.strip()
+    if sql.upper().startswith("WITH "):
+        return "WITH " + POSTGRES_MASTER_SUMMARY_CTE + ",\n" + sql[5:]
+    return "WITH " + POSTGRES_MASTER_SUMMARY_CTE + "\n" + sql
+
+
+# Each entry: id, a stable name (used for materialized insight tables), question, data_source,
+# per-dialect SQL (None when a dialect cannot answer the question), and default parameter
+# values bound at execution time. An optional "diff" variant reads the day-over-day tables
+# stored by daily_diff and is preferred while they cover the two newest daily files.
+REPORT_QUERIES = [
+    {
+        "id": 1,
+        "name": "sell_through_alerts",
+        "question": "Notify when items reach 75% and 50% sold, including the estimated days to sell out.",
+        "data_source": "local_master",
+        "params": {"min_percent_sold": 50, "velocity_days": 30, "limit": 10},
+        "sql": {
+            "sqlite": """
+                SELECT
+                    Brand,
+                    Category,
+                    Size,
+                    Color,
+                    MRP,
+                    SalesQty,
+                    PurchaseQty,
+                    ROUND((CAST(SalesQty AS REAL) / NULLIF(PurchaseQty, 0)) * 100, 2) as percent_sold,
+                    CASE
+                        WHEN SalesQty > 0 THEN ROUND((PurchaseQty - SalesQty) / (CAST(SalesQty AS REAL) / :velocity_days), 0)
+                        ELSE NULL
+                    END as est_days_to_sellout
+                FROM master_summary
+                WHERE lower(Brand) != 'grand total'
+                AND PurchaseQty > 0
+                AND ((CAST(SalesQty AS REAL) / PurchaseQty) * 100) >= :min_percent_sold
+                ORDER BY percent_sold DESC
+                LIMIT :limit
+            """,
+            "postgres": _with_master_summary("""
+                SELECT
+                    Brand,
+                    Category,
+                    Size,
+                    Color,
+                    MRP,
+                    SalesQty,
+                    PurchaseQty,
+                    ROUND(CAST(CAST(SalesQty AS DOUBLE PRECISION) / NULLIF(PurchaseQty, 0) * 100 AS NUMERIC), 2) as percent_sold,
+                    CASE
+                        WHEN SalesQty > 0 THEN ROUND(CAST((PurchaseQty - SalesQty) / (CAST(SalesQty AS DOUBLE PRECISION) / :velocity_days) AS NUMERIC), 0)
+                        ELSE NULL
+                    END as est_days_to_sellout
+                FROM master_summary
+                WHERE PurchaseQty > 0
+                AND (CAST(SalesQty AS DOUBLE PRECISION) / PurchaseQty) * 100 >= :min_percent_sold
+                ORDER BY percent_sold DESC
+                LIMIT :limit
+            """),
+        },
+    },
+    {
+        "id": 2,
+        "name": "best_sellers",
+        "question": "Identify the best-selling items on a weekly, monthly, and quarterly basis.",
+        "data_source": "local_daily",
+        "params": {"weekly_days": 7, "monthly_days": 30, "limit": 10},
+        "sql": {
+            "sqlite": """
+                -- Use master_summary for best overall sellers
+                WITH all_items AS (
+                    SELECT
+                        Brand,
+                        Category,
+                        Size,
+                        Color,
+                        SalesQty,
+                        date,
+                        julianday('now') - julianday(date) as days_since_record
+                    FROM master_summary
+                    WHERE lower(Brand) != 'grand total'
+                    AND SalesQty > 0
+                ),
+                weekly_best AS (
+                    SELECT
+                        Brand,
+                        Category,
+                        Size,
+                        Color,
+                        SUM(SalesQty) as sales,
+                        'weekly' as period
+                    FROM all_items
+                    WHERE days_since_record <= :weekly_days
+                    GROUP BY Brand, Category, Size, Color
+                    ORDER BY sales DESC
+                    LIMIT :limit
+                ),
+                monthly_best AS (
+                    SELECT
+                        Brand,
+                        Category,
+                        Size,
+                        Color,
+                        SUM(SalesQty) as sales,
+                        'monthly' as period
+                    FROM all_items
+                    WHERE days_since_record <= :monthly_days
+                    GROUP BY Brand, Category, Size, Color
+                    ORDER BY sales DESC
+                    LIMIT :limit
+                ),
+                quarterly_best AS (
+                    SELECT
+                        Brand,
+                        Category,
+                        Size,
+                        Color,
+                        SUM(SalesQty) as sales,
+                        'quarterly' as period
+                    FROM all_items
+                    GROUP BY Brand, Category, Size, Color
+                    ORDER BY sales DESC
+                    LIMIT :limit
+                )
+
+                SELECT * FROM weekly_best
+
+                UNION ALL
+
+                SELECT * FROM monthly_best
+
+                UNION ALL
+
+                SELECT * FROM quarterly_best
+
+                ORDER BY period, sales DESC
+            """,
+            "postgres": _with_master_summary("""
+                WITH all_items AS (
+                    SELECT
+                        Brand,
+                        Category,
+                        Size,
+                        Color,
+                        SalesQty,
+                        EXTRACT(EPOCH FROM (NOW() - last_seen_at)) / 86400.0 as days_since_record
+                    FROM master_summary
+                    WHERE SalesQty > 0
+                ),
+                weekly_best AS (
+                    SELECT Brand, Category, Size, Color, SUM(SalesQty) as sales, 'weekly' as period
+                    FROM all_items
+                    WHERE days_since_record <= :weekly_days
+                    GROUP BY Brand, Category, Size, Color
+                    ORDER BY sales DESC
+                    LIMIT :limit
+                ),
+                monthly_best AS (
+                    SELECT Brand, Category, Size, Color, SUM(SalesQty) as sales, 'monthly' as period
+                    FROM all_items
+                    WHERE days_since_record <= :monthly_days
+                    GROUP BY Brand, Category, Size, Color
+                    ORDER BY sales DESC
+                    LIMIT :limit
+                ),
+                quarterly_best AS (
+                    SELECT Brand, Category, Size, Color, SUM(SalesQty) as sales, 'quarterly' as period
+                    FROM all_items
+                    GROUP BY Brand, Category, Size, Color
+                    ORDER BY sales DESC
+                    LIMIT :limit
+                )
+                SELECT * FROM (
+                    (SELECT * FROM weekly_best)
+                    UNION ALL
+                    (SELECT * FROM monthly_best)
+                    UNION ALL
+                    (SELECT * FROM quarterly_best)
+                ) best_sellers
+                ORDER BY period, sales DESC
+            """),
+        },
+    },
+    {
+        "id": 3,
+        "name": "non_moving_stock",
+        "question": "Track non-moving products and their aging quantities.",
+        "data_source": "local_master",
+        "params": {"limit": 10},
+        "sql": {
+            "sqlite": """
+                SELECT
+                    Brand,
+                    Category,
+                    Size,
+                    Color,
+                    MRP,
+                    PurchaseQty,
+                    SalesQty,
+                    ROUND((CAST(SalesQty AS REAL) / NULLIF(PurchaseQty, 0)) * 100, 2) as percent_sold,
+                    julianday('now') - julianday(date) as days_in_inventory
+                FROM master_summary
+                WHERE lower(Brand) != 'grand total'
+                AND SalesQty = 0
+                AND PurchaseQty > 0
+                ORDER BY days_in_inventory DESC, PurchaseQty DESC
+                LIMIT :limit
+            """,
+            "postgres": _with_master_summary("""
+                SELECT
+                    Brand,
+                    Category,
+                    Size,
+                    Color,
+                    MRP,
+                    PurchaseQty,
+                    SalesQty,
+                    ROUND(CAST(CAST(SalesQty AS DOUBLE PRECISION) / NULLIF(PurchaseQty, 0) * 100 AS NUMERIC), 2) as percent_sold,
+                    EXTRACT(EPOCH FROM (NOW() - last_seen_at)) / 86400.0 as days_in_inventory
+                FROM master_summary
+                WHERE SalesQty = 0
+                AND PurchaseQty > 0
+                ORDER BY days_in_inventory DESC, PurchaseQty DESC
+                LIMIT :limit
+            """),
+        },
+    },
+    {
+        "id": 4,
+        "name": "slow_moving_sizes",
+        "question": "Identify slow-moving sizes within specific categories.",
+        "data_source": "local_master",
+        "params": {"max_percent_sold": 30, "limit": 10},
+        "sql": {
+            "sqlite": """
+                SELECT
+                    Category,
+                    Size,
+                    COUNT(*) as size_count,
+                    SUM(PurchaseQty) as total_purchased,
+                    SUM(SalesQty) as total_sold,
+                    ROUND(CAST(SUM(SalesQty) AS REAL) / NULLIF(SUM(PurchaseQty), 0) * 100, 2) as percent_sold,
+                    AVG(julianday('now') - julianday(date)) as avg_days_in_inventory
+                FROM master_summary
+                WHERE lower(Brand) != 'grand total'
+                AND PurchaseQty > 0
+                GROUP BY Category, Size
+                HAVING percent_sold < :max_percent_sold AND size_count > 1
+                ORDER BY percent_sold
+                LIMIT :limit
+            """,
+            "postgres": _with_master_summary("""
+                SELECT * FROM (
+                    SELECT
+                        Category,
+                        Size,
+                        COUNT(*) as size_count,
+                        SUM(PurchaseQty) as total_purchased,
+                        SUM(SalesQty) as total_sold,
+                        ROUND(CAST(CAST(SUM(SalesQty) AS DOUBLE PRECISION) / NULLIF(SUM(PurchaseQty), 0) * 100 AS NUMERIC), 2) as percent_sold,
+                        AVG(EXTRACT(EPOCH FROM (NOW() - last_seen_at)) / 86400.0) as avg_days_in_inventory
+                    FROM master_summary
+                    WHERE PurchaseQty > 0
+                    GROUP BY Category, Size
+                ) sizes
+                WHERE percent_sold < :max_percent_sold AND size_count > 1
+                ORDER BY percent_sold
+                LIMIT :limit
+            """),
+        },
+    },
+    {
+        "id": 5,
+        "name": "category_variance",
+        "question": "Provide insights on variances and suggest strategies for improvement.",
+        "data_source": "local_master",
+        "params": {"limit": 10},
+        "sql": {
+            "sqlite": """
+                WITH category_performance AS (
+                    SELECT
+                        Category,
+                        SUM(PurchaseQty) as total_purchased,
+                        SUM(SalesQty) as total_sold,
+                        ROUND(CAST(SUM(SalesQty) AS REAL) / NULLIF(SUM(PurchaseQty), 0) * 100, 2) as sell_through_rate,
+                        COUNT(DISTINCT Brand) as brand_count
+                    FROM master_summary
+                    WHERE lower(Brand) != 'grand total'
+                    GROUP BY Category
+                    HAVING SUM(PurchaseQty) > 0
+                ),
+                overall_average AS (
+                    SELECT
+                        ROUND(CAST(SUM(SalesQty) AS REAL) / NULLIF(SUM(PurchaseQty), 0) * 100, 2) as avg_sell_through
+                    FROM master_summary
+                    WHERE lower(Brand) != 'grand total'
+                    AND PurchaseQty > 0
+                )
+                SELECT
+                    cp.Category,
+                    cp.total_purchased,
+                    cp.total_sold,
+                    cp.sell_through_rate,
+                    (cp.sell_through_rate - (SELECT avg_sell_through FROM overall_average)) as variance_from_avg,
+                    cp.brand_count
+                FROM category_performance cp, overall_average
+                ORDER BY variance_from_avg
+                LIMIT :limit
+            """,
+            "postgres": _with_master_summary("""
+                WITH category_performance AS (
+                    SELECT
+                        Category,
+                        SUM(PurchaseQty) as total_purchased,
+                        SUM(SalesQty) as total_sold,
+                        ROUND(CAST(CAST(SUM(SalesQty) AS DOUBLE PRECISION) / NULLIF(SUM(PurchaseQty), 0) * 100 AS NUMERIC), 2) as sell_through_rate,
+                        COUNT(DISTINCT Brand) as brand_count
+                    FROM master_summary
+                    GROUP BY Category
+                    HAVING SUM(PurchaseQty) > 0
+                ),
+                overall_average AS (
+                    SELECT
+                        ROUND(CAST(CAST(SUM(SalesQty) AS DOUBLE PRECISION) / NULLIF(SUM(PurchaseQty), 0) * 100 AS NUMERIC), 2) as avg_sell_through
+                    FROM master_summary
+                    WHERE PurchaseQty > 0
+                )
+                SELECT
+                    cp.Category,
+                    cp.total_purchased,
+                    cp.total_sold,
+                    cp.sell_through_rate,
+                    (cp.sell_through_rate - oa.avg_sell_through) as variance_from_avg,
+                    cp.brand_count
+                FROM category_performance cp CROSS JOIN overall_average oa
+                ORDER BY variance_from_avg
+                LIMIT :limit
+            """),
+        },
+    },
+    {
+        "id": 6,
+        "name": "returns_turnaround",
+        "question": "Analyze the turnaround time for exchanges and returns to optimize processes.",
+        "data_source": "local_daily",
+        "params": {"limit": 10},
+        "daily_tables": 2,
+        "sql": {
+            # Needs two consecutive daily snapshots, which only exist locally; sales_data
+            # keeps a single merged row per SKU per month
+            "sqlite": """
+                -- Compare daily files to track changes in sales quantities that might represent returns
+                WITH sequential_days AS (
+                    SELECT
+                        d1.Brand,
+                        d1.Category,
+                        d1.Size,
+                        d1.Color,
+                        d1.SalesQty as current_sales,
+                        d2.SalesQty as previous_sales,
+                        d1.PurchaseQty as current_purchase,
+                        d2.PurchaseQty as previous_purchase,
+                        d1.date as current_snapshot_date,
+                        d2.date as previous_snapshot_date,
+                        d1.file_source as file_source
+                    FROM {current_table} d1  -- Latest file
+                    LEFT JOIN {previous_table} d2  -- Previous day file
+                    ON d1.Brand = d2.Brand
+                    AND d1.Category = d2.Category
+                    AND d1.Size = d2.Size
+                    AND d1.Color = d2.Color
+                    WHERE lower(d1.Brand) != 'grand total'
+                ),
+                returns_data AS (
+                    SELECT
+                        Brand,
+                        Category,
+                        Size,
+                        Color,
+                        current_sales,
+                        previous_sales,
+                        CASE
+                            WHEN previous_sales IS NOT NULL AND current_sales < previous_sales
+                            THEN (previous_sales - current_sales)
+                            ELSE 0
+                        END as return_qty,
+                        julianday(current_snapshot_date) - julianday(previous_snapshot_date) as days_between,
+                        file_source
+                    FROM sequential_days
+                )
+                SELECT
+                    Brand,
+                    Category,
+                    SUM(return_qty) as return_qty,
+                    COUNT(CASE WHEN return_qty > 0 THEN 1 END) as return_count,
+                    ROUND(CAST(SUM(return_qty) AS REAL) / NULLIF(SUM(current_sales), 0) * 100, 2) as return_rate,
+                    AVG(CASE WHEN return_qty > 0 THEN days_between ELSE NULL END) as avg_return_days
+                FROM returns_data
+                GROUP BY Brand, Category
+                HAVING SUM(return_qty) > 0
+                ORDER BY return_qty DESC
+                LIMIT :limit
+            """,
+            # Same answer from the per-SKU deltas stored at ingest by daily_diff
+            "diff": """
+                SELECT
+                    d.brand AS Brand,
+                    d.category AS Category,
+                    SUM(d.previous_sales - d.current_sales) as return_qty,
+                    COUNT(*) as return_count,
+                    ROUND(CAST(SUM(d.previous_sales - d.current_sales) AS REAL) / NULLIF(MAX(t.current_sales), 0) * 100, 2) as return_rate,
+                    MAX(r.days_between) as avg_return_days
+                FROM daily_diff d
+                JOIN daily_diff_totals t ON t.brand = d.brand AND t.category = d.category
+                CROSS JOIN (SELECT days_between FROM daily_diff_runs ORDER BY id DESC LIMIT 1) r
+                WHERE d.change_type = 'changed'
+                AND d.current_sales < d.previous_sales
+                GROUP BY d.brand, d.category
+                ORDER BY return_qty DESC
+                LIMIT :limit
+            """,
+            "postgres": None,
+        },
+    },
+    {
+        "id": 7,
+        "name": "vendor_returns_rejections",
+        "question": "Generate reports on rejected goods and returns for vendor feedback.",
+        "data_source": "local_daily",
+        "params": {"limit": 10},
+        "daily_tables": 2,
+        "sql": {
+            "sqlite": """
+                -- Analyze changes across daily files to detect returns and rejections
+                WITH daily_changes AS (
+                    SELECT
+                        d1.Brand,
+                        d1.Category,
+                        d1.Size,
+                        d1.Color,
+                        d1.SalesQty - d2.SalesQty as sales_change,  -- Negative means possible return
+                        d1.PurchaseQty - d2.PurchaseQty as purchase_change,  -- Negative means possible rejection
+                        d1.date as current_snapshot_date,
+                        d2.date as previous_snapshot_date
+                    FROM {current_table} d1  -- Latest day
+                    JOIN {previous_table} d2  -- Previous day
+                    ON d1.Brand = d2.Brand
+                    AND d1.Category = d2.Category
+                    AND d1.Size = d2.Size
+                    AND d1.Color = d2.Color
+                    WHERE lower(d1.Brand) != 'grand total'
+                ),
+                vendor_feedback AS (
+                    SELECT
+                        Brand,
+                        CASE WHEN sales_change < 0 THEN ABS(sales_change) ELSE 0 END as return_qty,
+                        CASE WHEN purchase_change < 0 THEN ABS(purchase_change) ELSE 0 END as rejected_qty,
+                        julianday(current_snapshot_date) - julianday(previous_snapshot_date) as days_gap
+                    FROM daily_changes
+                    WHERE sales_change < 0 OR purchase_change < 0  -- Only returns or rejections
+                )
+                SELECT
+                    Brand,
+                    SUM(return_qty) as return_qty,
+                    SUM(rejected_qty) as rejected_qty,
+                    SUM(return_qty + rejected_qty) as total_issues,
+                    COUNT(*) as issue_count,
+                    AVG(days_gap) as avg_turnaround_days
+                FROM vendor_feedback
+                GROUP BY Brand
+                HAVING total_issues > 0
+                ORDER BY total_issues DESC
+                LIMIT :limit
+            """,
+            "diff": """
+                SELECT
+                    d.brand AS Brand,
+                    SUM(CASE WHEN d.sales_change < 0 THEN -d.sales_change ELSE 0 END) as return_qty,
+                    SUM(CASE WHEN d.purchase_change < 0 THEN -d.purchase_change ELSE 0 END) as rejected_qty,
+                    SUM(CASE WHEN d.sales_change < 0 THEN -d.sales_change ELSE 0 END
+                        + CASE WHEN d.purchase_change < 0 THEN -d.purchase_change ELSE 0 END) as total_issues,
+                    COUNT(*) as issue_count,
+                    MAX(r.days_between) as avg_turnaround_days
+                FROM daily_diff d
+                CROSS JOIN (SELECT days_between FROM daily_diff_runs ORDER BY id DESC LIMIT 1) r
+                WHERE d.change_type = 'changed'
+                AND (d.sales_change < 0 OR d.purchase_change < 0)
+                GROUP BY d.brand
+                HAVING total_issues > 0
+                ORDER BY total_issues DESC
+                LIMIT :limit
+            """,
+            "postgres": None,
+        },
+    },
+    {
+        "id": 8,
+        "name": "online_priority",
+        "question": "Recommend which products from our stock should be prioritized for online sales.",
+        "data_source": "local_master",
+        "params": {"min_sell_through": 0.4, "limit": 10},
+        "sql": {
+            "sqlite": """
+                -- Find high-performing items that still have stock
+                SELECT
+                    Brand,
+                    Category,
+                    Size,
+                    Color,
+                    MRP,
+                    PurchaseQty,
+                    SalesQty,
+                    (PurchaseQty - SalesQty) as remaining_stock,
+                    ROUND((CAST(SalesQty AS REAL) / NULLIF(PurchaseQty, 0)) * 100, 2) as sell_through_rate,
+                    ROUND(MRP * (PurchaseQty - SalesQty), 2) as stock_value
+                FROM master_summary
+                WHERE lower(Brand) != 'grand total'
+                -- Must have remaining stock
+                AND (PurchaseQty - SalesQty) > 0
+                -- Good sell-through rate but not sold out
+                AND (CAST(SalesQty AS REAL) / NULLIF(PurchaseQty, 0)) > :min_sell_through
+                ORDER BY sell_through_rate DESC, stock_value DESC
+                LIMIT :limit
+            """,
+            "postgres": _with_master_summary("""
+                SELECT
+                    Brand,
+                    Category,
+                    Size,
+                    Color,
+                    MRP,
+                    PurchaseQty,
+                    SalesQty,
+                    (PurchaseQty - SalesQty) as remaining_stock,
+                    ROUND(CAST(CAST(SalesQty AS DOUBLE PRECISION) / NULLIF(PurchaseQty, 0) * 100 AS NUMERIC), 2) as sell_through_rate,
+                    ROUND(CAST(MRP * (PurchaseQty - SalesQty) AS NUMERIC), 2) as stock_value
+                FROM master_summary
+                WHERE (PurchaseQty - SalesQty) > 0
+                AND (CAST(SalesQty AS DOUBLE PRECISION) / NULLIF(PurchaseQty, 0)) > :min_sell_through
+                ORDER BY sell_through_rate DESC, stock_value DESC
+                LIMIT :limit
+            """),
+        },
+    },
+    {
+        "id": 9,
+        "name": "unique_portfolio",
+        "question": "Identify unique products that can enhance our online portfolio.",
+        "data_source": "local_master",
+        "params": {"limit": 10},
+        "sql": {
+            "sqlite": """
+                SELECT
+                    m1.Brand,
+                    m1.Category,
+                    m1.Size,
+                    m1.Color,
+                    m1.MRP,
+                    m1.SalesQty,
+                    m1.PurchaseQty,
+                    (m1.PurchaseQty - m1.SalesQty) as available_stock,
+                    (SELECT COUNT(*)
+                     FROM master_summary m2
+                     WHERE m2.Category = m1.Category
+                     AND m2.Size = m1.Size
+                     AND lower(m2.Brand) != 'grand total') as category_size_count,
+                    (SELECT COUNT(*)
+                     FROM master_summary m3
+                     WHERE m3.Brand = m1.Brand
+                     AND lower(m3.Brand) != 'grand total') as brand_count
+                FROM master_summary m1
+                WHERE lower(m1.Brand) != 'grand total'
+                AND (m1.PurchaseQty - m1.SalesQty) > 0
+                ORDER BY category_size_count ASC, brand_count ASC, m1.MRP DESC
+                LIMIT :limit
+            """,
+            # The window counts must see every SKU, so the stock filter is applied outside them
+            "postgres": _with_master_summary("""
+                SELECT * FROM (
+                    SELECT
+                        Brand,
+                        Category,
+                        Size,
+                        Color,
+                        MRP,
+                        SalesQty,
+                        PurchaseQty,
+                        (PurchaseQty - SalesQty) as available_stock,
+                        COUNT(*) OVER (PARTITION BY Category, Size) as category_size_count,
+                        COUNT(*) OVER (PARTITION BY Brand) as brand_count
+                    FROM master_summary
+                ) portfolio
+                WHERE available_stock > 0
+                ORDER BY category_size_count ASC, brand_count ASC, MRP DESC
+                LIMIT :limit
+            """),
+        },
+    },
+    {
+        "id": 10,
+        "name": "pareto_top_sellers",
+        "question": "Identify the top 20% of products contributing to 80% of sales.",
+        "data_source": "local_master",
+        "params": {"pareto_share": 0.80, "limit": 10},
+        "sql": {
+            "sqlite": """
+                -- Calculate revenue and running totals using window functions
+                WITH product_revenue AS (
+                    SELECT
+                        Brand,
+                        Category,
+                        Size,
+                        Color,
+                        SalesQty,
+                        MRP,
+                        CAST(SalesQty AS REAL) * MRP as revenue
+                    FROM master_summary
+                    WHERE lower(Brand) != 'grand total'
+                    AND SalesQty > 0
+                    ORDER BY revenue DESC
+                ),
+                total_revenue AS (
+                    SELECT SUM(revenue) as total FROM product_revenue
+                ),
+                ranked_products AS (
+                    SELECT
+                        Brand,
+                        Category,
+                        Size,
+                        Color,
+                        SalesQty,
+                        MRP,
+                        revenue,
+                        (SELECT total FROM total_revenue) as total_revenue,
+                        ROUND((revenue / (SELECT total FROM total_revenue)) * 100, 2) as percent_of_total,
+                        SUM(revenue) OVER (ORDER BY revenue DESC) as running_total
+                    FROM product_revenue
+                )
+                SELECT
+                    Brand,
+                    Category,
+                    Size,
+                    Color,
+                    SalesQty,
+                    MRP,
+                    revenue,
+                    percent_of_total,
+                    ROUND((running_total / total_revenue) * 100, 2) as cumulative_percent
+                FROM ranked_products
+                -- Only include products up to 80% cumulative revenue
+                WHERE (running_total / total_revenue) <= :pareto_share
+                ORDER BY revenue DESC
+                LIMIT :limit
+            """,
+            "postgres": _with_master_summary("""
+                WITH product_revenue AS (
+                    SELECT
+                        Brand,
+                        Category,
+                        Size,
+                        Color,
+                        SalesQty,
+                        MRP,
+                        CAST(SalesQty AS DOUBLE PRECISION) * MRP as revenue
+                    FROM master_summary
+                    WHERE SalesQty > 0
+                ),
+                ranked_products AS (
+                    SELECT
+                        Brand,
+                        Category,
+                        Size,
+                        Color,
+                        SalesQty,
+                        MRP,
+                        revenue,
+                        SUM(revenue) OVER () as total_revenue,
+                        SUM(revenue) OVER (ORDER BY revenue DESC) as running_total
+                    FROM product_revenue
+                )
+                SELECT
+                    Brand,
+                    Category,
+                    Size,
+                    Color,
+                    SalesQty,
+                    MRP,
+                    revenue,
+                    ROUND(CAST(revenue / total_revenue * 100 AS NUMERIC), 2) as percent_of_total,
+                    ROUND(CAST(running_total / total_revenue * 100 AS NUMERIC), 2) as cumulative_percent
+                FROM ranked_products
+                WHERE (running_total / total_revenue) <= :pareto_share
+                ORDER BY revenue DESC
+                LIMIT :limit
+            """),
+        },
+    },
+    {
+        "id": 11,
+        "name": "low_performing_inventory",
+        "question": "Suggest strategies to reduce the inventory of low-performing items.",
+        "data_source": "local_master",
+        "params": {"max_sell_through": 0.3, "limit": 10},
+        "sql": {
+            "sqlite": """
+                -- Identify slow-moving inventory with significant capital tied up
+                SELECT
+                    Brand,
+                    Category,
+                    Size,
+                    Color,
+                    MRP,
+                    SalesQty,
+                    PurchaseQty,
+                    (PurchaseQty - SalesQty) as excess_inventory,
+                    ROUND((CAST(SalesQty AS REAL) / NULLIF(PurchaseQty, 0)) * 100, 2) as sell_through_rate,
+                    ROUND(MRP * (PurchaseQty - SalesQty), 2) as locked_capital,
+                    julianday('now') - julianday(date) as days_in_inventory
+                FROM master_summary
+                WHERE lower(Brand) != 'grand total'
+                -- Must have inventory
+                AND PurchaseQty > 0
+                -- Low sell-through rate
+                AND (CAST(SalesQty AS REAL) / NULLIF(PurchaseQty, 0)) < :max_sell_through
+                -- Must still have excess inventory
+                AND (PurchaseQty - SalesQty) > 0
+                ORDER BY locked_capital DESC, sell_through_rate ASC
+                LIMIT :limit
+            """,
+            "postgres": _with_master_summary("""
+                SELECT
+                    Brand,
+                    Category,
+                    Size,
+                    Color,
+                    MRP,
+                    SalesQty,
+                    PurchaseQty,
+                    (PurchaseQty - SalesQty) as excess_inventory,
+                    ROUND(CAST(CAST(SalesQty AS DOUBLE PRECISION) / NULLIF(PurchaseQty, 0) * 100 AS NUMERIC), 2) as sell_through_rate,
+                    ROUND(CAST(MRP * (PurchaseQty - SalesQty) AS NUMERIC), 2) as locked_capital,
+                    EXTRACT(EPOCH FROM (NOW() - last_seen_at)) / 86400.0 as days_in_inventory
+                FROM master_summary
+                WHERE PurchaseQty > 0
+                AND (CAST(SalesQty AS DOUBLE PRECISION) / NULLIF(PurchaseQty, 0)) < :max_sell_through
+                AND (PurchaseQty - SalesQty) > 0
+                ORDER BY locked_capital DESC, sell_through_rate ASC
+                LIMIT :limit
+            """),
+        },
+    },
+]
+
+
+def latest_daily_tables(available_tables, n=2):
+    """Most recent daily snapshot tables, newest first (daily_YYMMDD or daily_YYMMDD_HHMMSS)"""
+    daily_tables = [t for t in available_tables if DAILY_TABLE_PATTERN.match(t)]
+    return sorted(
+        daily_tables,
+        key=lambda t: DAILY_TABLE_PATTERN.match(t).groups(default="000000"),
+        reverse=True
+    )[:n]
+
+
+def prepare_report_queries(available_tables, queries=REPORT_QUERIES):
+    """Resolve every catalog entry once for a ReportBuilder.
+
+    Returns {question_id: {"sqlite", "postgres", "diff", "params", "skip_reason"}} where "sqlite" is
+    the final SQL text, "postgres" a compiled SQLAlchemy text() clause, and either may be
+    None when that dialect cannot answer the question.
+    """
+    prepared = {}
+    for query in queries:
+        sqlite_sql = query["sql"].get("sqlite")
+        postgres_sql = query["sql"].get("postgres")
+        skip_reason = None
+
+        needed_tables = query.get("daily_tables", 0)
+        if needed_tables and sqlite_sql:
+            tables = latest_daily_tables(available_tables, needed_tables)
+            if len(tables) < needed_tables:
+                sqlite_sql = None
+                skip_reason = f"needs {needed_tables} daily tables, found {len(tables)}"
+            else:
+                print(f"Question {query['id']} uses daily tables: {tables}")
+                sqlite_sql = sqlite_sql.format(current_table=tables[0], previous_table=tables[1])
+
+        prepared[query["id"]] = {
+            "sqlite": sqlite_sql,
+            "postgres": text(postgres_sql) if postgres_sql else None,
+            "diff": query["sql"].get("diff"),
+            "params": dict(query.get("params", {})),
+            "skip_reason": skip_reason,
+        }
+    return prepared
+
+
+def normalize_postgres_columns(df):
+    """Give Postgres results the same column names as the SQLite variants"""
+    return df.rename(columns=lambda col: POSTGRES_COLUMN_NAMES.get(col, col))
+
+
+def execute_prepared_query(data_manager, query, prepared):
+    """Run a prepared catalog query on the local SQLite copy, falling back to the Postgres variant.
+
+    data_manager is a report.DataSourceManager. Returns an empty DataFrame when no variant
+    can answer the question.
+    """
+    params = prepared["params"]
+    result = None
+
+    if prepared.get("diff"):
+        result = execute_diff_query(prepared["diff"], params)
+        if result is not None:
+            return result
+        print(f"No current daily diff for question {query['id']}; comparing daily tables")
+
+    if query["data_source"] != "neon_db" and prepared["sqlite"]:
+        result = data_manager.execute_sqlite_query(prepared["sqlite"], params)
+        if isinstance(result, dict) and "error" in result and prepared["postgres"] is not None:
+            print(f"Falling back to Neon DB for question {query['id']}")
+            result = None
+    elif prepared["sqlite"] is None and prepared["skip_reason"]:
+        print(f"Local query for question {query['id']} unavailable: {prepared['skip_reason']}")
+
+    if result is None:
+        if prepared["postgres"] is None:
+            print(f"No query variant available for question {query['id']}")
+            return pd.DataFrame()
+        result = data_manager.execute_neon_query(prepared["postgres"], params)
+        if isinstance(result, pd.DataFrame):
+            result = normalize_postgres_columns(result)
+
+    # If we still have an error, return empty DataFrame with error message
+    if isinstance(result, dict) and "error" in result:
+        print(f"Error executing query for question {query['id']}: {result['error']}")
+        return pd.DataFrame()
+
+    return result
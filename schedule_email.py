@@ -4,23 +4,25 @@ Handles scheduling, persistence, and email delivery of business reports
 """
 
 import os
-import smtplib
 import logging
 import uuid
 import json
 import threading
+import heapq
+import select
 import schedule
 import time
 from typing import List, Dict, Any, Union, Optional
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from email.mime.application import MIMEApplication
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 import psycopg2
 from psycopg2.extras import Json, DictCursor
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
 from flask import Blueprint, request, jsonify
-from report import ReportBuilder
+from report import get_or_build_report
+from email_delivery import EmailDeliveryService, SMTPConnectionPool, PreparedMessage
+from email_outbox import OUTBOX_TABLE_SQL, OutboxWorkerPool, enqueue_schedule_run
+from leader_election import LeaderElection
 
 from flask import Flask
 app = Flask(__name__)
@@ -57,6 +59,17 @@ SMTP_USERNAME = os.getenv("SMTP_USERNAME", "mctest4004@gmail.com")
 SMTP_PASSWORD = os.getenv("SMTP_PASSWORD", "mnbvcxzMNBVCXZ@123")
 DEFAULT_FROM_EMAIL = os.getenv("DEFAULT_FROM_EMAIL", "notifications@inventorysync.com")
 
+# Send one BCC message per batch of recipients instead of one message each
+EMAIL_BCC_MODE = os.getenv("EMAIL_BCC_MODE", "false").lower() == "true"
+
+# Scheduler timing
+# Channel NOTIFY'd whenever a schedule is created, updated or deleted
+SCHEDULE_CHANGES_CHANNEL = "scheduled_reports_changed"
+# Full reload of the schedule heap, in case a change notification was missed
+SCHEDULER_RECONCILE_SECONDS = float(os.getenv("SCHEDULER_RECONCILE_SECONDS", "300"))
+# Wait before a schedule that stayed due (e.g. its send failed) is tried again
+SCHEDULER_RETRY_SECONDS = float(os.getenv("SCHEDULER_RETRY_SECONDS", "10"))
+
 # Database connection function
 def get_db_connection():
     """Establish connection to Neon Database using .env variables"""
@@ -123,6 +136,7 @@ def setup_database():
                 CREATE INDEX IF NOT EXISTS idx_scheduled_reports_user 
                 ON scheduled_reports(user_id);
             ''')
+            cursor.execute(OUTBOX_TABLE_SQL)
             conn.commit()
             logger.info("Email scheduling tables created or confirmed")
             return True
@@ -132,96 +146,233 @@ def setup_database():
     finally:
         conn.close()
 
-# Run setup at import time
-setup_database()
+_database_ready = False
+_database_lock = threading.Lock()
+
+
+def ensure_database():
+    """Run setup_database once per process, on first use instead of at import"""
+    global _database_ready
+    with _database_lock:
+        if not _database_ready:
+            _database_ready = setup_database()
+        return _database_ready
+
+def notify_schedules_changed(cursor):
+    """Queue a change notification; Postgres delivers it to every scheduler when the transaction commits"""
+    cursor.execute("SELECT pg_notify(%s, '')", (SCHEDULE_CHANGES_CHANNEL,))
 
 class EmailScheduler:
-    """Manages scheduling and sending of report emails"""
+    """Manages scheduling and sending of report emails.
+
+    Due times are kept in an in-memory heap and the scheduler thread sleeps until the
+    earliest one. Creating or deleting a schedule wakes it through wake() in this process
+    and a Postgres NOTIFY for the others, so the database is only queried when something
+    is due or has changed (plus a periodic reconcile).
+    """
     
     def __init__(self):
         """Initialize the email scheduler"""
         self.scheduler_thread = None
+        self.listener_thread = None
         self.stop_flag = threading.Event()
+        self.condition = threading.Condition()
+        self.heap = []                # (wake time in DB clock, schedule id)
+        self.reload_requested = True
+        self.retry_at = {}            # schedule id -> earliest retry for schedules that stayed due
+        self.db_clock_offset = timedelta(0)  # DB LOCALTIMESTAMP minus local datetime.now()
+        self.delivery_service = None
+        self.outbox = OutboxWorkerPool(get_db_connection, self._send_outbox_run)
     
     def start_scheduler(self):
-        """Start the scheduler thread if not already running"""
+        """Start the scheduler and listener threads if not already running.
+
+        Only the process elected by scheduler_leader runs these; the outbox workers are
+        started separately in every process.
+        """
         if self.scheduler_thread is None or not self.scheduler_thread.is_alive():
             self.stop_flag.clear()
+            self.reload_requested = True
             self.scheduler_thread = threading.Thread(target=self._scheduler_loop)
             self.scheduler_thread.daemon = True
             self.scheduler_thread.start()
             logger.info("Email scheduler thread started")
+        if self.listener_thread is None or not self.listener_thread.is_alive():
+            self.listener_thread = threading.Thread(target=self._listen_loop)
+            self.listener_thread.daemon = True
+            self.listener_thread.start()
     
     def stop_scheduler(self):
-        """Stop the scheduler thread"""
-        if self.scheduler_thread and self.scheduler_thread.is_alive():
-            self.stop_flag.set()
-            self.scheduler_thread.join(timeout=5)
-            self.scheduler_thread = None
-            logger.info("Email scheduler thread stopped")
+        """Stop the scheduler and listener threads"""
+        self.stop_flag.set()
+        self.wake()
+        for thread in (self.scheduler_thread, self.listener_thread):
+            if thread and thread.is_alive():
+                thread.join(timeout=10)
+        self.scheduler_thread = None
+        self.listener_thread = None
+        logger.info("Email scheduler thread stopped")
+    
+    def wake(self):
+        """Reload the schedules and recompute the next wake-up (call after any schedule change)"""
+        with self.condition:
+            self.reload_requested = True
+            self.condition.notify()
+    
+    def _db_now(self):
+        return datetime.now() + self.db_clock_offset
+    
+    def _load_schedules(self):
+        """Rebuild the heap from the active schedules; one small query per change"""
+        conn = get_db_connection()
+        if not conn:
+            raise Exception("Failed to connect to database to load schedules")
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    SELECT id, next_run_time, LOCALTIMESTAMP FROM scheduled_reports
+                    WHERE active = TRUE
+                """)
+                rows = cursor.fetchall()
+                if not rows:
+                    cursor.execute("SELECT LOCALTIMESTAMP")
+                    db_now = cursor.fetchone()[0]
+                else:
+                    db_now = rows[0][2]
+        finally:
+            conn.close()
+        
+        # next_run_time is compared with the database clock, so sleep against that clock too
+        self.db_clock_offset = db_now - datetime.now()
+        heap = [(max(next_run, self.retry_at.get(str(schedule_id), next_run)), str(schedule_id))
+                for schedule_id, next_run, _ in rows]
+        heapq.heapify(heap)
+        with self.condition:
+            self.heap = heap
+        return len(heap)
     
     def _scheduler_loop(self):
-        """Main scheduler loop that checks for and processes scheduled emails"""
+        """Sleep until the earliest schedule is due or a change wakes the loop, then run due schedules"""
         logger.info("Scheduler loop started")
+        next_reconcile = 0.0
         
         while not self.stop_flag.is_set():
             try:
-                # Check for schedules that need to be run
-                self._check_schedules()
+                if self.reload_requested or time.monotonic() >= next_reconcile:
+                    self.reload_requested = False
+                    count = self._load_schedules()
+                    next_reconcile = time.monotonic() + SCHEDULER_RECONCILE_SECONDS
+                    logger.info(f"Loaded {count} upcoming schedules")
                 
-                # Sleep for a shorter interval (e.g., 10 seconds)
-                for _ in range(10):
-                    if self.stop_flag.is_set():
-                        break
-                    time.sleep(1)
+                with self.condition:
+                    timeout = next_reconcile - time.monotonic()
+                    if self.heap:
+                        timeout = min(timeout, (self.heap[0][0] - self._db_now()).total_seconds())
+                    if timeout > 0 and not self.reload_requested and not self.stop_flag.is_set():
+                        self.condition.wait(timeout)
+                    due = bool(self.heap) and self.heap[0][0] <= self._db_now()
+                
+                if due and not self.stop_flag.is_set():
+                    checked_at = self._db_now()
+                    self._check_schedules()
+                    self._load_schedules()
+                    # Anything still due was locked by another process or failed; back off
+                    with self.condition:
+                        still_due = [schedule_id for wake_at, schedule_id in self.heap if wake_at <= checked_at]
+                    if still_due:
+                        retry_at = self._db_now() + timedelta(seconds=SCHEDULER_RETRY_SECONDS)
+                        self.retry_at.update({schedule_id: retry_at for schedule_id in still_due})
+                        self._load_schedules()
+                    self.retry_at = {k: v for k, v in self.retry_at.items() if v > self._db_now()}
             except Exception as e:
                 logger.error(f"Error in scheduler loop: {e}")
-                time.sleep(10)  # Wait 10 seconds before retrying after an error
+                self.stop_flag.wait(SCHEDULER_RETRY_SECONDS)
+                self.reload_requested = True
+    
+    def _listen_loop(self):
+        """Hold one idle connection LISTENing for schedule changes made by any process"""
+        while not self.stop_flag.is_set():
+            conn = get_db_connection()
+            if not conn:
+                self.stop_flag.wait(SCHEDULER_RECONCILE_SECONDS)
+                continue
+            try:
+                conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+                with conn.cursor() as cursor:
+                    cursor.execute(f"LISTEN {SCHEDULE_CHANGES_CHANNEL}")
+                # Changes made while we were not listening
+                self.wake()
+                while not self.stop_flag.is_set():
+                    # The timeout only bounds how long stop_flag goes unchecked; no query is sent
+                    if select.select([conn], [], [], 5) == ([], [], []):
+                        continue
+                    conn.poll()
+                    if conn.notifies:
+                        conn.notifies.clear()
+                        self.wake()
+            except Exception as e:
+                logger.error(f"Schedule change listener error: {e}")
+                self.stop_flag.wait(SCHEDULER_RETRY_SECONDS)
+            finally:
+                conn.close()
     
     def _check_schedules(self):
-        """Check for scheduled reports that need to be sent"""
+        """Queue an outbox run for every due schedule and advance its next run time.
+
+        Sending happens in the outbox workers, so a failed send is retried there instead of
+        being lost, and a schedule that was overdue for any length of time still runs once.
+        """
         logger.info("Checking for due schedules...")
         conn = get_db_connection()
         if not conn:
             logger.error("Failed to connect to database in scheduler loop")
             return
 
+        queued = 0
         try:
             with conn.cursor(cursor_factory=DictCursor) as cursor:
                 cursor.execute("""
                     SELECT * FROM scheduled_reports
                         WHERE active = TRUE
                         AND next_run_time <= NOW()
-                        AND next_run_time >= NOW() - INTERVAL '10 minutes'
                     ORDER BY next_run_time ASC
                     FOR UPDATE SKIP LOCKED
                 """)
                 schedules = cursor.fetchall()
                 logger.info(f"Found {len(schedules)} schedules due to run")
                 
+                # One transaction keeps every claimed row locked until all runs are queued
                 for schedule_row in schedules:
                     schedule_data = dict(schedule_row)
+                    cursor.execute("SAVEPOINT schedule_run")
                     try:
-                        # Process this scheduled report
-                        self._process_schedule(schedule_data)
+                        recipients = schedule_data['recipients']
+                        if isinstance(recipients, str):
+                            try:
+                                recipients = json.loads(recipients)
+                            except Exception:
+                                recipients = [recipients]
+                        run_id = enqueue_schedule_run(cursor, schedule_data, recipients)
                         
-                        # Update the next run time
+                        # Update the next run time; one-time schedules are disabled here, in the
+                        # transaction that holds their row lock
                         next_run = self._calculate_next_run(schedule_data)
-                        
-                        # Update the schedule in the database
                         cursor.execute("""
                             UPDATE scheduled_reports
                             SET next_run_time = %s,
                                 last_run = NOW(),
                                 run_count = run_count + 1,
+                                active = %s,
                                 updated_at = NOW()
                             WHERE id = %s
-                        """, (next_run, schedule_data['id']))
-                        conn.commit()
+                        """, (next_run, schedule_data['frequency'] != 'once', schedule_data['id']))
+                        cursor.execute("RELEASE SAVEPOINT schedule_run")
+                        queued += 1
+                        logger.info(f"Queued run {run_id} of schedule {schedule_data['id']} for {len(recipients)} recipients")
                         
                     except Exception as e:
-                        logger.error(f"Error processing schedule {schedule_data['id']}: {e}")
-                        conn.rollback()
+                        logger.error(f"Error queueing schedule {schedule_data['id']}: {e}")
+                        cursor.execute("ROLLBACK TO SAVEPOINT schedule_run")
                         
                         # Log the error in the email_logs table
                         cursor.execute("""
@@ -235,63 +386,41 @@ class EmailScheduler:
                             len(schedule_data['recipients']), 
                             str(e)
                         ))
-                        conn.commit()
+                conn.commit()
                 
         except Exception as e:
+            conn.rollback()
             logger.error(f"Error checking schedules: {e}")
         finally:
             conn.close()
+        
+        if queued:
+            self.outbox.wake()
     
-    def _process_schedule(self, schedule_data):
-        """Process a scheduled report - generate and send emails"""
-        # Generate a fresh report
-        report_builder = ReportBuilder()
-        report_path = report_builder.generate_report()
+    def _send_outbox_run(self, rows):
+        """Send one queued run to its claimed recipients; used by the outbox workers"""
+        # Schedules firing against unchanged data share one build of the report
+        report_path, data_version = get_or_build_report()
         
         if not report_path or not os.path.exists(report_path):
             raise Exception("Failed to generate report")
         
-        # Send emails to all recipients
-        recipients = schedule_data['recipients']
-        if isinstance(recipients, str):
-            try:
-                recipients = json.loads(recipients)
-            except Exception:
-                recipients = [recipients]
-
-        subject = schedule_data['subject']
-        message = schedule_data['message'] or "Please find attached the latest business intelligence report."
-        template_id = schedule_data.get('template_id', 'default')
-        
-        # Send the report
-        self._send_report_email(report_path, recipients, subject, message, template_id)
-        
-        # Log the email send in the database
-        conn = get_db_connection()
-        if conn:
-            try:
-                with conn.cursor() as cursor:
-                    cursor.execute("""
-                        INSERT INTO email_logs 
-                        (id, scheduled_report_id, status, recipient_count, report_path)
-                        VALUES (%s, %s, %s, %s, %s)
-                    """, (
-                        str(uuid.uuid4()), 
-                        str(schedule_data['id']), 
-                        'SUCCESS', 
-                        len(recipients), 
-                        report_path
-                    ))
-                    conn.commit()
-            except Exception as e:
-                logger.error(f"Error logging email send: {e}")
-            finally:
-                conn.close()
-        
-        logger.info(f"Report {report_path} sent to {len(recipients)} recipients for schedule {schedule_data['id']}")
+        first = rows[0]
+        message = first['message'] or "Please find attached the latest business intelligence report."
+        results = self._deliver_report_email(
+            report_path, [row['recipient'] for row in rows], first['subject'], message, first['template_id'] or 'default'
+        )
+        return results, report_path, data_version
     
     def _send_report_email(self, report_path, recipients, subject, message, template_id='default'):
-        """Send the report email to all recipients"""
+        """Send the report email to all recipients, raising if none of them could be reached"""
+        results = self._deliver_report_email(report_path, recipients, subject, message, template_id)
+        if not any(result["status"] == "sent" for result in results):
+            raise Exception(f"Report email could not be delivered to any of {len(results)} recipients")
+        return results
+    
+    def _deliver_report_email(self, report_path, recipients, subject, message, template_id='default'):
+        """Send the report email to all recipients; returns a status dict per recipient"""
         
         # Prepare the HTML email template
         html_content = self._get_email_template(template_id)
@@ -300,66 +429,31 @@ class EmailScheduler:
         html_content = html_content.replace('{{CURRENT_DATE}}', datetime.now().strftime("%B %d, %Y"))
         html_content = html_content.replace('{{SUBJECT}}', subject)
         
-        # Log email attempt
-        logger.info(f"Attempting to send report email to {len(recipients)} recipients")
+        # Check if report file exists
+        if not os.path.exists(report_path):
+            logger.error(f"Report file not found: {report_path}")
+            raise FileNotFoundError(f"Report file not found: {report_path}")
+        
+        logger.info(f"Attempting to send report email to {len(recipients)} recipients "
+                    f"({os.path.getsize(report_path)} byte report)")
         logger.debug(f"Email configuration: SMTP={SMTP_SERVER}:{SMTP_PORT}, From={DEFAULT_FROM_EMAIL}")
         
-        try:
-            # Create a multipart message
-            msg = MIMEMultipart()
-            msg['Subject'] = subject
-            msg['From'] = DEFAULT_FROM_EMAIL
-            
-            # Attach the HTML content
-            msg.attach(MIMEText(html_content, 'html'))
-            
-            # Check if report file exists
-            if not os.path.exists(report_path):
-                logger.error(f"Report file not found: {report_path}")
-                raise FileNotFoundError(f"Report file not found: {report_path}")
-            
-            # Log file size
-            file_size = os.path.getsize(report_path)
-            logger.info(f"Report file size: {file_size} bytes")
-            
-            # Attach the report PDF
-            with open(report_path, 'rb') as f:
-                attachment = MIMEApplication(f.read(), _subtype="pdf")
-                attachment.add_header('Content-Disposition', 'attachment', 
-                                    filename=os.path.basename(report_path))
-                msg.attach(attachment)
-            
-            # Connect to the SMTP server with more detailed logging
-            logger.info(f"Connecting to SMTP server {SMTP_SERVER}:{SMTP_PORT}")
-            server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT)
-            server.set_debuglevel(1)  # Enable debug logging
-            
-            # Log TLS attempt
-            logger.info("Starting TLS")
-            server.starttls()
-            
-            # Log authentication
-            logger.info(f"Authenticating with username: {SMTP_USERNAME}")
-            server.login(SMTP_USERNAME, SMTP_PASSWORD)
-            
-            success_count = 0
-            # Send emails in batches to avoid sending to everyone in one go
-            for recipient in recipients:
-                try:
-                    logger.info(f"Sending email to: {recipient}")
-                    msg['To'] = recipient
-                    server.send_message(msg)
-                    del msg['To']  # Remove the recipient for the next iteration
-                    success_count += 1
-                except Exception as e:
-                    logger.error(f"Failed to send email to {recipient}: {e}")
-            
-            server.quit()
-            logger.info(f"Email sending complete. Sent to {success_count}/{len(recipients)} recipients")
-            
-        except Exception as e:
-            logger.error(f"Error sending report email: {str(e)}", exc_info=True)
-            raise
+        # The PDF is encoded once and sent over pooled connections
+        prepared = PreparedMessage(DEFAULT_FROM_EMAIL, subject, html_content, 'html', report_path)
+        results = self._get_delivery_service().deliver(prepared, list(recipients), bcc=EMAIL_BCC_MODE)
+        for result in results:
+            if result["status"] != "sent":
+                logger.error(f"Failed to send email to {result['recipient']}: {result['error']}")
+        return results
+    
+    def _get_delivery_service(self):
+        """SMTP delivery service for the configured account, created on first send"""
+        with self.condition:
+            if self.delivery_service is None:
+                self.delivery_service = EmailDeliveryService(
+                    SMTPConnectionPool(SMTP_SERVER, SMTP_PORT, SMTP_USERNAME, SMTP_PASSWORD)
+                )
+            return self.delivery_service
     
     def _get_email_template(self, template_id='default'):
         """Get the HTML email template for the email"""
@@ -393,8 +487,7 @@ class EmailScheduler:
         current_time = datetime.now()
         
         if frequency == 'once':
-            # For one-time schedules, disable after running
-            self._disable_schedule(schedule_data['id'])
+            # One-time schedules are disabled by the caller after running
             return current_time  # Return current time as it won't be used
             
         elif frequency == 'daily':
@@ -432,33 +525,32 @@ class EmailScheduler:
         else:
             # Default to daily if unknown frequency
             return current_time + timedelta(days=1)
-    
-    def _disable_schedule(self, schedule_id):
-        """Disable a schedule after it runs (for one-time schedules)"""
-        conn = get_db_connection()
-        if not conn:
-            logger.error("Failed to connect to database to disable schedule")
-            return
-            
-        try:
-            with conn.cursor() as cursor:
-                cursor.execute("""
-                    UPDATE scheduled_reports
-                    SET active = FALSE, updated_at = NOW()
-                    WHERE id = %s
-                """, (schedule_id,))
-                conn.commit()
-                logger.info(f"Disabled one-time schedule {schedule_id}")
-        except Exception as e:
-            logger.error(f"Error disabling schedule {schedule_id}: {e}")
-        finally:
-            conn.close()
 
 # Create a singleton instance of the scheduler
 email_scheduler = EmailScheduler()
 
-# Start the scheduler when the module is imported
-email_scheduler.start_scheduler()
+# Only the elected leader enqueues due schedules; another process takes over if it dies
+scheduler_leader = LeaderElection("email_scheduler", email_scheduler.start_scheduler, email_scheduler.stop_scheduler)
+
+
+def start_email_services():
+    """Start the outbox workers and join the scheduler leader election.
+
+    Nothing starts at import; processes opt in through data.create_app / BACKGROUND_SERVICES.
+    """
+    ensure_database()
+    email_scheduler.outbox.start()
+    scheduler_leader.start()
+
+
+def stop_email_services():
+    scheduler_leader.stop()
+    email_scheduler.outbox.stop()
+
+
+@schedule_email_bp.before_request
+def ensure_schedule_tables():
+    ensure_database()
 
 # Flask routes for schedule management
 @schedule_email_bp.route('/schedule-report', methods=['POST'])
@@ -554,7 +646,9 @@ def schedule_report():
                     start_time,
                     end_time
                 ))
+                notify_schedules_changed(cursor)
                 conn.commit()
+                email_scheduler.wake()
                 
                 return jsonify({
                     "status": "success",
@@ -653,8 +747,10 @@ def manage_schedule(schedule_id):
                     
                     if cursor.rowcount == 0:
                         return jsonify({"status": "error", "message": "Schedule not found"}), 404
-                        
+                    
+                    notify_schedules_changed(cursor)
                     conn.commit()
+                    email_scheduler.wake()
                     return jsonify({
                         "status": "success",
                         "message": "Schedule deleted successfully"
@@ -750,9 +846,7 @@ def send_test_email():
         message = data.get('message', 'This is a test email from InventorySync with the latest business report attached.')
         template_id = data.get('template_id', 'default')
         
-        # Generate a fresh report
-        report_builder = ReportBuilder()
-        report_path = report_builder.generate_report()
+        report_path, data_version = get_or_build_report()
         
         if not report_path or not os.path.exists(report_path):
             return jsonify({"status": "error", "message": "Failed to generate report"}), 500
@@ -4,14 +4,77 @@ import pandas as pd
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
 import os
+import hashlib
 import tempfile
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from dotenv import load_dotenv
+from leader_election import LeaderElection
+from ingestion_trigger import IngestionTrigger, AZURE_INGEST_TRIGGER, AZURE_RECONCILE_MINUTES
 # Remove the circular import
 # from data import preprocess_data, upload_to_database, save_preprocessed_file, enforce_retention_policy, FlaskLogger
 
 load_dotenv()
 logger = logging.getLogger(__name__)
 
+# Blobs downloaded concurrently while a batch is ingested
+AZURE_INGEST_DOWNLOAD_WORKERS = int(os.getenv("AZURE_INGEST_DOWNLOAD_WORKERS", "4"))
+# Processes running the pandas preprocessing (0 preprocesses on the download threads)
+AZURE_INGEST_PROCESSES = int(os.getenv("AZURE_INGEST_PROCESSES", str(min(4, os.cpu_count() or 1))))
+# How often blobs tagged as processed are archived to the processed container ("tag" strategy)
+AZURE_ARCHIVE_INTERVAL_MINUTES = float(os.getenv("AZURE_ARCHIVE_INTERVAL_MINUTES", "15"))
+
+
+def _preprocess_file(source, selected_date, source_name):
+    """Preprocess one downloaded blob (buffer or file path); may run in a worker process, so
+    the logs are returned"""
+    from preprocessing import FlaskLogger, preprocess_data
+    log_output = FlaskLogger()
+    df = preprocess_data(source, selected_date, log_output, source_name)
+    return df, log_output.logs
+
+
+def _result_checksum(df):
+    """SHA-256 of the preprocessed rows, stored on the blob's processed tag"""
+    return hashlib.sha256(pd.util.hash_pandas_object(df, index=False).values.tobytes()).hexdigest()
+
+
+_preprocess_pool = None
+_preprocess_pool_lock = threading.Lock()
+
+
+def get_preprocess_pool():
+    """Worker processes for preprocessing, or None to preprocess on the download threads.
+
+    One pool of spawned processes shared by every batch, as report_builder.get_chart_pool:
+    the scheduler, leader election and request threads make forking unsafe.
+    """
+    global _preprocess_pool
+    with _preprocess_pool_lock:
+        # A worker that died leaves the pool broken; replace it
+        if _preprocess_pool is not None and getattr(_preprocess_pool, "_broken", False):
+            _preprocess_pool = None
+        if _preprocess_pool is None and AZURE_INGEST_PROCESSES > 0:
+            try:
+                pool = ProcessPoolExecutor(
+                    max_workers=AZURE_INGEST_PROCESSES,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+                pool.submit(int).result()  # Start a worker now rather than in the first batch
+                _preprocess_pool = pool
+            except Exception as e:
+                logger.warning(f"Preprocess process pool unavailable, preprocessing on download threads: {e}")
+        return _preprocess_pool
+
+
+def shutdown_preprocess_pool():
+    global _preprocess_pool
+    with _preprocess_pool_lock:
+        if _preprocess_pool is not None:
+            _preprocess_pool.shutdown()
+            _preprocess_pool = None
+
 class InventoryScheduler:
     def __init__(self, app=None):
         self.scheduler = BackgroundScheduler()
@@ -20,18 +83,36 @@ class InventoryScheduler:
         self.azure_storage = AzureBlobStorage()
         self.app = app
         self.processing_files = set()  # Track files currently being processed
+        self.processing_lock = threading.Lock()
+        # Blob-created events ingest new files as they arrive; None keeps listing polls only
+        self.trigger = IngestionTrigger(self.azure_storage, self.ingest_files) if AZURE_INGEST_TRIGGER != "poll" else None
+        # Every process keeps the jobs paused; only the elected leader resumes them
+        self.leader = LeaderElection("azure_file_sync", self._on_elected, self._on_demoted)
         
         # Configuration: Set to True for production, False for testing
         self.production_mode = os.getenv("AZURE_MONITORING_PRODUCTION", "true").lower() == "true"
         
     def start(self):
         """Start the scheduler with production or testing configuration"""
-        if self.production_mode:
+        if self.trigger is not None:
+            # EVENT MODE: the listing poll only reconciles events that were missed
+            self.scheduler.add_job(
+                self.check_for_new_files,
+                'interval',
+                minutes=AZURE_RECONCILE_MINUTES,
+                id='azure_file_sync_reconcile',
+                coalesce=True
+            )
+            logger.info(f"Starting scheduler - EVENT MODE ({AZURE_INGEST_TRIGGER}): reconciling every {AZURE_RECONCILE_MINUTES:g} minutes")
+        elif self.production_mode:
             # PRODUCTION MODE: Scheduled at 12:15 AM daily
             self.scheduler.add_job(
                 self.check_for_new_files,
                 CronTrigger(hour=0, minute=15),  # 12:15 AM
-                id='azure_file_sync_production'
+                id='azure_file_sync_production',
+                # A process taking over shortly after a failed leader still runs the missed sync
+                misfire_grace_time=3600,
+                coalesce=True
             )
             logger.info("Starting scheduler - PRODUCTION MODE: Daily at 12:15 AM")
         else:
@@ -43,7 +124,28 @@ class InventoryScheduler:
                 id='azure_file_sync_testing'
             )
             logger.info("Starting scheduler - TESTING MODE: Continuous monitoring every 30 seconds")
-            self.scheduler.start()
+        if self.azure_storage.mark_strategy == "tag":
+            # Tagged blobs are copied to the processed container off the ingest path
+            self.scheduler.add_job(
+                self.archive_processed_files,
+                'interval',
+                minutes=AZURE_ARCHIVE_INTERVAL_MINUTES,
+                id='azure_archive_processed',
+                coalesce=True
+            )
+        get_preprocess_pool()
+        self.scheduler.start(paused=True)
+        self.leader.start()
+
+    def _on_elected(self):
+        self.scheduler.resume()
+        if self.trigger is not None:
+            self.trigger.start()
+
+    def _on_demoted(self):
+        self.scheduler.pause()
+        if self.trigger is not None:
+            self.trigger.stop()
         
     def check_for_new_files(self):
         """Check for new files in Azure Blob Storage and process them"""
@@ -58,34 +160,35 @@ class InventoryScheduler:
                 return
                 
             logger.info(f"Found {len(files)} files to process")
-            
-            for file_name in files:
-                # Skip if file is already being processed
-                if file_name in self.processing_files:
-                    logger.info(f"Skipping {file_name} - already being processed")
-                    continue
-                    
-                logger.info(f"Processing {file_name}...")
-                try:
-                    success = self.process_azure_file(file_name)
-                    if success:
-                        logger.info(f"Successfully completed processing {file_name}")
-                    else:
-                        logger.error(f"Failed to process {file_name}")
-                except Exception as e:
-                    logger.error(f"Error processing {file_name}: {str(e)}")
-                    # Remove from processing set if there was an error
-                    self.processing_files.discard(file_name)
+            self.ingest_files(files)
                     
         except Exception as e:
             logger.error(f"Error in check_for_new_files: {str(e)}")
+
+    def ingest_files(self, files):
+        """Ingest files found by a poll or announced by blob events, while this process leads"""
+        results = self.ingest_batch(files, require_leader=True)
+        for file_name, success in results.items():
+            if success:
+                logger.info(f"Successfully completed processing {file_name}")
+            else:
+                logger.error(f"Failed to process {file_name}")
     
+    def archive_processed_files(self):
+        """Background batch of the "tag" strategy: move tagged blobs to the processed container"""
+        try:
+            self.azure_storage.archive_processed()
+        except Exception as e:
+            logger.error(f"Error in archive_processed_files: {str(e)}")
+
     def get_status(self):
         """Get current scheduler status"""
         try:
             return {
                 "running": self.scheduler.running,
+                "leader": self.leader.is_leader,
                 "mode": "production" if self.production_mode else "testing",
+                "trigger": AZURE_INGEST_TRIGGER,
                 "jobs": len(self.scheduler.get_jobs()),
                 "processing_files": list(self.processing_files),
                 "next_run": str(self.scheduler.get_jobs()[0].next_run_time) if self.scheduler.get_jobs() else None
@@ -100,72 +203,141 @@ class InventoryScheduler:
         if blob_name in self.processing_files:
             logger.warning(f"File {blob_name} is already being processed, skipping")
             return False
-            
-        # Mark file as being processed
-        self.processing_files.add(blob_name)
-        
-        try:
-            return self._process_file_internal(blob_name)
-        finally:
-            # Always remove from processing set when done
-            self.processing_files.discard(blob_name)
-            
-            
-    def _process_file_internal(self, blob_name):
-        from data import FlaskLogger
+        # An event or poll may claim the blob after the check; ingest_batch then skips it
+        return self.ingest_batch([blob_name]).get(blob_name, False)
+
+    def ingest_batch(self, blob_names, require_leader=False):
+        """Ingest several blobs with the manual upload flow; returns {blob_name: success}.
+
+        Downloads run on threads and preprocessing in worker processes, both overlapping
+        with the commits. Commits (local files, daily diff, Neon upload) run one blob at a
+        time in list order; the local SQLite copy, ABC classes and insights are refreshed
+        once at the end of the batch instead of after every file.
+        """
+        from data import FlaskLogger, update_local_sqlite
+        from abc_classification import run_abc_classification
+        from insights import materialize_insights
+
+        # Skip files already being processed; events and reconciliation polls can overlap
+        with self.processing_lock:
+            blob_names = [name for name in blob_names if name not in self.processing_files]
+            self.processing_files.update(blob_names)
         log_output = FlaskLogger()
-        log_output.info(f"Starting automated processing of Azure file: {blob_name}")
+        results = {name: False for name in blob_names}
+        committed = []
+        checksums = {}
+
+        # Preprocessed files are named to the second, so every blob gets its own second
+        start = pd.Timestamp.now()
+        selected_dates = {name: start + pd.Timedelta(seconds=i) for i, name in enumerate(blob_names)}
+        log_output.info(f"Starting automated processing of {len(blob_names)} Azure files")
 
+        preprocess_pool = get_preprocess_pool() if len(blob_names) > 1 else None
         try:
-            selected_date = pd.Timestamp.now()  # Use current date for Azure uploads
-            log_output.info(f"Using current date for processing: {selected_date}")
-
-            with tempfile.TemporaryDirectory() as temp_dir:
-                # 1. Download file from Azure to temp
-                local_file_path = self.azure_storage.download_file(blob_name, temp_dir)
-                if not local_file_path:
-                    log_output.error(f"Failed to download {blob_name}")
-                    return False
-
-                # 2. Preprocess the data
-                from data import preprocess_data, save_preprocessed_file, enforce_retention_policy, upload_to_database, update_local_sqlite
-                df = preprocess_data(local_file_path, selected_date, log_output)
-                if df is None:
-                    log_output.error(f"Failed to preprocess {blob_name}")
-                    return False
-
-                # 3. Save preprocessed file (creates salesninventory_YYMMDD.xlsx)
-                preprocessed_path = save_preprocessed_file(df, selected_date, log_output)
-                if not preprocessed_path:
-                    log_output.error(f"Failed to save preprocessed file for {blob_name}")
-                    return False
-
-                # 4. Enforce retention policy
-                enforce_retention_policy(log_output)
-
-                # 5. Upload to Neon DB
-                results = upload_to_database(df, selected_date, log_output)
-                if not results:
-                    log_output.error(f"Failed to upload data to database for {blob_name}")
-                    return False
-
-                # 6. Update local SQLite DB
-                update_local_sqlite(log_output)
-
-                # 7. Move file to processed container in Azure
-                move_success = self.azure_storage.move_to_processed(blob_name)
-                if not move_success:
-                    log_output.error(f"Failed to move {blob_name} to processed container")
-                    return False
-
-                log_output.info(f"Successfully processed Azure file: {blob_name}")
-                return True
+            with tempfile.TemporaryDirectory() as temp_dir, \
+                    ThreadPoolExecutor(max_workers=AZURE_INGEST_DOWNLOAD_WORKERS, thread_name_prefix="azure-ingest") as io_pool:
+                prepared = {
+                    name: io_pool.submit(self._download_and_preprocess, name, selected_dates[name],
+                                         temp_dir, preprocess_pool)
+                    for name in blob_names
+                }
+                for name in blob_names:
+                    if require_leader and not self.leader.is_leader:
+                        log_output.warning("No longer the leader for Azure file sync, leaving remaining files")
+                        break
+                    try:
+                        df, logs = prepared[name].result()
+                        log_output.logs.extend(logs)
+                        if df is None:
+                            log_output.error(f"Failed to download or preprocess {name}")
+                        elif self._commit_file(name, df, selected_dates[name], log_output):
+                            committed.append(name)
+                            checksums[name] = _result_checksum(df)
+                    except Exception as e:
+                        log_output.error(f"Error processing Azure file {name}: {str(e)}")
+
+                if committed:
+                    update_local_sqlite(log_output)
+                    # Refresh ABC classes once per uploaded month
+                    months = {selected_dates[name].strftime('%Y-%m'): selected_dates[name] for name in committed}
+                    for selected_date in months.values():
+                        run_abc_classification(log_output, selected_date)
+                    materialize_insights(log_output)
 
+                    if self.azure_storage.mark_strategy == "tag":
+                        # One tag request per blob; archive_processed_files moves them later
+                        marked = io_pool.map(
+                            lambda name: self.azure_storage.tag_as_processed(name, checksums[name]), committed
+                        )
+                    else:
+                        # Server-side copies are waited on one by one, so move the blobs side by side
+                        marked = io_pool.map(self.azure_storage.move_to_processed, committed)
+                    for name, moved in zip(committed, marked):
+                        results[name] = moved
+                        if not moved:
+                            log_output.error(f"Failed to mark {name} as processed ({self.azure_storage.mark_strategy})")
         except Exception as e:
-            log_output.error(f"Error processing Azure file {blob_name}: {str(e)}")
+            log_output.error(f"Error processing Azure batch: {str(e)}")
             import traceback
             log_output.error(f"Traceback: {traceback.format_exc()}")
+        finally:
+            with self.processing_lock:
+                self.processing_files.difference_update(blob_names)
+
+        for name in blob_names:
+            if name not in committed:
+                # Retried on the next poll; never overwrites a recorded success for this content
+                self.azure_storage.record_result(name, "failed")
+        log_output.info(f"Azure batch complete: {len(committed)}/{len(blob_names)} files ingested")
+        return results
+
+    def _download_and_preprocess(self, blob_name, selected_date, spill_dir, preprocess_pool):
+        """Runs on a download thread; returns (df or None, preprocessing logs).
+
+        Blobs are read straight from memory; only those above the memory limit go to spill_dir.
+        """
+        source = self.azure_storage.download_to_buffer(blob_name, spill_dir)
+        if source is None:
+            return None, []
+        try:
+            if preprocess_pool is None:
+                return _preprocess_file(source, selected_date, blob_name)
+            return preprocess_pool.submit(_preprocess_file, source, selected_date, blob_name).result()
+        finally:
+            if isinstance(source, str):
+                os.remove(source)
+
+    def _commit_file(self, blob_name, df, selected_date, log_output):
+        """Local files, daily diff and Neon upload for one preprocessed blob"""
+        from data import save_preprocessed_file, enforce_retention_policy, upload_to_database, append_azure_log
+        from anomaly_detection import detect_upload_anomalies, describe_anomaly, record_upload_totals
+        from daily_diff import update_daily_diff
+
+        # Flag totals that break from earlier uploads; detection never blocks ingestion, and
+        # the statistics are only updated once the upload is committed
+        for anomaly in detect_upload_anomalies(df, log_output):
+            append_azure_log(f"{blob_name}: {describe_anomaly(anomaly)}", level="WARNING")
+
+        # Save preprocessed file (creates salesninventory_YYMMDD.xlsx)
+        preprocessed_path = save_preprocessed_file(df, selected_date, log_output)
+        if not preprocessed_path:
+            log_output.error(f"Failed to save preprocessed file for {blob_name}")
+            return False
+
+        # Per-SKU changes against the previous daily file
+        update_daily_diff(df, preprocessed_path, log_output)
+        enforce_retention_policy(log_output)
+
+        # Upload to Neon DB; uploads for the same month are serialized inside
+        if not upload_to_database(df, selected_date, log_output):
+            log_output.error(f"Failed to upload data to database for {blob_name}")
             return False
+        record_upload_totals(df, log_output)
+
+        # The data is in; record it before the move so a failed move never re-ingests it
+        self.azure_storage.record_result(blob_name, "processed")
+        log_output.info(f"Ingested Azure file: {blob_name}")
+        return True
 
 
     def _force_move_file(self, blob_name, log_output):
@@ -194,8 +366,10 @@ class InventoryScheduler:
 
 
     def stop(self):
-        """Stop the scheduler"""
+        """Stop the scheduler and hand leadership to another process"""
+        self.leader.stop()
         self.scheduler.shutdown()
+        shutdown_preprocess_pool()
         logger.info("Scheduler stopped")
 
 
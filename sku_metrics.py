@@ -0,0 +1,205 @@
+# sku_metrics.py - Vectorized per-SKU sell-through, inventory and velocity metrics
+import os
+import re
+import glob
+import threading
+import numpy as np
+import pandas as pd
+from flask import Blueprint, request, jsonify
+from dataset_version import get_dataset_version
+
+# Blueprint setup for Flask
+sku_metrics_bp = Blueprint('sku_metrics', __name__)
+
+PROCESSED_DIR = "processed_data"
+MASTER_SUMMARY_FILE = "master_summary.xlsx"
+DAILY_FILE_PATTERN = re.compile(r"salesninventory_(\d{6})(?:_\d{6})?\.xlsx$")
+
+SKU_KEYS = ["Brand", "Category", "Size", "Color"]
+METRIC_COLUMNS = [
+    "brand", "category", "size", "color", "mrp",
+    "sales_qty", "purchase_qty", "inventory", "sell_through_pct",
+    "daily_sales_qty", "daily_velocity", "daily_sales_std", "days_to_sellout", "stock_value", "oversold",
+]
+MAX_LIMIT = 1000
+
+_cache = {"version": None, "metrics": None}
+_cache_lock = threading.Lock()
+
+
+def compute_sku_metrics(codes, n_skus, is_master, sales, purchases, mrp, window_days, day_codes=None):
+    """Aggregate row-level quantities into per-SKU metric arrays in one pass.
+
+    codes maps each input row (master summary and daily files together) to its SKU.
+    Master rows carry the cumulative month-to-date quantities; daily rows carry the
+    quantities of one upload and only feed the velocity. Velocity falls back to the
+    master sales when no daily file covers the SKU. day_codes (0..window_days-1 for
+    daily rows) enables the standard deviation of daily sales, which needs two days.
+    """
+    master_weight = is_master.astype(np.float64)
+    daily_weight = 1.0 - master_weight
+    sales = sales.astype(np.float64)
+
+    sales_qty = np.bincount(codes, weights=sales * master_weight, minlength=n_skus)
+    purchase_qty = np.bincount(codes, weights=purchases.astype(np.float64) * master_weight, minlength=n_skus)
+    daily_sales = np.bincount(codes, weights=sales * daily_weight, minlength=n_skus)
+    daily_rows = np.bincount(codes, weights=daily_weight, minlength=n_skus)
+
+    # MRP is a per-SKU attribute; keep the highest value seen in any source
+    sku_mrp = np.zeros(n_skus)
+    np.maximum.at(sku_mrp, codes, np.nan_to_num(mrp.astype(np.float64)))
+
+    daily_std = np.full(n_skus, np.nan)
+    daily_mask = ~is_master
+    if day_codes is not None and window_days >= 2 and daily_mask.any():
+        # Sum uploads per (SKU, day) first; days without sales count as zero
+        pairs = codes[daily_mask].astype(np.int64) * window_days + day_codes[daily_mask]
+        unique_pairs, pair_index = np.unique(pairs, return_inverse=True)
+        day_totals = np.bincount(pair_index, weights=sales[daily_mask])
+        sum_squares = np.bincount(unique_pairs // window_days, weights=day_totals ** 2, minlength=n_skus)
+        mean = daily_sales / window_days
+        variance = np.clip(sum_squares / window_days - mean ** 2, 0, None)
+        daily_std = np.where(daily_rows > 0, np.sqrt(variance), np.nan)
+
+    inventory = purchase_qty - sales_qty
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sell_through = np.where(purchase_qty > 0, sales_qty * 100.0 / purchase_qty, np.nan)
+        velocity = np.where(daily_rows > 0, daily_sales, sales_qty) / max(window_days, 1)
+        days_to_sellout = np.where(
+            inventory <= 0,
+            0.0,  # Nothing left to sell (oversold SKUs included)
+            np.where(velocity > 0, inventory / velocity, np.nan)  # Not selling: never sells out
+        )
+
+    return {
+        "mrp": sku_mrp,
+        "sales_qty": sales_qty,
+        "purchase_qty": purchase_qty,
+        "inventory": inventory,
+        "sell_through_pct": np.round(sell_through, 2),
+        "daily_sales_qty": daily_sales,
+        "daily_velocity": np.round(velocity, 4),
+        "daily_sales_std": np.round(daily_std, 4),
+        "days_to_sellout": np.round(days_to_sellout, 1),
+        "stock_value": np.round(np.clip(inventory, 0, None) * sku_mrp, 2),
+        "oversold": inventory < 0,
+    }
+
+
+def _read_sku_rows(path):
+    df = pd.read_excel(path, usecols=SKU_KEYS + ["MRP", "SalesQty", "PurchaseQty"])
+    df = df[df["Brand"].astype(str).str.strip().str.lower() != "grand total"]
+    for key in SKU_KEYS:
+        df[key] = df[key].fillna("").astype(str).str.strip().str.lower()
+    for col in ["MRP", "SalesQty", "PurchaseQty"]:
+        df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0)
+    return df
+
+
+def build_sku_metrics(processed_dir=PROCESSED_DIR):
+    """Per-SKU metrics over master_summary.xlsx and the daily salesninventory files"""
+    frames = []
+    master_file = os.path.join(processed_dir, MASTER_SUMMARY_FILE)
+    if os.path.exists(master_file):
+        master_df = _read_sku_rows(master_file)
+        master_df["is_master"] = True
+        frames.append(master_df)
+
+    daily_days = {}
+    for path in glob.glob(os.path.join(processed_dir, "salesninventory_*.xlsx")):
+        match = DAILY_FILE_PATTERN.search(os.path.basename(path))
+        if not match:
+            continue
+        daily_df = _read_sku_rows(path)
+        daily_df["is_master"] = False
+        # Several uploads on the same day count as one day of sales
+        daily_df["day"] = daily_days.setdefault(match.group(1), len(daily_days))
+        frames.append(daily_df)
+
+    if not frames:
+        return pd.DataFrame(columns=METRIC_COLUMNS)
+
+    rows = pd.concat(frames, ignore_index=True)
+    grouped = rows.groupby(SKU_KEYS, sort=False)
+    codes = grouped.ngroup().to_numpy()
+    keys = grouped.size().index.to_frame(index=False)
+    window_days = len(daily_days) or 30
+    day_codes = rows["day"].fillna(-1).to_numpy(np.int64) if daily_days else None
+
+    metrics = compute_sku_metrics(
+        codes, len(keys), rows["is_master"].to_numpy(),
+        rows["SalesQty"].to_numpy(), rows["PurchaseQty"].to_numpy(), rows["MRP"].to_numpy(),
+        window_days, day_codes,
+    )
+    result = pd.DataFrame({
+        "brand": keys["Brand"].to_numpy(),
+        "category": keys["Category"].to_numpy(),
+        "size": keys["Size"].to_numpy(),
+        "color": keys["Color"].to_numpy(),
+        **metrics,
+    })
+    return result[METRIC_COLUMNS]
+
+
+def get_sku_metrics():
+    """Cached metrics for the current processed data, rebuilt when the dataset version changes"""
+    version = get_dataset_version()
+    with _cache_lock:
+        if _cache["version"] != version:
+            _cache["metrics"] = build_sku_metrics()
+            _cache["version"] = version
+        return _cache["metrics"], version
+
+
+def filter_sku_metrics(metrics, args):
+    """Apply the /metrics/sku query-string filters, sort order and paging"""
+    mask = np.ones(len(metrics), dtype=bool)
+    for key in ["brand", "category", "size", "color"]:
+        value = args.get(key)
+        if value:
+            mask &= metrics[key].to_numpy() == value.strip().lower()
+
+    ranges = {
+        "min_sell_through": ("sell_through_pct", np.greater_equal),
+        "max_sell_through": ("sell_through_pct", np.less_equal),
+        "min_days_to_sellout": ("days_to_sellout", np.greater_equal),
+        "max_days_to_sellout": ("days_to_sellout", np.less_equal),
+        "min_inventory": ("inventory", np.greater_equal),
+    }
+    for arg, (column, compare) in ranges.items():
+        value = args.get(arg)
+        if value is not None:
+            mask &= compare(metrics[column].to_numpy(), float(value))
+    if args.get("oversold", "").lower() in ("1", "true", "yes"):
+        mask &= metrics["oversold"].to_numpy()
+
+    sort = args.get("sort", "days_to_sellout")
+    if sort not in METRIC_COLUMNS:
+        raise ValueError(f"Unknown sort column '{sort}'")
+    ascending = args.get("order", "asc").lower() != "desc"
+    limit = min(int(args.get("limit", 100)), MAX_LIMIT)
+    offset = max(int(args.get("offset", 0)), 0)
+
+    filtered = metrics[mask]
+    ordered = filtered.sort_values(sort, ascending=ascending, na_position="last", kind="stable")
+    return ordered.iloc[offset:offset + limit], len(filtered)
+
+
+@sku_metrics_bp.route('/metrics/sku', methods=['GET'])
+def sku_metrics_route():
+    try:
+        metrics, version = get_sku_metrics()
+        page, total = filter_sku_metrics(metrics, request.args)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        return jsonify({"status": "error", "message": f"Error computing SKU metrics: {str(e)}"}), 500
+
+    # NaN (no purchases / never sells out) becomes null in the JSON response
+    records = page.astype(object).where(page.notna(), None).to_dict(orient="records")
+    return jsonify({
+        "status": "success",
+        "data_version": version,
+        "total": total,
+        "data": records,
+    })
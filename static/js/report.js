@@ -202,7 +202,7 @@ function generateReport() {
     </div>
     `;
 
-    // Send request to generate report
+    // Queue the report; generation runs in the background and is polled for progress
     fetch('/generate-report', {
         method: 'POST',
         headers: {
@@ -212,40 +212,86 @@ function generateReport() {
     })
     .then(response => response.json())
     .then(data => {
-        if (data.status === 'success') {
+        if (data.status === 'accepted') {
+            pollReportJob(data.status_url);
+        } else {
+            showGenerationError(data.message || "Failed to generate or email report.");
+            resetGenerateButton();
+        }
+    })
+    .catch(error => {
+        showToast("An error occurred while generating the report.", "error");
+        showError("An error occurred.");
+        resetGenerateButton();
+    });
+}
+
+/**
+ * Polls a report job until it completes or fails
+ * @param {string} statusUrl - URL of the job status endpoint
+ */
+function pollReportJob(statusUrl) {
+    const statusDiv = document.getElementById('generationStatus');
+
+    fetch(statusUrl)
+    .then(response => response.json())
+    .then(data => {
+        if (data.status !== 'success') {
+            showGenerationError(data.message || "Lost track of the report job.");
+            resetGenerateButton();
+            return;
+        }
+
+        const job = data.job;
+        if (job.status === 'completed') {
             statusDiv.innerHTML = `
             <div class="alert alert-success mt-3">
-                <i class="fas fa-check-circle"></i> Report generated successfully!
+                <i class="fas fa-check-circle"></i> ${job.message || "Report generated successfully!"}
                 <div class="mt-2">
-                    <a href="${data.download_url}" class="btn btn-sm btn-primary" download>
+                    <a href="${job.download_url}" class="btn btn-sm btn-primary" download>
                         <i class="fas fa-download"></i> Download Report
                     </a>
                 </div>
             </div>
             `;
+            resetGenerateButton();
+        } else if (job.status === 'failed') {
+            showGenerationError(job.message || "Failed to generate or email report.");
+            resetGenerateButton();
         } else {
-            showToast(data.message || "Failed to generate or email report.", "error");
             statusDiv.innerHTML = `
-            <div class="alert alert-danger mt-3">
-                <i class="fas fa-exclamation-circle"></i> ${data.message || "Failed to generate or email report."}
+            <div class="alert alert-info mt-3">
+                <i class="fas fa-info-circle"></i> Generating your business report (${job.percent}%)...
+                <div class="mt-1"><small>${job.message || ''}</small></div>
             </div>
             `;
+            setTimeout(() => pollReportJob(statusUrl), 2000);
         }
     })
     .catch(error => {
-        showToast("An error occurred while generating the report.", "error");
-        statusDiv.innerHTML = `
-        <div class="alert alert-danger mt-3">
-            <i class="fas fa-exclamation-circle"></i> An error occurred.
-        </div>
-        `;
-    })
-    .finally(() => {
-        generateBtn.disabled = false;
-        generateBtn.innerHTML = '<i class="fas fa-file-pdf"></i> Generate Business Report';
+        // Transient network errors should not abandon a running job
+        setTimeout(() => pollReportJob(statusUrl), 5000);
     });
 }
 
+/**
+ * Shows a report generation error as a toast and in the status area
+ * @param {string} message - Error message to display
+ */
+function showGenerationError(message) {
+    showToast(message, "error");
+    showError(message);
+}
+
+/**
+ * Restores the generate button after a job finishes
+ */
+function resetGenerateButton() {
+    const generateBtn = document.getElementById('generateReport');
+    generateBtn.disabled = false;
+    generateBtn.innerHTML = '<i class="fas fa-file-pdf"></i> Generate Business Report';
+}
+
 /**
  * Simple email validation
  */
@@ -0,0 +1,84 @@
+# azurite_mark_smoke.py - Tag-based "mark as processed" and background archival against Azurite
+# Start the emulator first: npx azurite --silent --location /tmp/azurite
+# Usage: python "testing scripts/azurite_mark_smoke.py" [blobs]
+#   AZURE_STORAGE_CONNECTION_STRING overrides the emulator's well-known development account.
+import os
+import sys
+import time
+import uuid
+import tempfile
+
+AZURITE_CONNECTION_STRING = (
+    "DefaultEndpointsProtocol=http;AccountName=devstoreaccount1;"
+    "AccountKey=Eby8vdM02xNOcqFlqUwJPLlmEtlCDXJ1OUzFT50uSRZ6IFsuFq2UVErCz4I6tq/K1SZFPTOtr/KBHBeksoGMGw==;"
+    "BlobEndpoint=http://127.0.0.1:10000/devstoreaccount1;"
+)
+
+# azure_storage reads its settings at import time
+run_id = uuid.uuid4().hex[:8]
+os.environ.setdefault("AZURE_STORAGE_CONNECTION_STRING", AZURITE_CONNECTION_STRING)
+os.environ["AZURE_STORAGE_CONTAINER_NAME"] = f"smoke-source-{run_id}"
+os.environ["AZURE_PROCESSED_CONTAINER_NAME"] = f"smoke-processed-{run_id}"
+os.environ["AZURE_MANIFEST_DB"] = os.path.join(tempfile.mkdtemp(), "azure_manifest.db")
+os.environ["AZURE_MARK_STRATEGY"] = "tag"
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from azure.storage.blob import BlobServiceClient
+from azure_storage import AzureBlobStorage
+
+
+def check(condition, message):
+    print(f"  {'ok  ' if condition else 'FAIL'} {message}")
+    if not condition:
+        raise SystemExit(1)
+
+
+def main():
+    blobs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    service = BlobServiceClient.from_connection_string(os.environ["AZURE_STORAGE_CONNECTION_STRING"])
+    source = service.create_container(os.environ["AZURE_STORAGE_CONTAINER_NAME"])
+    names = [f"store{i:03d}.xlsx" for i in range(blobs)]
+    for name in names:
+        source.upload_blob(name, os.urandom(64 * 1024))
+
+    try:
+        storage = AzureBlobStorage()
+        print(f"{blobs} blobs in {source.container_name}")
+        check(sorted(storage.list_unprocessed_files(advance=False)) == names, "all blobs listed as unprocessed")
+
+        tagged, moved = names[:blobs // 2], names[blobs // 2:]
+        start = time.perf_counter()
+        check(all(storage.tag_as_processed(name, "0" * 64) for name in tagged), "tagged half of the blobs")
+        tag_seconds = time.perf_counter() - start
+        check(sorted(storage.list_unprocessed_files(advance=False)) == moved, "tagged blobs left out of the listing")
+
+        # Overwriting clears the tags, so new content under a processed name is ingested again
+        source.upload_blob(tagged[0], os.urandom(64 * 1024), overwrite=True)
+        check(tagged[0] in storage.list_unprocessed_files(advance=False), "re-uploaded blob listed again")
+        storage.tag_as_processed(tagged[0])
+
+        # Setting metadata changes the etag but keeps the tags; the blob is no longer the tagged content
+        changed = tagged[-1]
+        source.get_blob_client(changed).set_blob_metadata({"edited": "true"})
+        check(changed in storage.list_unprocessed_files(advance=False), "blob changed after tagging listed again")
+
+        start = time.perf_counter()
+        check(all(storage.mark_as_processed(name) for name in moved), "moved the other half (copy + delete)")
+        move_seconds = time.perf_counter() - start
+
+        archived = storage.archive_processed()
+        remaining = [blob.name for blob in source.list_blobs()]
+        processed = [blob.name for blob in service.get_container_client(storage.processed_container_name).list_blobs()]
+        check(archived == len(tagged) - 1, f"archive batch moved {archived} tagged blobs")
+        check(remaining == [changed], "only the changed blob left in the source container")
+        check(len(processed) == blobs - 1, f"{len(processed)} blobs in {storage.processed_container_name}")
+
+        print(f"tag:  {tag_seconds / len(tagged) * 1000:.1f} ms per blob")
+        print(f"move: {move_seconds / len(moved) * 1000:.1f} ms per blob")
+    finally:
+        service.delete_container(os.environ["AZURE_STORAGE_CONTAINER_NAME"])
+        service.delete_container(os.environ["AZURE_PROCESSED_CONTAINER_NAME"])
+
+
+if __name__ == "__main__":
+    main()
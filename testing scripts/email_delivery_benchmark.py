@@ -0,0 +1,94 @@
+# email_delivery_benchmark.py - Compare per-recipient SMTP sessions with pooled delivery
+# Runs against a local aiosmtpd server (pip install aiosmtpd); no real mail is sent.
+# Usage: python "testing scripts/email_delivery_benchmark.py" [recipients] [pdf_size_kb]
+import os
+import sys
+import time
+import asyncio
+import smtplib
+import tempfile
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from email.mime.application import MIMEApplication
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from aiosmtpd.controller import Controller
+from email_delivery import EmailDeliveryService, SMTPConnectionPool, PreparedMessage
+
+HOST, PORT = "127.0.0.1", 8025
+# Simulated server-side latency per connection and per message, like a remote relay
+CONNECT_DELAY = 0.05
+DATA_DELAY = 0.02
+
+
+class SlowHandler:
+    def __init__(self):
+        self.messages = 0
+        self.recipients = 0
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        await asyncio.sleep(CONNECT_DELAY)
+        session.host_name = hostname
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):
+        await asyncio.sleep(DATA_DELAY)
+        self.messages += 1
+        self.recipients += len(envelope.rcpt_tos)
+        return "250 Message accepted for delivery"
+
+
+def send_one_session_per_recipient(report_path, recipients):
+    """The previous approach: a new SMTP session and a fresh MIME encoding per recipient"""
+    for recipient in recipients:
+        msg = MIMEMultipart()
+        msg['Subject'] = "Benchmark report"
+        msg['From'] = "reports@example.com"
+        msg['To'] = recipient
+        msg.attach(MIMEText("Report attached.", 'plain'))
+        with open(report_path, 'rb') as f:
+            part = MIMEApplication(f.read(), Name=os.path.basename(report_path))
+            part['Content-Disposition'] = f'attachment; filename="{os.path.basename(report_path)}"'
+            msg.attach(part)
+        with smtplib.SMTP(HOST, PORT) as server:
+            server.send_message(msg)
+
+
+def main():
+    n_recipients = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    pdf_kb = int(sys.argv[2]) if len(sys.argv) > 2 else 1024
+    recipients = [f"user{i}@example.com" for i in range(n_recipients)]
+
+    handler = SlowHandler()
+    controller = Controller(handler, hostname=HOST, port=PORT)
+    controller.start()
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as f:
+        f.write(os.urandom(pdf_kb * 1024))
+        report_path = f.name
+
+    try:
+        print(f"{n_recipients} recipients, {pdf_kb} KB attachment, "
+              f"{CONNECT_DELAY * 1000:.0f} ms connect / {DATA_DELAY * 1000:.0f} ms per message server delay")
+
+        start = time.perf_counter()
+        send_one_session_per_recipient(report_path, recipients)
+        print(f"  session per recipient:  {time.perf_counter() - start:6.2f} s")
+
+        service = EmailDeliveryService(SMTPConnectionPool(HOST, PORT, None, None, starttls=False, size=3), workers=4)
+        for label, bcc in [("pooled, one per recipient", False), ("pooled, BCC batches of 50", True)]:
+            before = handler.messages
+            start = time.perf_counter()
+            prepared = PreparedMessage("reports@example.com", "Benchmark report", "Report attached.",
+                                       "plain", report_path)
+            results = service.deliver(prepared, recipients, bcc=bcc)
+            elapsed = time.perf_counter() - start
+            sent = sum(1 for result in results if result["status"] == "sent")
+            print(f"  {label}: {elapsed:6.2f} s ({sent} sent in {handler.messages - before} messages)")
+        service.close()
+    finally:
+        controller.stop()
+        os.remove(report_path)
+
+
+if __name__ == "__main__":
+    main()
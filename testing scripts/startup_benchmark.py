@@ -0,0 +1,55 @@
+# startup_benchmark.py - Cold-start time and memory of a web worker importing the app
+# Each run imports data.py in a fresh interpreter, like a gunicorn worker booting.
+# Usage: python "testing scripts/startup_benchmark.py" [runs] [repo_dir]
+#   repo_dir defaults to this checkout; point it at an older checkout to compare.
+import os
+import sys
+import json
+import statistics
+import subprocess
+
+HEAVY_MODULES = ["matplotlib", "seaborn", "plotly", "reportlab", "google.generativeai", "dateparser"]
+
+# Runs inside the child interpreter; prints one JSON line with the measurements
+CHILD = f"""
+import json, resource, sys, threading, time
+start = time.perf_counter()
+import data
+elapsed = time.perf_counter() - start
+rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{
+    "seconds": elapsed,
+    "rss_mb": rss_kb / 1024,
+    "threads": threading.active_count(),
+    "heavy": [m for m in {HEAVY_MODULES!r} if m in sys.modules],
+}}))
+"""
+
+
+def measure(repo_dir):
+    env = dict(os.environ, BACKGROUND_SERVICES="", PYTHONDONTWRITEBYTECODE="1")
+    result = subprocess.run([sys.executable, "-c", CHILD], cwd=repo_dir, env=env,
+                            capture_output=True, text=True, timeout=300)
+    for line in reversed(result.stdout.splitlines()):
+        if line.startswith("{"):
+            return json.loads(line)
+    raise RuntimeError(f"import data failed:\n{result.stderr[-2000:]}")
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    repo_dir = sys.argv[2] if len(sys.argv) > 2 else os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    measure(repo_dir)  # Warm the OS file cache and .pyc files so every run is comparable
+    samples = [measure(repo_dir) for _ in range(runs)]
+    seconds = [sample["seconds"] for sample in samples]
+    rss = [sample["rss_mb"] for sample in samples]
+    print(f"import data ({runs} runs, {repo_dir})")
+    print(f"  import time: median {statistics.median(seconds):.2f} s, min {min(seconds):.2f} s")
+    print(f"  peak RSS:    median {statistics.median(rss):.0f} MB")
+    print(f"  threads after import: {samples[-1]['threads']}")
+    print(f"  heavy modules loaded: {', '.join(samples[-1]['heavy']) or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
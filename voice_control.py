@@ -3,12 +3,11 @@ import os
 import logging
 import json
 from flask import request, jsonify
-from google.generativeai import GenerativeModel
-import google.generativeai as genai
 from datetime import datetime
 import dateparser # You might need to install this: pip install dateparser
 from dotenv import load_dotenv
 import re
+from llm_client import get_llm_client
 
 # Configure logging (consider adjusting level and filename)
 logging.basicConfig(
@@ -20,29 +19,23 @@ logger = logging.getLogger(__name__)
 
 # Load environment variables (.env file should contain GEMINI_API_KEY)
 load_dotenv()
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
-if not GEMINI_API_KEY:
-    logger.error("GEMINI_API_KEY not found in environment variables. Please set it.")
-    # Depending on your error handling strategy, you might want to raise an error here
-    # For now, we'll let it fail during Gemini client configuration if key is missing
-
-try:
-    genai.configure(api_key=GEMINI_API_KEY)
-except Exception as e:
-    logger.error(f"Failed to configure Gemini API: {e}")
-    # Handle API key configuration error appropriately
+# Voice commands are interactive, so they get a tighter deadline than report analyses
+VOICE_LLM_TIMEOUT_SECONDS = float(os.getenv("VOICE_GEMINI_TIMEOUT_SECONDS", "10"))
+VOICE_LLM_DEADLINE_SECONDS = float(os.getenv("VOICE_GEMINI_DEADLINE_SECONDS", "20"))
 
 class VoiceAssistant:
     def __init__(self):
+        # Use a Gemini model suitable for complex instruction following
+        # Consider 'gemini-1.5-pro-latest' if 'flash' struggles, but be mindful of cost/latency
+        self.model_name = "gemini-1.5-flash" # Or "gemini-1.5-pro-latest"
         try:
-            # Use a Gemini model suitable for complex instruction following
-            # Consider 'gemini-1.5-pro-latest' if 'flash' struggles, but be mindful of cost/latency
-            self.model = GenerativeModel("gemini-1.5-flash") # Or "gemini-1.5-pro-latest"
+            # Shared client: configures Gemini once and applies timeouts, retries and concurrency limits
+            self.llm = get_llm_client()
             logger.info("VoiceAssistant initialized with Gemini model.")
         except Exception as e:
             logger.error(f"Failed to initialize Gemini model: {e}")
-            self.model = None # Ensure model is None if initialization fails
+            self.llm = None # Ensure client is None if initialization fails
 
         # Enhanced prompt covering all requested actions
         self.prompt_template = """
@@ -188,7 +181,7 @@ class VoiceAssistant:
 
     def process_command(self):
         """Processes a voice command using Gemini API."""
-        if not self.model:
+        if not self.llm:
              logger.error("Gemini model not initialized. Cannot process command.")
              return jsonify({"action": "error", "response": "Voice assistant is currently unavailable due to a configuration issue."})
 
@@ -216,8 +209,12 @@ class VoiceAssistant:
             )
 
             logger.debug("Sending command to Gemini API...")
-            response = self.model.generate_content(full_prompt)
-            raw_response = response.text.strip()
+            raw_response = self.llm.generate_text(
+                full_prompt,
+                model_name=self.model_name,
+                timeout=VOICE_LLM_TIMEOUT_SECONDS,
+                deadline=VOICE_LLM_DEADLINE_SECONDS
+            ).strip()
             logger.debug(f"Gemini API raw response:\n{raw_response}")
 
             # Parse and validate the response